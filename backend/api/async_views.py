@@ -0,0 +1,172 @@
+"""Асинхронные представления для чтения рецептов и ингредиентов (режим ASGI).
+
+Подключаются вместо GET-маршрутов вьюсетов при ASYNC_VIEWS = True (см.
+api/urls.py). Ответы совпадают с ответами RecipesViewSet/IngredientViewSet,
+включая ETag и кеш для анонимных: аутентификация, фильтры, порядок и
+пагинация списка - те же классы DRF, что у вьюсета (в потоке через
+sync_to_async). Асинхронно загружаются отметки пользователя и подписки, а
+сериализация не обращается к базе, поэтому медленный клиент не занимает
+поток.
+
+Всё остальное (запись, ?format=, ошибки) передаётся синхронному вьюсету.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from recipes.cache import UserRecipeFlags
+from recipes.ingredient_index import autocomplete, get_ingredient_index
+from recipes.models import Recipe, RecipeIngredients
+from .conditional import (
+    aconditional_response,
+    ingredients_validators,
+    recipe_detail_validators,
+    recipe_list_validators,
+)
+from .response_cache import acached_anonymous_response
+from .serializers.recipes import RecipeViewSerializer
+from .serializers.users import aget_subscribed_author_ids
+from .views import IngredientViewSet, RecipesViewSet
+
+recipe_list_sync = RecipesViewSet.as_view({'get': 'list', 'post': 'create'})
+recipe_detail_sync = RecipesViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy',
+})
+ingredient_list_sync = IngredientViewSet.as_view({'get': 'list'})
+
+
+def get_drf_request(request):
+    """Request DRF с пользователем; None, если учётные данные неверны.
+
+    Ответ с ошибкой в этом случае формирует синхронный путь.
+    """
+    drf_request = Request(request, authenticators=[
+        authentication() for authentication
+        in RecipesViewSet.authentication_classes
+    ])
+    try:
+        drf_request.user
+    except APIException:
+        return None
+    return drf_request
+
+
+async def authenticate(request):
+    drf_request = await sync_to_async(get_drf_request)(request)
+    if drf_request is not None:
+        request.user = drf_request.user
+    return drf_request
+
+
+def json_response(data):
+    return HttpResponse(JSONRenderer().render(data),
+                        content_type='application/json')
+
+
+def recipes_queryset():
+    return Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('recipeingredients', queryset=RecipeIngredients.objects
+                 .select_related('ingredient'))
+    ).defer('search_vector')
+
+
+async def serialize_recipes(request, recipes, many):
+    author_ids = {recipe.author_id for recipe in recipes}
+    context = {
+        'request': request,
+        'recipe_flags': await UserRecipeFlags(request.user).aload(),
+        'subscribed_author_ids': await aget_subscribed_author_ids(
+            request.user, author_ids
+        ),
+    }
+    # Все данные уже загружены - сериализация не обращается к базе.
+    return RecipeViewSerializer(recipes if many else recipes[0], many=many,
+                                context=context).data
+
+
+def paginate_recipes(drf_request):
+    """(вьюсет, рецепты страницы) или None, если нужен синхронный путь."""
+    view = RecipesViewSet(action='list', request=drf_request, args=(),
+                          kwargs={}, format_kwarg=None)
+    try:
+        return view, view.paginate_queryset(
+            view.filter_queryset(view.get_queryset())
+        )
+    except APIException:
+        return None
+
+
+@csrf_exempt
+async def recipe_list(request):
+    """Список рецептов (GET), остальное - RecipesViewSet."""
+    drf_request = (await authenticate(request)
+                   if request.method == 'GET' and 'format' not in request.GET
+                   else None)
+    if drf_request is None:
+        return await sync_to_async(recipe_list_sync)(request)
+
+    async def get_response():
+        page = await sync_to_async(paginate_recipes)(drf_request)
+        if page is None:
+            # Ошибки фильтров и "Неправильная страница" формирует вьюсет.
+            return await sync_to_async(recipe_list_sync)(request)
+        view, recipes = page
+        return json_response(view.get_paginated_response(
+            await serialize_recipes(request, recipes, many=True)
+        ).data)
+
+    return await aconditional_response(
+        request, await sync_to_async(recipe_list_validators)(request),
+        lambda: acached_anonymous_response(request, get_response)
+    )
+
+
+@csrf_exempt
+async def recipe_detail(request, pk):
+    """Рецепт (GET), остальное - RecipesViewSet."""
+    drf_request = (await authenticate(request)
+                   if request.method == 'GET' and not request.GET else None)
+    updated_at = await Recipe.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True
+    ).afirst() if drf_request is not None else None
+    if updated_at is None:
+        return await sync_to_async(recipe_detail_sync)(request, pk=pk)
+
+    async def get_response():
+        recipes = [recipe async for recipe in recipes_queryset().filter(pk=pk)]
+        return json_response(
+            await serialize_recipes(request, recipes, many=False)
+        )
+
+    return await aconditional_response(
+        request,
+        await sync_to_async(recipe_detail_validators)(request, updated_at),
+        lambda: acached_anonymous_response(request, get_response)
+    )
+
+
+@csrf_exempt
+async def ingredient_list(request):
+    """Ингредиенты и автодополнение (?name=) по индексу в памяти."""
+    if request.method != 'GET' or set(request.GET) - {'name'}:
+        return await sync_to_async(ingredient_list_sync)(request)
+    name = request.GET.get('name')
+
+    async def get_response():
+        # Индекс обычно уже в памяти; в потоке - только его перестроение
+        # и нечёткий поиск на PostgreSQL.
+        if name is None:
+            items = (await sync_to_async(get_ingredient_index)()).items
+        else:
+            items = await sync_to_async(autocomplete)(name)
+        return json_response(items)
+
+    return await aconditional_response(
+        request, await sync_to_async(ingredients_validators)(request),
+        get_response
+    )
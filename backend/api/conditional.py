@@ -0,0 +1,120 @@
+"""Условные GET-запросы (ETag / Last-Modified) для рецептов и ингредиентов.
+
+Валидаторы считаются по отметкам времени изменений (recipes/versions.py:
+рецепты, авторы, ингредиенты, флаги пользователя) и по Recipe.updated_at,
+без сериализации ответа. Если клиент прислал If-None-Match /
+If-Modified-Since и данные не изменились, сразу возвращается 304.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from recipes import versions
+from .filters import RecipeOrderingFilter
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def user_validators(user):
+    """(id, отметка времени) для частей ответа, зависящих от пользователя."""
+    if not user.is_authenticated:
+        return None, 0
+    return user.pk, versions.get_changed_at(versions.user_flags(user.pk))
+
+
+def recipe_list_validators(request):
+    user_id, flags_changed_at = user_validators(request.user)
+    recipes_changed_at = versions.get_changed_at(versions.RECIPES)
+    users_changed_at = versions.get_changed_at(versions.USERS)
+    ingredients_changed_at = versions.get_changed_at(versions.INGREDIENTS)
+    # Порядок по популярности меняется без изменения рецептов: такой
+    # список считается обновлённым раз в TRENDING_CACHE_TIMEOUT секунд.
+    ranked_at = 0
+    if request.GET.get('ordering') == RecipeOrderingFilter.popular_value:
+        ranked_at = time.time() // settings.TRENDING_CACHE_TIMEOUT \
+            * settings.TRENDING_CACHE_TIMEOUT
+    etag = make_etag(request.get_full_path(), user_id, recipes_changed_at,
+                     users_changed_at, ingredients_changed_at,
+                     flags_changed_at, ranked_at)
+    return etag, max(recipes_changed_at, users_changed_at,
+                     ingredients_changed_at, flags_changed_at, ranked_at)
+
+
+def recipe_detail_validators(request, recipe_updated_at):
+    user_id, flags_changed_at = user_validators(request.user)
+    users_changed_at = versions.get_changed_at(versions.USERS)
+    # Названия и единицы измерения ингредиентов выводятся в рецепте.
+    ingredients_changed_at = versions.get_changed_at(versions.INGREDIENTS)
+    updated_at = recipe_updated_at.timestamp()
+    etag = make_etag(request.get_full_path(), user_id, updated_at,
+                     users_changed_at, ingredients_changed_at,
+                     flags_changed_at)
+    return etag, max(updated_at, users_changed_at, ingredients_changed_at,
+                     flags_changed_at)
+
+
+def similar_recipes_validators(request):
+    """Как у списка рецептов, плюс отметка пересчёта похожих рецептов."""
+    user_id, flags_changed_at = user_validators(request.user)
+    changed_at = [versions.get_changed_at(name) for name in (
+        versions.RECIPES, versions.USERS, versions.INGREDIENTS,
+        versions.SIMILAR_RECIPES,
+    )]
+    etag = make_etag(request.get_full_path(), user_id, *changed_at,
+                     flags_changed_at)
+    return etag, max(*changed_at, flags_changed_at)
+
+
+def ingredients_validators(request):
+    changed_at = versions.get_changed_at(versions.INGREDIENTS)
+    return make_etag(request.get_full_path(), changed_at), changed_at
+
+
+def _not_modified(request, validators):
+    etag, last_modified = validators
+    # Last-Modified передаётся с точностью до секунды; при наличии
+    # If-None-Match он не проверяется, а ETag учитывает и доли секунды.
+    return get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=int(last_modified)
+    )
+
+
+def _set_validators(response, validators):
+    etag, last_modified = validators
+    if response.status_code == 200:
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(int(last_modified))
+        # Ответы зависят от пользователя: только частный кеш с проверкой.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional_response(request, validators, get_response):
+    """Ответ 304, если данные не изменились.
+
+    Иначе - get_response() с заголовками валидаторов.
+    """
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    return _set_validators(get_response(), validators)
+
+
+async def aconditional_response(request, validators, get_response):
+    """То же для асинхронных представлений: get_response - корутина."""
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return not_modified
+    return _set_validators(await get_response(), validators)
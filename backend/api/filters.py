@@ -1,24 +1,37 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 
 from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.trending import POPULAR_ORDERING
 
 
 class RecipeFilterSet(filters.FilterSet):
-    """Доступна фильтрация по избранному, автору и списку покупок."""
+    """Доступна фильтрация по избранному, автору и списку покупок,
+    а также полнотекстовый поиск (аннотация rank, порядок задаёт
+    RecipeOrderingFilter)."""
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
-    is_in_shopping_cart = filters.NumberFilter(method='filter_is_in_shopping_cart')
+    is_in_shopping_cart = filters.NumberFilter(
+        method='filter_is_in_shopping_cart'
+    )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'is_favorited', 'is_in_shopping_cart', 'search']
+
+    def filter_search(self, recipe_queryset, name, value):
+        return search_recipes(recipe_queryset, value)
 
     def filter_is_favorited(self, recipe_queryset, name, value):
         user = self.request.user
-        return self._filter_by_user(recipe_queryset, user, 'favorites__user', value)
+        return self._filter_by_user(recipe_queryset, user,
+                                    'favorites__user', value)
 
     def filter_is_in_shopping_cart(self, recipe_queryset, name, value):
         user = self.request.user
-        return self._filter_by_user(recipe_queryset, user, 'shopping_carts__user', value)
+        return self._filter_by_user(recipe_queryset, user,
+                                    'shopping_carts__user', value)
 
     @staticmethod
     def _filter_by_user(recipe_queryset, user, path_to_user, value):
@@ -30,3 +43,33 @@ class RecipeFilterSet(filters.FilterSet):
         elif value == 0:
             recipe_queryset = recipe_queryset.exclude(**{path_to_user: user})
         return recipe_queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Порядок рецептов - единственное место, где он выбирается.
+
+    Кроме полей рецепта, ?ordering=popular - по затухающей популярности
+    (recipes/trending.py). Явный ?ordering= важнее релевантности: с ним
+    результаты ?search= упорядочиваются по нему. Без него результаты поиска
+    идут по убыванию rank, в том числе при курсорной пагинации (курсор
+    строится по тому же порядку). Фильтр должен стоять после
+    DjangoFilterBackend, который добавляет rank.
+    """
+    popular_value = 'popular'
+    search_param = 'search'
+    search_ordering = ['-rank', '-created_at', '-id']
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params == self.popular_value:
+            return POPULAR_ORDERING
+        if params:
+            ordering = self.remove_invalid_fields(
+                queryset, [param.strip() for param in params.split(',')],
+                view, request,
+            )
+            if ordering:
+                return ordering
+        if request.query_params.get(self.search_param):
+            return self.search_ordering
+        return self.get_default_ordering(view)
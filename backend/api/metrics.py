@@ -0,0 +1,317 @@
+"""Метрики приложения в текстовом формате Prometheus (эндпоинт /metrics).
+
+Счётчики и гистограммы хранятся в памяти процесса. Если задан METRICS_DIR,
+каждый процесс (воркер gunicorn) раз в METRICS_FLUSH_INTERVAL секунд
+записывает свои значения в файл <pid>.json этого каталога, а /metrics
+суммирует файлы всех процессов. Файлы завершившихся процессов остаются,
+чтобы счётчики не уменьшались; каталог очищается при развёртывании.
+
+Без METRICS_DIR /metrics показывает только процесс, который обслужил запрос.
+
+Эндпоинт выключен по умолчанию (METRICS_ENABLED) и отвечает только адресам
+из METRICS_ALLOWED_IPS или запросам с заголовком
+Authorization: Bearer <METRICS_TOKEN>.
+"""
+import atexit
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _metrics[name] = self
+
+    def labels_key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def merge(self, values, into):
+        for key, value in values:
+            key = tuple(key)
+            if key in into:
+                into[key] = [old + new for old, new in zip(into[key], value)]
+            else:
+                into[key] = list(value)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.labels_key(labels)
+        with _lock:
+            self.values[key] = [self.values.get(key, [0])[0] + amount]
+        _maybe_flush()
+
+    def samples(self, key, value):
+        yield self.name, key, value[0]
+
+
+class Histogram(Metric):
+    """Значения: счётчики по корзинам, затем сумма и количество."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.labels_key(labels)
+        with _lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0] * (len(self.buckets) + 3)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+                    break
+            else:
+                values[len(self.buckets)] += 1  # +Inf
+            values[-2] += value
+            values[-1] += 1
+        _maybe_flush()
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), value):
+            cumulative += count
+            yield f'{self.name}_bucket', key + (('le', bound),), cumulative
+        yield f'{self.name}_sum', key, value[-2]
+        yield f'{self.name}_count', key, value[-1]
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса по представлению и действию',
+    ['view', 'action', 'method'],
+)
+REQUESTS = Counter(
+    'foodgram_http_requests_total', 'Количество запросов',
+    ['view', 'action', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_db_queries_per_request', 'SQL-запросов на один HTTP-запрос',
+    ['view', 'action'], buckets=QUERY_BUCKETS,
+)
+QUERIES = Counter(
+    'foodgram_db_queries_total', 'Количество SQL-запросов',
+    ['view', 'action'],
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер ответа (без потоковых ответов)',
+    ['view', 'action'], buckets=SIZE_BUCKETS,
+)
+CART_EXPORT_DURATION = Histogram(
+    'foodgram_shopping_cart_export_duration_seconds',
+    'Время формирования файла списка покупок', ['format'],
+)
+IMAGE_UPLOAD_SIZE = Histogram(
+    'foodgram_image_upload_size_bytes', 'Размер загруженной картинки',
+    ['field'], buckets=SIZE_BUCKETS,
+)
+RESPONSE_CACHE = Counter(
+    'foodgram_response_cache_requests_total',
+    'Обращения к кешу ответов для анонимных пользователей', ['result'],
+)
+
+
+_last_flush = time.monotonic()
+
+
+def _metrics_path(pid=None):
+    return os.path.join(settings.METRICS_DIR, f'{pid or os.getpid()}.json')
+
+
+def flush():
+    """Записать значения процесса в METRICS_DIR (атомарно)."""
+    global _last_flush
+    if not settings.METRICS_DIR:
+        return
+    with _lock:
+        data = {name: list(metric.values.items())
+                for name, metric in _metrics.items() if metric.values}
+        _last_flush = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = _metrics_path()
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(data, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _maybe_flush():
+    elapsed = time.monotonic() - _last_flush
+    if settings.METRICS_DIR and elapsed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """{имя: {ключ меток: значения}} по всем процессам."""
+    collected = {name: {} for name in _metrics}
+    if settings.METRICS_DIR:
+        flush()
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                path = os.path.join(settings.METRICS_DIR, filename)
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, values in data.items():
+                if name in _metrics:
+                    _metrics[name].merge(values, collected[name])
+    else:
+        with _lock:
+            for name, metric in _metrics.items():
+                metric.merge(metric.values.items(), collected[name])
+    return collected
+
+
+def is_metrics_request_allowed(request):
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+        request.headers.get('Authorization', ''),
+        f'Bearer {settings.METRICS_TOKEN}',
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.METRICS_ALLOWED_IPS)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def render_metrics():
+    lines = []
+    for name, values in collect().items():
+        metric = _metrics[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for key, value in sorted(values.items()):
+            for sample_name, labels, sample in metric.samples(
+                tuple(zip(metric.labelnames, key)), value
+            ):
+                label_text = ','.join(f'{label}="{_escape(label_value)}"'
+                                      for label, label_value in labels)
+                lines.append(f'{sample_name}{{{label_text}}} {sample}'
+                             if label_text else f'{sample_name} {sample}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_labels(view_func, method):
+    """(представление, действие): для вьюсетов DRF - класс и action."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown'), ''
+    actions = getattr(view_func, 'actions', None) or {}
+    return view_class.__name__, actions.get(method.lower(), method.lower())
+
+
+class MetricsMiddleware:
+    """Метрики запросов; работает и в синхронном, и в асинхронном стеке.
+
+    В асинхронном режиме SQL-запросы не считаются: асинхронный ORM
+    выполняет их в отдельном потоке со своим соединением.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connections['default'].execute_wrapper(count_query):
+            response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started,
+                     queries[0])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, queries=None):
+        labels = getattr(request, '_metrics_labels', None)
+        if labels is None:  # 404 до выбора представления, /metrics
+            return
+        view, action = labels
+        REQUEST_DURATION.observe(duration, view=view, action=action,
+                                 method=request.method)
+        REQUESTS.inc(view=view, action=action, method=request.method,
+                     status=response.status_code)
+        if queries is not None:
+            REQUEST_QUERIES.observe(queries, view=view, action=action)
+            QUERIES.inc(queries, view=view, action=action)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view=view,
+                                  action=action)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'skip_metrics', False):
+            return None
+        request._metrics_labels = view_labels(view_func, request.method)
+        return None
+
+
+def observe_duration(histogram, iterator, **labels):
+    """Итератор-обёртка: время до полного чтения iterator.
+
+    Нужна для потоковых ответов.
+    """
+    started = time.perf_counter()
+    yield from iterator
+    histogram.observe(time.perf_counter() - started, **labels)
+
+
+async def aobserve_duration(histogram, iterator, **labels):
+    started = time.perf_counter()
+    async for item in iterator:
+        yield item
+    histogram.observe(time.perf_counter() - started, **labels)
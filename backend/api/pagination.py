@@ -1,7 +1,51 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
     max_page_size = 100
+
+
+class CustomCursorPagination(CursorPagination):
+    """Курсорная (keyset) пагинация: без OFFSET и без COUNT(*).
+
+    Порядок берётся из атрибута ordering представления (через OrderingFilter),
+    по умолчанию - по индексу created_at и id.
+    """
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class OptionalCursorPagination(CustomPageNumberPagination):
+    """Постраничная пагинация, а с ?pagination=cursor - курсорная.
+
+    Ссылки next/previous курсорного режима сохраняют параметр pagination,
+    поэтому клиенту достаточно включить его в первом запросе.
+    """
+    pagination_mode_query_param = 'pagination'
+    cursor_pagination_class = CustomCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return (
+            params.get(self.pagination_mode_query_param) == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request,
+                                                           view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
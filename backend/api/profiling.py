@@ -0,0 +1,219 @@
+"""Профилирование запросов: SQL, сериализация, cProfile медленных запросов.
+
+Включается настройкой PROFILING_ENABLED (middleware добавляется в
+settings.MIDDLEWARE). Для каждого запроса считаются число и суммарное
+время SQL-запросов, повторяющиеся запросы (одинаковые с точностью до
+параметров - признак N+1) и время сериализации DRF. Итоги пишутся в лог
+api.profiling одной строкой JSON и в заголовок Server-Timing.
+
+Если задан PROFILING_CPROFILE_DIR, доля запросов
+(PROFILING_CPROFILE_SAMPLE_RATE) выполняется под cProfile, и для
+медленных (дольше PROFILING_SLOW_REQUEST_MS) статистика сохраняется в
+этот каталог (смотреть: python -m pstats файл).
+
+Middleware работает и в синхронном, и в асинхронном стеке. Учёт SQL и
+сериализации подключается один раз на процесс: обёртка добавляется к
+каждому соединению с БД, а BaseSerializer.data подменяется; обе читают
+профиль текущего запроса из ContextVar, который sync_to_async передаёт в
+поток ORM. Если профилирование выключено, middleware не используется и
+исходный BaseSerializer.data возвращается на место. cProfile - только в
+синхронном режиме: в асинхронном запросы чередуются в одном потоке.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('request_profile', default=None)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """SQL без значений параметров: одинаков для запросов из цикла."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common()
+            if count >= settings.PROFILING_DUPLICATE_THRESHOLD
+        ]
+
+
+_serializer_data = BaseSerializer.data
+
+
+def _timed_serializer_data(self):
+    profile = _profile.get()
+    if profile is None:
+        return _serializer_data.fget(self)
+    # Вложенные .data (например, в SerializerMethodField) уже учтены
+    # во внешнем вызове.
+    profile.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        profile.serializer_depth -= 1
+        if not profile.serializer_depth:
+            profile.serializer_time += time.perf_counter() - started
+
+
+_timed_data = property(_timed_serializer_data)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+
+def _add_execute_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def instrument():
+    """Подключить учёт SQL и сериализации; повторный вызов ничего не меняет."""
+    if BaseSerializer.__dict__['data'] is not _timed_data:
+        BaseSerializer.data = _timed_data
+    connection_created.connect(_add_execute_wrapper,
+                               dispatch_uid='api.profiling')
+    for connection in connections.all(initialized_only=True):
+        _add_execute_wrapper(connection)
+
+
+def uninstrument():
+    """Вернуть исходный BaseSerializer.data и убрать обёртки соединений."""
+    BaseSerializer.data = _serializer_data
+    connection_created.disconnect(dispatch_uid='api.profiling')
+    for connection in connections.all(initialized_only=True):
+        if _execute_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(_execute_wrapper)
+
+
+def save_cprofile(profiler, request, duration):
+    directory = settings.PROFILING_CPROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path_slug = re.sub(r'[^\w]+', '_', request.path).strip('_') or 'root'
+    filename = (f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-'
+                f'{path_slug}-{duration * 1000:.0f}ms.prof')
+    profiler.dump_stats(os.path.join(directory, filename))
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            uninstrument()
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        profiler = None
+        if (settings.PROFILING_CPROFILE_DIR
+                and random.random() < settings.PROFILING_CPROFILE_SAMPLE_RATE):
+            profiler = cProfile.Profile()
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            _profile.reset(token)
+        duration = time.perf_counter() - started
+
+        slow = duration * 1000 >= settings.PROFILING_SLOW_REQUEST_MS
+        if profiler is not None and slow:
+            save_cprofile(profiler, request, duration)
+        self.report(request, response, profile, duration, slow)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        duration = time.perf_counter() - started
+        self.report(request, response, profile, duration,
+                    duration * 1000 >= settings.PROFILING_SLOW_REQUEST_MS)
+        return response
+
+    @staticmethod
+    def report(request, response, profile, duration, slow):
+        duplicates = profile.duplicates()
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={profile.db_time * 1000:.1f};'
+                f'desc="{profile.queries} queries"',
+                f'serialize;dur={profile.serializer_time * 1000:.1f}',
+                f'dup;desc="{len(duplicates)} duplicated queries"',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        resolver_match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'serializer_ms': round(profile.serializer_time * 1000, 2),
+            'duplicated_queries': duplicates,
+        }
+        logger.log(logging.WARNING if slow or duplicates else logging.INFO,
+                   json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,20 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Текстовый ответ (используется для выгрузки списка покупок)."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Сам файл отдаётся через StreamingHttpResponse, рендерер нужен
+        # для согласования формата (?format=) и для ответов с ошибками.
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data if data is not None else '').encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
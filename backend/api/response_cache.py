@@ -0,0 +1,99 @@
+"""Кеш ответов списка и страницы рецепта для анонимных пользователей.
+
+Хранится результат сериализации (response.data) в отдельном кеше Django
+'responses' (бэкенд задаётся RESPONSE_CACHE_URL: locmem, файлы, redis...).
+Ключ содержит "поколение" - отметки времени изменения рецептов,
+пользователей и ингредиентов (recipes/versions.py), поэтому при
+сохранении/удалении Recipe, RecipeIngredients, User или Ingredient старые
+записи просто перестают использоваться и истекают по таймауту. Ответы,
+зависящие от других данных, добавляют их отметки (extra_versions).
+
+Попадания и промахи считает только метрика процесса RESPONSE_CACHE, без
+лишних обращений к кешу на каждый запрос.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from recipes import versions
+from .metrics import RESPONSE_CACHE, collect
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+def get_response_cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def get_generation(extra_versions=()):
+    return ':'.join(
+        str(versions.get_changed_at(name)) for name in (
+            versions.RECIPES, versions.USERS, versions.INGREDIENTS,
+            *extra_versions,
+        )
+    )
+
+
+def make_cache_key(request, prefix='response:', extra_versions=()):
+    # Полный URL: в ответах абсолютные ссылки на картинки и страницы.
+    url = request.build_absolute_uri()
+    return prefix + hashlib.md5(
+        f'{get_generation(extra_versions)}:{url}'.encode()
+    ).hexdigest()
+
+
+def get_stats():
+    """Попадания и промахи по метрике (всех процессов - при METRICS_DIR)."""
+    values = collect()[RESPONSE_CACHE.name]
+    return {
+        'hits': values.get(('hit',), [0])[0],
+        'misses': values.get(('miss',), [0])[0],
+    }
+
+
+def cached_anonymous_response(request, get_response, extra_versions=()):
+    """Ответ из кеша для анонимного пользователя, иначе get_response()."""
+    if request.user.is_authenticated or not settings.RESPONSE_CACHE_TIMEOUT:
+        return get_response()
+
+    response_cache = get_response_cache()
+    key = make_cache_key(request, extra_versions=extra_versions)
+    data = response_cache.get(key)
+    if data is not None:
+        RESPONSE_CACHE.inc(result='hit')
+        return Response(data, headers={'X-Cache': 'HIT'})
+
+    RESPONSE_CACHE.inc(result='miss')
+    response = get_response()
+    if response.status_code == 200:
+        response_cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+async def acached_anonymous_response(request, get_response):
+    """То же для асинхронных представлений: get_response - корутина."""
+    if request.user.is_authenticated or not settings.RESPONSE_CACHE_TIMEOUT:
+        return await get_response()
+
+    response_cache = get_response_cache()
+    # Асинхронные представления кешируют готовый JSON, а не response.data.
+    key = await sync_to_async(make_cache_key)(request, 'response-json:')
+    content = await response_cache.aget(key)
+    if content is not None:
+        RESPONSE_CACHE.inc(result='hit')
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = 'HIT'
+        return response
+
+    RESPONSE_CACHE.inc(result='miss')
+    response = await get_response()
+    if response.status_code == 200:
+        await response_cache.aset(key, response.content,
+                                  settings.RESPONSE_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
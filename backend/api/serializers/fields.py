@@ -1,19 +1,113 @@
-import base64
-from django.core.files.base import ContentFile
+import binascii
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
 
+from api.metrics import IMAGE_UPLOAD_SIZE
+from recipes.images import thumbnail_urls
 from recipes.utils import generate_random_string
 
+# Длина кратна 4, чтобы каждый кусок base64 декодировался независимо.
+BASE64_CHUNK_SIZE = 64 * 1024
+WHITESPACE_RE = re.compile(r'\s+')
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# SyntaxError Pillow выбрасывает для некоторых повреждённых PNG.
+INVALID_IMAGE_ERRORS = (ValueError, binascii.Error, OSError, SyntaxError,
+                        Image.DecompressionBombError)
+
+
+def decode_base64_to_file(encoded):
+    """Декодировать base64 по частям во временный файл.
+
+    Небольшие картинки остаются в памяти, крупные - сбрасываются на диск.
+    """
+    if WHITESPACE_RE.search(encoded):
+        encoded = WHITESPACE_RE.sub('', encoded)
+    file = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+        file.write(binascii.a2b_base64(
+            encoded[start:start + BASE64_CHUNK_SIZE]
+        ))
+    file.seek(0)
+    return file
+
+
+def probe_image(file):
+    """Формат и размеры картинки по заголовку, без декодирования пикселей."""
+    with Image.open(file) as image:
+        image_format, size = image.format, image.size
+    file.seek(0)
+    return image_format, size
+
+
+def verify_image(file):
+    """Проверить структуру файла и декодировать пиксели (битые, обрезанные
+    файлы вызывают исключение)."""
+    with Image.open(file) as image:
+        image.verify()
+    # После verify() картинку нужно открыть заново.
+    file.seek(0)
+    with Image.open(file) as image:
+        image.load()
+    file.seek(0)
+
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'unsupported_format': 'Формат изображения {format} не поддерживается.',
+        'too_large': 'Изображение слишком большое ({width}x{height}).',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            filename = generate_random_string(30)
-            filename = f"{filename}.{ext}"
-            decoded_file = base64.b64decode(imgstr)
-            data = ContentFile(decoded_file, name=filename)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+
+        try:
+            _, imgstr = data.split(';base64,', 1)
+            file = decode_base64_to_file(imgstr)
+            image_format, (width, height) = probe_image(file)
+        except INVALID_IMAGE_ERRORS:
+            self.fail('invalid_image')
+        if (image_format not in settings.IMAGE_ALLOWED_FORMATS
+                or image_format not in IMAGE_EXTENSIONS):
+            self.fail('unsupported_format', format=image_format)
+        # Размер проверяется до декодирования пикселей.
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_large', width=width, height=height)
+        try:
+            verify_image(file)
+        except INVALID_IMAGE_ERRORS:
+            self.fail('invalid_image')
+
+        IMAGE_UPLOAD_SIZE.observe(file.seek(0, os.SEEK_END),
+                                  field=self.field_name)
+        file.seek(0)
+        # Расширение - по формату, который определил Pillow, а не по
+        # заголовку data URI от клиента.
+        filename = (f'{generate_random_string(30)}.'
+                    f'{IMAGE_EXTENSIONS[image_format]}')
+        # Картинка уже проверена - повторно открывать её через
+        # django.forms.ImageField не нужно, достаточно проверок FileField.
+        return serializers.FileField.to_internal_value(
+            self, File(file, name=filename)
+        )
+
 
-        return super().to_internal_value(data)
+class ImageThumbnailsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки: {размер: url}."""
 
+    def to_representation(self, value):
+        urls = thumbnail_urls(value)
+        request = self.context.get('request', None)
+        if urls and request is not None:
+            urls = {size: request.build_absolute_uri(url)
+                    for size, url in urls.items()}
+        return urls
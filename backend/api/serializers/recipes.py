@@ -1,8 +1,19 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework.serializers import ModelSerializer
 from rest_framework import serializers
 
-from recipes.models import Ingredient, Recipe, RecipeIngredients
-from .fields import Base64ImageField
+from recipes.cache import UserRecipeFlags
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingListItem,
+)
+from recipes.search import update_search_index
+from recipes.shopping_list import update_recipe_in_shopping_lists
+from recipes.similar import mark_similar_outdated
+from .fields import Base64ImageField, ImageThumbnailsField
 from .users import UserSerializer
 
 
@@ -25,31 +36,89 @@ class RecipeIngredientViewSerializer(ModelSerializer):
         read_only_fields = fields
 
 
-class RecipeViewSerializer(ModelSerializer):
+class ShoppingListItemSerializer(ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ['id', 'name', 'measurement_unit', 'amount']
+        read_only_fields = fields
+
+
+class RecipeFlagsMixin:
+    """Поля is_favorited / is_in_shopping_cart из кеша id рецептов.
+
+    Объект UserRecipeFlags хранится в общем контексте сериализаторов,
+    поэтому списки id загружаются один раз на запрос.
+    """
+
+    def get_recipe_flags(self):
+        if 'recipe_flags' not in self.context:
+            self.context['recipe_flags'] = UserRecipeFlags(
+                self.context['request'].user
+            )
+        return self.context['recipe_flags']
+
+    def get_is_favorited(self, obj):
+        return self.get_recipe_flags().is_favorited(obj.pk)
+
+    def get_is_in_shopping_cart(self, obj):
+        return self.get_recipe_flags().is_in_shopping_cart(obj.pk)
+
+
+class RecipeViewSerializer(RecipeFlagsMixin, ModelSerializer):
     author = UserSerializer()
     ingredients = RecipeIngredientViewSerializer(
         source='recipeingredients', many=True, read_only=True
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_thumbnails = ImageThumbnailsField(source='image')
 
     class Meta:
         model = Recipe
-        fields =  ['id', 'author', 'ingredients', 'is_favorited',
-                   'is_in_shopping_cart', 'name', 'image', 'text',
-                   'cooking_time']
+        fields = ['id', 'author', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'image', 'image_thumbnails',
+                  'text', 'cooking_time']
         read_only_fields = fields
 
-    def get_is_favorited(self, obj):
-        return hasattr(obj, 'is_favorited') and obj.is_favorited
 
-    def get_is_in_shopping_cart(self, obj):
-        return hasattr(obj, 'is_in_shopping_cart') and obj.is_in_shopping_cart
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Список ингредиентов рецепта с проверкой всех id одним запросом.
+
+    Поле id элемента - просто число; здесь id заменяются объектами
+    Ingredient (как у PrimaryKeyRelatedField), а несуществующие id
+    возвращаются в ошибках сразу для всех элементов.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {item['ingredient']['id'] for item in items}
+        )
+        errors = []
+        for item in items:
+            ingredient_id = item['ingredient']['id']
+            if ingredient_id in ingredients:
+                item['ingredient']['id'] = ingredients[ingredient_id]
+                errors.append({})
+            else:
+                errors.append({'id': [
+                    serializers.PrimaryKeyRelatedField.default_error_messages[
+                        'does_not_exist'
+                    ].format(pk_value=ingredient_id)
+                ]})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
 
 
 class RecipeIngredientAddSerializer(ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(source='ingredient.id',
-                                            queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(source='ingredient.id')
     amount = serializers.IntegerField(min_value=1)
 
     # Поля name и measurement_unit требуются для отображения ингредиента
@@ -63,9 +132,10 @@ class RecipeIngredientAddSerializer(ModelSerializer):
         model = RecipeIngredients
         fields = ['id', 'name', 'measurement_unit', 'amount']
         read_only_fields = ['name', 'measurement_unit']
+        list_serializer_class = RecipeIngredientListSerializer
 
 
-class RecipeChangeSerializer(ModelSerializer):
+class RecipeChangeSerializer(RecipeFlagsMixin, ModelSerializer):
     ingredients = RecipeIngredientAddSerializer(
         many=True, source='recipeingredients', required=True
     )
@@ -84,7 +154,8 @@ class RecipeChangeSerializer(ModelSerializer):
     # RecipeList:
     #     id: type: integer
     #     author: $ref: '#/components/schemas/User'
-    #     ingredients: type: array $ref: '#/components/schemas/IngredientInRecipe'
+    #     ingredients: type: array
+    #       $ref: '#/components/schemas/IngredientInRecipe'
     #     is_favorited: type: boolean
     #     is_in_shopping_cart: type: boolean
     #     name: type: string maxLength: 256
@@ -100,49 +171,113 @@ class RecipeChangeSerializer(ModelSerializer):
     author = UserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_thumbnails = ImageThumbnailsField(source='image')
 
     class Meta:
         model = Recipe
-        fields =  ['id', 'author', 'ingredients', 'is_favorited',
-                   'is_in_shopping_cart', 'name', 'image', 'text',
-                   'cooking_time']
-        read_only_fields = ['id', 'author', 'is_favorited', 'is_in_shopping_cart']
-
-    def get_is_favorited(self, obj):
-        return hasattr(obj, 'is_favorited') and obj.is_favorited
-
-    def get_is_in_shopping_cart(self, obj):
-        return hasattr(obj, 'is_in_shopping_cart') and obj.is_in_shopping_cart
+        fields = ['id', 'author', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'image', 'image_thumbnails',
+                  'text', 'cooking_time']
+        read_only_fields = ['id', 'author', 'is_favorited',
+                            'is_in_shopping_cart', 'image_thumbnails']
 
     def validate_ingredients(self, value):
         ids = [item['ingredient']['id'].id for item in value]
         if len(ids) != len(set(ids)):
-            raise serializers.ValidationError('Ингредиенты не должны повторяться.')
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться.'
+            )
         return value
 
     def validate(self, attrs):
         recipeingredients = attrs.get('recipeingredients', None)
+        if recipeingredients is None and self.keeps_missing_ingredients():
+            return attrs
         if not recipeingredients:
             raise serializers.ValidationError('Отсутствуют ингредиенты')
         self.validate_ingredients(recipeingredients)
         return attrs
 
+    def keeps_missing_ingredients(self):
+        """PATCH без поля ingredients оставляет ингредиенты как есть.
+
+        Включается параметром ?keep_ingredients=true: по спецификации API
+        поле ingredients обязательно и при частичном обновлении.
+        """
+        return self.partial and self.context.get('keep_ingredients', False)
+
+    # Рецепт и его ингредиенты сохраняются в одной транзакции: сигналы
+    # сбрасывают кеши по её завершении, когда ингредиенты уже записаны.
+    @transaction.atomic
     def create(self, validated_data):
         recipeingredients = validated_data.pop('recipeingredients', None)
         validated_data['author'] = self.context['request'].user
         recipe = super().create(validated_data)
         self.set_recipe_ingredients(recipe, recipeingredients)
+        # При сохранении рецепта ингредиентов ещё не было.
+        update_search_index([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        recipeingredients = validated_data.pop('recipeingredients', [])
-        self.set_recipe_ingredients(instance, recipeingredients)
+        recipeingredients = validated_data.pop('recipeingredients', None)
+        if recipeingredients is not None:
+            self.set_recipe_ingredients(instance, recipeingredients)
         return super().update(instance, validated_data)
 
+    def to_representation(self, instance):
+        # Ингредиенты ответа загружаются одним запросом вместе с названиями.
+        prefetch_related_objects([instance], Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredients.objects.select_related('ingredient')
+        ))
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def set_recipe_ingredients(self, recipe, recipeingredients):
-        recipe.recipeingredients.all().delete()
-        RecipeIngredients.objects.bulk_create(RecipeIngredients(
-            recipe=recipe,
-            ingredient=recipe_ingredient['ingredient']['id'],
-            amount=recipe_ingredient['amount']
-        ) for recipe_ingredient in recipeingredients)
+        """Привести ингредиенты рецепта к переданным минимумом запросов.
+
+        Неизменившиеся строки не трогаются, у изменившихся обновляется
+        amount, лишние удаляются, новые добавляются - по одному запросу
+        на каждый вид изменений.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        old_amounts = {ingredient_id: item.amount
+                       for ingredient_id, item in existing.items()}
+        new_amounts = {
+            item['ingredient']['id'].id: item['amount']
+            for item in recipeingredients
+        }
+
+        removed_ids = [
+            existing[ingredient_id].pk
+            for ingredient_id in old_amounts.keys() - new_amounts.keys()
+        ]
+        if removed_ids:
+            RecipeIngredients.objects.filter(pk__in=removed_ids).delete()
+
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = existing.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredients.objects.bulk_update(changed, ['amount'])
+
+        added = [
+            RecipeIngredients(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in existing
+        ]
+        if added:
+            RecipeIngredients.objects.bulk_create(added)
+        if existing and (added or removed_ids):
+            # Новый рецепт отмечен по умолчанию.
+            mark_similar_outdated([recipe.pk])
+
+        update_recipe_in_shopping_lists(recipe.pk, old_amounts, new_amounts)
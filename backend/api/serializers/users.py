@@ -1,19 +1,69 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework.serializers import ModelSerializer
 from rest_framework import serializers
 
-from recipes.models import User, Recipe
-from .fields import Base64ImageField
+from recipes.models import User, Recipe, Subscription
+from .fields import Base64ImageField, ImageThumbnailsField
+
+
+def get_subscribed_author_ids(user, author_ids):
+    """Id авторов из author_ids, на которых подписан user (один запрос)."""
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return set(Subscription.objects.filter(
+        follower=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+async def aget_subscribed_author_ids(user, author_ids):
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return {author_id async for author_id in Subscription.objects.filter(
+        follower=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True)}
+
+
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit', None)
+    return int(limit) if limit and limit.isdigit() else None
+
+
+def attach_limited_recipes(authors, limit=None):
+    """Загрузить последние limit рецептов всех авторов одним запросом.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER() отдельно для каждого
+    автора и сохраняются в author.recipes_limited.
+    """
+    authors = list(authors)
+    recipes_qs = Recipe.objects.filter(
+        author_id__in=[author.pk for author in authors]
+    ).order_by('-created_at', '-id')
+    if limit is not None:
+        recipes_qs = recipes_qs.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )).filter(row_number__lte=limit)
+
+    recipes_by_author = {author.pk: [] for author in authors}
+    for recipe in recipes_qs:
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipes_limited = recipes_by_author[author.pk]
+    return authors
 
 
 class UserSerializer(DjoserUserSerializer):
     avatar = serializers.ImageField()
+    avatar_thumbnails = ImageThumbnailsField(source='avatar')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['email', 'id', 'username', 'first_name',
-              'last_name', 'is_subscribed', 'avatar']
+                  'last_name', 'is_subscribed', 'avatar', 'avatar_thumbnails']
         read_only_fields = fields
 
     def get_is_subscribed(self, obj):
@@ -22,42 +72,45 @@ class UserSerializer(DjoserUserSerializer):
             return False
         elif hasattr(obj, 'is_subscribed'):
             return bool(obj.is_subscribed)
+        elif 'subscribed_author_ids' in self.context:
+            # Заранее загруженные одним запросом подписки (см. RecipesViewSet).
+            return obj.pk in self.context['subscribed_author_ids']
         else:
-            return user.subscriptions_author.filter(follower__pk=obj.pk).exists()
+            return user.subscriptions_follower.filter(
+                author__pk=obj.pk
+            ).exists()
 
 
 class RecipeShortSerializer(ModelSerializer):
+    image_thumbnails = ImageThumbnailsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_thumbnails', 'cooking_time']
         read_only_fields = fields
 
 
 class UserWithRecipesSerializer(UserSerializer):
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count', 'avatar']
+                  'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+                  'avatar_thumbnails']
         read_only_fields = fields
 
-    def get_recipes_count(self, obj):
-        # Получает кол-во рецептов из аннотации (в случае списка пользователей)
-        if hasattr(obj, 'recipes_count'):
-            return obj.recipes_count
-        else:
-            # Или вычисляет на лету (для единичного пользователя).
-            return obj.recipes.count()
-
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        limit = self.context['request'].query_params.get('recipes_limit', None)
-        if limit and limit.isdigit():
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'recipes_limited'):
+            # Заранее загруженные рецепты (см. attach_limited_recipes).
+            recipes = obj.recipes_limited
+        else:
+            recipes = obj.recipes.all()
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         return RecipeShortSerializer(instance=recipes, many=True,
-                                       context=self.context).data
+                                     context=self.context).data
 
 
 class AvatarUploadSerializer(ModelSerializer):
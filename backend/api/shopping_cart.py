@@ -0,0 +1,176 @@
+"""Потоковая выгрузка списка покупок в форматах txt, csv и json.
+
+Итоги по ингредиентам читаются из таблицы ShoppingListItem итератором
+(на PostgreSQL - через серверный курсор), поэтому расход памяти на запрос
+не зависит от размера корзины. Каждый формат содержит и продукты, и список
+рецептов. Под ASGI ответ отдаётся асинхронным итератором (astream_export).
+"""
+import csv
+import datetime
+import json
+
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from recipes.models import Recipe, ShoppingListItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def get_cart_ingredients(user):
+    """Суммарное количество каждого ингредиента из рецептов в корзине.
+
+    Итоги берутся из поддерживаемой инкрементально таблицы ShoppingListItem.
+    """
+    return ShoppingListItem.objects.filter(user=user).values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by(Lower('ingredient__name'), 'ingredient__measurement_unit')
+
+
+def get_cart_recipes(user):
+    return Recipe.objects.filter(shopping_carts__user=user).values(
+        'name', 'author__first_name', 'author__last_name', 'author__email'
+    ).order_by('name')
+
+
+def _iter_ingredients(user):
+    return get_cart_ingredients(user).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _iter_recipes(user):
+    return get_cart_recipes(user).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _author_name(recipe):
+    return (f'{recipe["author__first_name"]} {recipe["author__last_name"]}'
+            f' ({recipe["author__email"]})')
+
+
+def _current_date():
+    return datetime.datetime.now().strftime('%d.%m.%Y')
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class TextExport:
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def header(self):
+        return (f'Список продуктов. Сформирован {_current_date()}\n'
+                '№\tНазвание\tКоличество\tЕдиница измерения\n')
+
+    def ingredient(self, n, ing):
+        return (f'{n}\t{ing["name"].capitalize()}\t{ing["amount"]}'
+                f'\t{ing["measurement_unit"]}\n')
+
+    def recipes_header(self):
+        return ('\nСписок рецептов, для которых эти продукты:\n'
+                '№\tНазвание\tАвтор\n')
+
+    def recipe(self, n, recipe):
+        return (f'{n}\t{recipe["name"].capitalize()}'
+                f'\t{_author_name(recipe)}\n')
+
+    def footer(self):
+        return ''
+
+
+class CSVExport(TextExport):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(_Echo())
+
+    def header(self):
+        return self.writer.writerow(
+            ['№', 'Название', 'Количество', 'Единица измерения']
+        )
+
+    def ingredient(self, n, ing):
+        return self.writer.writerow([n, ing['name'].capitalize(),
+                                     ing['amount'], ing['measurement_unit']])
+
+    def recipes_header(self):
+        return (self.writer.writerow([])
+                + self.writer.writerow(['№', 'Название', 'Автор']))
+
+    def recipe(self, n, recipe):
+        return self.writer.writerow([n, recipe['name'].capitalize(),
+                                     _author_name(recipe)])
+
+
+class JSONExport(TextExport):
+    content_type = 'application/json'
+    extension = 'json'
+
+    def header(self):
+        return '{"created": %s, "ingredients": [' % json.dumps(_current_date())
+
+    def ingredient(self, n, ing):
+        return (',' if n > 1 else '') + json.dumps({
+            'name': ing['name'],
+            'amount': ing['amount'],
+            'measurement_unit': ing['measurement_unit'],
+        }, ensure_ascii=False)
+
+    def recipes_header(self):
+        return '], "recipes": ['
+
+    def recipe(self, n, recipe):
+        return (',' if n > 1 else '') + json.dumps({
+            'name': recipe['name'],
+            'author': _author_name(recipe),
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return ']}'
+
+
+def stream_export(export, user):
+    """Файл списка покупок по частям (для WSGI)."""
+    yield export.header()
+    for n, ing in enumerate(_iter_ingredients(user), start=1):
+        yield export.ingredient(n, ing)
+    yield export.recipes_header()
+    for n, recipe in enumerate(_iter_recipes(user), start=1):
+        yield export.recipe(n, recipe)
+    yield export.footer()
+
+
+async def astream_export(export, user):
+    """То же для ASGI.
+
+    Синхронный итератор StreamingHttpResponse под ASGI читает целиком.
+    """
+    yield export.header()
+    n = 0
+    async for ing in get_cart_ingredients(user).aiterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        n += 1
+        yield export.ingredient(n, ing)
+    yield export.recipes_header()
+    n = 0
+    async for recipe in get_cart_recipes(user).aiterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        n += 1
+        yield export.recipe(n, recipe)
+    yield export.footer()
+
+
+# формат (?format=) -> выгрузка
+EXPORT_FORMATS = {
+    'txt': TextExport,
+    'csv': CSVExport,
+    'json': JSONExport,
+}
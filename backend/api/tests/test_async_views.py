@@ -0,0 +1,83 @@
+import json
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache, caches
+from django.test import AsyncRequestFactory
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import async_views
+from recipes.models import FavoriteRecipe, Recipe
+from recipes.tests.base import RecipesTestCase
+from recipes.views import short_link_redirect_view
+
+
+class AsyncRecipeListTests(RecipesTestCase):
+    """Асинхронный список совпадает с RecipesViewSet и не уходит в него."""
+
+    factory = AsyncRequestFactory()
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.user = self.create_user('reader')
+        self.token = Token.objects.create(user=self.user)
+        self.author = self.create_user('author')
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(8):
+                recipe = self.create_recipe(self.author, name=f'Суп {index}')
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    cooking_time=20 - index
+                )
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+
+    async def get_async(self, params, keyword='Token'):
+        request = self.factory.get('/api/recipes/', params, headers={
+            'Authorization': f'{keyword} {self.token.key}'
+        })
+        with mock.patch.object(async_views, 'recipe_list_sync',
+                               side_effect=AssertionError('синхронный путь')):
+            response = await async_views.recipe_list(request)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def get_sync(self, params):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_same_as_viewset(self):
+        for params in ({}, {'limit': 3, 'page': 2},
+                       {'author': self.author.pk}, {'is_favorited': 1},
+                       {'is_favorited': 0, 'limit': 2},
+                       {'ordering': 'cooking_time'}, {'search': 'суп'},
+                       {'pagination': 'cursor', 'limit': 3}):
+            with self.subTest(params=params):
+                await cache.aclear()
+                self.assertEqual(
+                    await self.get_async(params),
+                    await sync_to_async(self.get_sync)(params),
+                )
+
+    async def test_token_keyword_is_case_insensitive(self):
+        data = await self.get_async({'is_favorited': 1}, keyword='token')
+        self.assertEqual(data['count'], 1)
+
+    async def test_invalid_token_goes_to_viewset(self):
+        request = self.factory.get('/api/recipes/', headers={
+            'Authorization': 'Token wrong'
+        })
+        response = await async_views.recipe_list(request)
+        self.assertEqual(response.status_code, 401)
+
+    def test_short_link_redirect_is_sync(self):
+        self.assertFalse(iscoroutinefunction(short_link_redirect_view))
+        recipe = Recipe.objects.first()
+        response = self.client.get(reverse('recipe-short-link-redirect',
+                                           args=[recipe.pk]))
+        self.assertRedirects(response, f'/recipes/{recipe.pk}',
+                             fetch_redirect_response=False)
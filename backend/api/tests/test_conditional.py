@@ -0,0 +1,44 @@
+from django.core.cache import cache, caches
+from rest_framework.test import APIClient
+
+from recipes.tests.base import RecipesTestCase
+
+
+class IngredientChangeTests(RecipesTestCase):
+    """Переименование ингредиента меняет ETag и кеш ответов рецептов."""
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.recipe = self.create_recipe(self.create_user('author'))
+        self.ingredient = self.ingredients[0]
+        self.client = APIClient()
+
+    def rename_ingredient(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = 'новое название'
+            self.ingredient.save()
+
+    def ingredient_names(self, recipe):
+        return {ingredient['name'] for ingredient in recipe['ingredients']}
+
+    def test_detail(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.rename_ingredient()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('новое название', self.ingredient_names(response.json()))
+
+    def test_list(self):
+        response = self.client.get('/api/recipes/')
+        etag = response['ETag']
+        self.rename_ingredient()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('новое название',
+                      self.ingredient_names(response.json()['results'][0]))
@@ -0,0 +1,74 @@
+import base64
+import struct
+import zlib
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.serializers.fields import Base64ImageField
+
+
+def make_image(image_format='PNG', size=(8, 6)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def with_png_size(png, width, height):
+    """PNG с другими размерами в заголовке (IHDR) при тех же пикселях."""
+    ihdr = png[12:29]
+    ihdr = ihdr[:4] + struct.pack('>II', width, height) + ihdr[12:]
+    return (png[:12] + ihdr + struct.pack('>I', zlib.crc32(ihdr))
+            + png[33:])
+
+
+def data_uri(content, mime='image/png'):
+    return f'data:{mime};base64,{base64.b64encode(content).decode()}'
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+    def setUp(self):
+        self.field = Base64ImageField()
+        self.field.bind('image', None)
+
+    def test_valid_image(self):
+        file = self.field.to_internal_value(data_uri(make_image()))
+        self.assertTrue(file.name.endswith('.png'))
+
+    def test_extension_from_detected_format(self):
+        for mime in ('image/svg+xml', 'image/html', 'image/../../x'):
+            with self.subTest(mime=mime):
+                file = self.field.to_internal_value(
+                    data_uri(make_image('JPEG'), mime)
+                )
+                self.assertTrue(file.name.endswith('.jpg'))
+                self.assertNotIn('/', file.name)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValidationError):
+            self.field.to_internal_value(data_uri(make_image('BMP')))
+
+    def test_truncated_image(self):
+        png = make_image(size=(200, 200))
+        with self.assertRaises(ValidationError):
+            self.field.to_internal_value(data_uri(png[:len(png) // 2]))
+
+    def test_not_an_image(self):
+        for data in (data_uri(b'not an image'), 'data:image/png;base64,@@'):
+            with self.subTest(data=data), self.assertRaises(ValidationError):
+                self.field.to_internal_value(data)
+
+    def test_too_large(self):
+        with self.assertRaises(ValidationError) as error:
+            self.field.to_internal_value(
+                data_uri(with_png_size(make_image(), 8000, 8000))
+            )
+        self.assertIn('слишком большое', str(error.exception))
+
+    def test_decompression_bomb(self):
+        with self.assertRaises(ValidationError):
+            self.field.to_internal_value(
+                data_uri(with_png_size(make_image(), 30000, 30000))
+            )
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from recipes import ingredient_index
+from recipes.models import Ingredient
+from recipes.tests.base import RecipesTestCase
+
+
+@override_settings(INGREDIENTS_AUTOCOMPLETE_LIMIT=2)
+class IngredientListTests(RecipesTestCase):
+    """?name= - автодополнение по индексу в памяти, ?search= - как раньше."""
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index._index = None
+        self.addCleanup(setattr, ingredient_index, '_index', None)
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Томаты', 'томатная паста', 'томатный сок', 'тмин')
+        ])
+        self.client = APIClient()
+
+    def names(self, **params):
+        response = self.client.get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_name_prefix_limited(self):
+        self.assertEqual(self.names(name='ТОМ'),
+                         ['томатная паста', 'томатный сок'])
+        self.assertEqual(self.names(name='тми'), ['тмин'])
+        self.assertEqual(self.names(name='нет такого'), [])
+
+    def test_search_prefix_unlimited(self):
+        # SQLite сравнивает без учёта регистра только латиницу.
+        self.assertEqual(self.names(search='томат'),
+                         ['томатная паста', 'томатный сок'])
+        self.assertEqual(self.names(search='Томаты'), ['Томаты'])
+        self.assertEqual(self.names(search='паста'), [])
+
+    def test_index_served_from_memory(self):
+        self.names(name='том')
+        count = Ingredient.objects.count()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.names()), count)
+            self.assertEqual(self.names(name='тмин'), ['тмин'])
+
+    def test_new_ingredient_rebuilds_index(self):
+        self.names(name='том')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='томаты вяленые',
+                                      measurement_unit='г')
+        self.assertEqual(self.names(name='томаты '), ['томаты вяленые'])
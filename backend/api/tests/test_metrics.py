@@ -0,0 +1,36 @@
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api.views import metrics_view
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1', '10.0.0.0/8'],
+                   METRICS_TOKEN='secret')
+class MetricsAccessTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def get(self, address, **headers):
+        return metrics_view(self.factory.get('/metrics', REMOTE_ADDR=address,
+                                             headers=headers))
+
+    def test_allowed_address(self):
+        self.assertEqual(self.get('127.0.0.1').status_code, 200)
+        self.assertEqual(self.get('10.1.2.3').status_code, 200)
+
+    def test_other_address_is_forbidden(self):
+        self.assertEqual(self.get('203.0.113.5').status_code, 403)
+
+    def test_token(self):
+        self.assertEqual(
+            self.get('203.0.113.5', authorization='Bearer secret').status_code,
+            200,
+        )
+        self.assertEqual(
+            self.get('203.0.113.5', authorization='Bearer wrong').status_code,
+            403,
+        )
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_is_not_accepted(self):
+        self.assertEqual(
+            self.get('203.0.113.5', authorization='Bearer ').status_code, 403
+        )
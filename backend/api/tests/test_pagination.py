@@ -0,0 +1,60 @@
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.tests.base import RecipesTestCase
+
+URL = '/api/recipes/'
+
+
+class OptionalCursorPaginationTests(RecipesTestCase):
+    """?pagination=cursor включает курсорную пагинацию без COUNT(*)."""
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        author = self.create_user('author')
+        self.names = [f'Рецепт {index}' for index in range(8)]
+        for name in self.names:
+            self.create_recipe(author, name=name)
+        # Новые рецепты - первыми.
+        self.names.reverse()
+        self.client = APIClient()
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        return response.json()
+
+    def test_page_mode_by_default(self):
+        data = self.client.get(URL, {'limit': 3}).json()
+        self.assertEqual(data['count'], len(self.names))
+        self.assertIn('page=2', data['next'])
+
+    def test_cursor_pages_without_overlap(self):
+        data = self.get(URL, {'pagination': 'cursor', 'limit': 3})
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+        names = [recipe['name'] for recipe in data['results']]
+        while data['next']:
+            query = parse_qs(urlsplit(data['next']).query)
+            self.assertEqual(query['pagination'], ['cursor'])
+            self.assertIn('cursor', query)
+            data = self.get(data['next'])
+            self.assertIsNotNone(data['previous'])
+            names += [recipe['name'] for recipe in data['results']]
+        self.assertEqual(names, self.names)
+
+    def test_cursor_param_alone_keeps_cursor_mode(self):
+        first = self.get(URL, {'pagination': 'cursor', 'limit': 3})
+        cursor = parse_qs(urlsplit(first['next']).query)['cursor'][0]
+        data = self.get(URL, {'cursor': cursor, 'limit': 3})
+        self.assertNotIn('count', data)
+        self.assertEqual([recipe['name'] for recipe in data['results']],
+                         self.names[3:6])
@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.serializers import BaseSerializer
+
+from api import profiling
+from recipes.tests.base import RecipesTestCase
+
+
+@override_settings(
+    PROFILING_ENABLED=True, PROFILING_CPROFILE_DIR='',
+    MIDDLEWARE=['api.profiling.ProfilingMiddleware', *settings.MIDDLEWARE],
+)
+class ProfilingMiddlewareTests(RecipesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.create_recipe(self.create_user('author'))
+        # Middleware создаётся при запуске процесса, до первого запроса;
+        # соединение тестовой базы к этому моменту уже открыто.
+        profiling.instrument()
+        self.addCleanup(profiling.uninstrument)
+
+    def report(self, logs):
+        return json.loads(logs.records[-1].getMessage())
+
+    def test_sync_request(self):
+        with self.assertLogs('api.profiling', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/')
+        report = self.report(logs)
+        self.assertEqual(report['queries'], len(queries))
+        self.assertGreater(report['serializer_ms'], 0)
+        self.assertIn(f'desc="{len(queries)} queries"',
+                      response['Server-Timing'])
+
+    async def test_async_request(self):
+        with self.assertLogs('api.profiling', 'INFO') as logs:
+            response = await self.async_client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        report = self.report(logs)
+        self.assertGreater(report['queries'], 0)
+        self.assertGreater(report['serializer_ms'], 0)
+
+    def test_instrumented_once(self):
+        connection.ensure_connection()
+        for _ in range(2):
+            profiling.ProfilingMiddleware(lambda request: None)
+        self.assertIs(BaseSerializer.__dict__['data'], profiling._timed_data)
+        self.assertEqual(
+            connection.execute_wrappers.count(profiling._execute_wrapper), 1
+        )
+
+    def test_restored_when_disabled(self):
+        profiling.ProfilingMiddleware(lambda request: None)
+        with override_settings(PROFILING_ENABLED=False), \
+                self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+        self.assertIs(BaseSerializer.__dict__['data'],
+                      profiling._serializer_data)
+        self.assertNotIn(profiling._execute_wrapper,
+                         connection.execute_wrappers)
@@ -0,0 +1,115 @@
+from django.core.cache import cache, caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import FavoriteRecipe, ShoppingCart, Subscription
+from recipes.tests.base import RecipesTestCase
+
+# Проверка токена пользователя.
+AUTH_QUERIES = 1
+# Рецепты и их ингредиенты; для списка ещё COUNT(*) пагинации, для рецепта -
+# updated_at для ETag.
+RECIPE_QUERIES = 3
+# Подписки на авторов страницы; id избранного и корзины берутся из кеша.
+FLAGS_QUERIES = 1
+# Списки id избранного и корзины при пустом кеше.
+FLAGS_CACHE_MISS_QUERIES = 2
+
+
+class QueryCountTests(RecipesTestCase):
+    """Число запросов к БД на эндпоинтах не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = cls.create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.authors = [cls.create_user(f'author{index}') for index in range(3)]
+        for author in cls.authors:
+            Subscription.objects.create(author=author, follower=cls.user)
+        cls.recipes = [cls.create_recipe(author, name=f'Рецепт {index}')
+                       for index, author in enumerate(cls.authors * 2)]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def assertGetQueries(self, client, url, number):
+        with self.assertNumQueries(number):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def add_recipes(self):
+        """Ещё по рецепту каждого автора."""
+        for author in self.authors:
+            self.create_recipe(author, name='Ещё рецепт')
+        self.create_recipe(self.create_user('new_author'), name='Новый автор')
+        cache.clear()
+        caches['responses'].clear()
+
+    def test_recipe_list_anonymous(self):
+        self.assertGetQueries(self.anonymous, '/api/recipes/', RECIPE_QUERIES)
+        # Повторный ответ - из кеша ответов.
+        self.assertGetQueries(self.anonymous, '/api/recipes/', 0)
+        self.add_recipes()
+        response = self.assertGetQueries(self.anonymous, '/api/recipes/',
+                                         RECIPE_QUERIES)
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_recipe_list(self):
+        self.assertGetQueries(
+            self.client, '/api/recipes/',
+            AUTH_QUERIES + RECIPE_QUERIES + FLAGS_QUERIES
+            + FLAGS_CACHE_MISS_QUERIES,
+        )
+        response = self.assertGetQueries(
+            self.client, '/api/recipes/',
+            AUTH_QUERIES + RECIPE_QUERIES + FLAGS_QUERIES,
+        )
+        flags = {recipe['id']: (recipe['is_favorited'],
+                                recipe['is_in_shopping_cart'],
+                                recipe['author']['is_subscribed'])
+                 for recipe in response.json()['results']}
+        self.assertEqual(flags[self.recipes[0].pk], (True, False, True))
+        self.assertEqual(flags[self.recipes[1].pk], (False, True, True))
+        self.add_recipes()
+        self.assertGetQueries(
+            self.client, '/api/recipes/?limit=10',
+            AUTH_QUERIES + RECIPE_QUERIES + FLAGS_QUERIES
+            + FLAGS_CACHE_MISS_QUERIES,
+        )
+
+    def test_recipe_detail_anonymous(self):
+        self.assertGetQueries(self.anonymous,
+                              f'/api/recipes/{self.recipes[0].pk}/',
+                              RECIPE_QUERIES)
+
+    def test_recipe_detail(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        self.assertGetQueries(
+            self.client, url,
+            AUTH_QUERIES + RECIPE_QUERIES + FLAGS_QUERIES
+            + FLAGS_CACHE_MISS_QUERIES,
+        )
+        response = self.assertGetQueries(
+            self.client, url, AUTH_QUERIES + RECIPE_QUERIES + FLAGS_QUERIES
+        )
+        self.assertTrue(response.json()['is_favorited'])
+
+    def test_subscriptions(self):
+        # COUNT(*) пагинации, авторы и их рецепты одним запросом.
+        url = '/api/users/subscriptions/'
+        response = self.assertGetQueries(self.client, url, AUTH_QUERIES + 3)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.add_recipes()
+        Subscription.objects.create(author=self.create_user('author3'),
+                                    follower=self.user)
+        response = self.assertGetQueries(self.client, f'{url}?recipes_limit=1',
+                                         AUTH_QUERIES + 3)
+        self.assertEqual(len(response.json()['results']), 4)
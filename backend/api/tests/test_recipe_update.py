@@ -0,0 +1,116 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.serializers.recipes import RecipeIngredientAddSerializer
+from recipes.models import RecipeIngredients
+from recipes.tests.base import RecipesTestCase
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RecipeIngredientsUpdateTests(RecipesTestCase):
+    """Ингредиенты рецепта обновляются разницей, а не пересозданием."""
+
+    def setUp(self):
+        self.author = self.create_user('author')
+        self.recipe = self.create_recipe(self.author)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = APIClient()
+        token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def rows(self):
+        return {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in RecipeIngredients.objects.filter(
+                recipe=self.recipe
+            ).values_list('pk', 'ingredient_id', 'amount')
+        }
+
+    def patch(self, amounts, url=None):
+        """Отправляет {индекс ингредиента: количество}, возвращает
+        изменяющие запросы к RecipeIngredients."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url or self.url, {'ingredients': [
+                {'id': self.ingredients[index].pk, 'amount': amount}
+                for index, amount in amounts.items()
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if query['sql'].startswith(WRITES)
+            and 'recipes_recipeingredients' in query['sql']
+        ]
+
+    def test_unchanged_rows_kept(self):
+        before = self.rows()
+        writes = self.patch({0: 5, 1: 1, 3: 2, 4: 2})
+        after = self.rows()
+        ids = [ingredient.pk for ingredient in self.ingredients]
+        self.assertEqual(after[ids[0]], (before[ids[0]][0], 5))
+        self.assertEqual(after[ids[1]], before[ids[1]])
+        self.assertNotIn(ids[2], after)
+        self.assertEqual({after[ids[3]][1], after[ids[4]][1]}, {2})
+        # Удаление, обновление и вставка - по одному запросу на всё.
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT', 'UPDATE'])
+
+    def test_same_ingredients_not_written(self):
+        before = self.rows()
+        self.assertEqual(self.patch({0: 1, 1: 1, 2: 1}), [])
+        self.assertEqual(self.rows(), before)
+
+    def test_amounts_changed_in_one_query(self):
+        self.assertEqual(self.patch({0: 2, 1: 3, 2: 4}), ['UPDATE'])
+        self.assertEqual(
+            sorted(amount for _, amount in self.rows().values()), [2, 3, 4]
+        )
+
+    def test_keep_ingredients(self):
+        before = self.rows()
+        response = self.client.patch(f'{self.url}?keep_ingredients=true',
+                                     {'name': 'Новое название'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['ingredients']), 3)
+        self.assertEqual(self.rows(), before)
+
+    def test_ingredients_required_without_keep(self):
+        response = self.client.patch(self.url, {'name': 'Новое название'},
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(),
+                         {'non_field_errors': ['Отсутствуют ингредиенты']})
+
+
+class RecipeIngredientsValidationTests(RecipesTestCase):
+    """Все id ингредиентов проверяются одним запросом."""
+
+    def validate(self, ids):
+        serializer = RecipeIngredientAddSerializer(
+            data=[{'id': pk, 'amount': 1} for pk in ids], many=True
+        )
+        with self.assertNumQueries(1):
+            serializer.is_valid()
+        return serializer
+
+    def test_one_query_for_all_ids(self):
+        serializer = self.validate(
+            [ingredient.pk for ingredient in self.ingredients]
+        )
+        self.assertEqual(serializer.errors, [])
+        self.assertEqual(
+            [item['ingredient']['id'] for item in serializer.validated_data],
+            list(self.ingredients),
+        )
+
+    def test_errors_for_each_missing_id(self):
+        missing = max(ingredient.pk for ingredient in self.ingredients) + 1
+        serializer = self.validate([missing, self.ingredients[0].pk,
+                                    missing + 1])
+        self.assertEqual(
+            [list(error) for error in serializer.errors],
+            [['id'], [], ['id']],
+        )
+        self.assertIn(str(missing + 1), serializer.errors[2]['id'][0])
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.response_cache import get_stats
+from recipes.tests.base import RecipesTestCase
+
+# Рецепты, их ингредиенты и COUNT(*) пагинации.
+RECIPE_LIST_QUERIES = 3
+
+
+@override_settings(METRICS_DIR='')
+class ResponseCacheTests(RecipesTestCase):
+    """Кеш ответов для анонимных: попадания без запросов к БД."""
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.author = self.create_user('author')
+        self.recipe = self.create_recipe(self.author)
+        self.client = APIClient()
+
+    def get(self, queries, client=None, url='/api/recipes/'):
+        with self.assertNumQueries(queries):
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit_without_queries(self):
+        miss = self.get(RECIPE_LIST_QUERIES)
+        hit = self.get(0)
+        self.assertEqual((miss['X-Cache'], hit['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(hit.json(), miss.json())
+
+    def test_recipe_change_invalidates(self):
+        self.get(RECIPE_LIST_QUERIES)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        response = self.get(RECIPE_LIST_QUERIES)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['name'],
+                         'Новое название')
+
+    def test_authenticated_not_cached(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+            user=self.author
+        ).key)
+        for _ in range(2):
+            self.assertNotIn('X-Cache', client.get('/api/recipes/'))
+
+    def test_counted_only_in_metrics(self):
+        before = get_stats()
+        responses = caches['responses']
+        with mock.patch.object(responses, 'incr') as incr, \
+                mock.patch.object(responses, 'add') as add:
+            self.get(RECIPE_LIST_QUERIES)
+            self.get(0)
+            self.get(0)
+        incr.assert_not_called()
+        add.assert_not_called()
+        after = get_stats()
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 1)
@@ -0,0 +1,83 @@
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe
+from recipes.search import FTS_TABLE, update_search_index
+from recipes.tests.base import RecipesTestCase
+
+
+class RecipeSearchTests(RecipesTestCase):
+    """Поиск ?search=: совпадение в названии важнее ингредиентов и описания."""
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        author = self.create_user('author')
+        tomatoes = Ingredient.objects.create(name='томаты',
+                                             measurement_unit='г')
+        self.by_text = self.create_recipe(author, name='Суп')
+        Recipe.objects.filter(pk=self.by_text.pk).update(
+            text='Подавать с томатом', cooking_time=5, popularity=3
+        )
+        self.by_ingredient = self.create_recipe(
+            author, [tomatoes, *self.ingredients[:2]], name='Салат'
+        )
+        Recipe.objects.filter(pk=self.by_ingredient.pk).update(
+            cooking_time=20, popularity=1
+        )
+        self.by_name = self.create_recipe(author, name='Томатный соус')
+        Recipe.objects.filter(pk=self.by_name.pk).update(cooking_time=10,
+                                                         popularity=2)
+        # Без других рецептов у bm25 почти нулевой IDF.
+        for index in range(10):
+            self.create_recipe(author, name=f'Компот {index}')
+        # Ингредиенты добавлены после сохранения рецептов.
+        update_search_index(Recipe.objects.values_list('pk', flat=True))
+        self.client = APIClient()
+        self.ranked = [self.by_name.pk, self.by_ingredient.pk,
+                       self.by_text.pk]
+
+    def search(self, **params):
+        response = self.client.get('/api/recipes/',
+                                   {'search': 'томат', **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_ranked_by_relevance(self):
+        self.assertEqual(self.search(), self.ranked)
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(self.search(ordering='cooking_time'),
+                         [self.by_text.pk, self.by_name.pk,
+                          self.by_ingredient.pk])
+        self.assertEqual(self.search(ordering='popular'),
+                         [self.by_text.pk, self.by_name.pk,
+                          self.by_ingredient.pk])
+
+    def test_cursor_pages_keep_rank_order(self):
+        data = self.client.get('/api/recipes/', {
+            'search': 'томат', 'pagination': 'cursor', 'limit': 1,
+        }).json()
+        found = [recipe['id'] for recipe in data['results']]
+        url = data['next']
+        while url:
+            data = self.client.get(url).json()
+            found.extend(recipe['id'] for recipe in data['results'])
+            url = data['next']
+        self.assertEqual(found, self.ranked)
+
+    def test_query_without_words(self):
+        response = self.client.get('/api/recipes/?search=%20*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.search(), [])
+        call_command('rebuild_search_index', stdout=open('/dev/null', 'w'))
+        cache.clear()
+        caches['responses'].clear()
+        self.assertEqual(self.search(), self.ranked)
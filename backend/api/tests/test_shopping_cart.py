@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import ShoppingCart
+from recipes.tests.base import RecipesTestCase
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartExportTests(RecipesTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('buyer')
+        author = self.create_user('author')
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, ingredients in (('Суп', self.ingredients[:2]),
+                                      ('Салат', self.ingredients[1:3])):
+                ShoppingCart.objects.create(
+                    user=self.user,
+                    recipe=self.create_recipe(author, ingredients, name=name),
+                )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.author_name = 'author author (author@example.com)'
+
+    def download(self, export_format):
+        response = self.client.get(URL, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response['Content-Disposition'].endswith(f'.{export_format}')
+        )
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt(self):
+        content = self.download('txt')
+        self.assertIn('2\tИнгредиент 1\t2\tг\n', content)
+        self.assertIn(f'1\tСалат\t{self.author_name}\n', content)
+        self.assertIn(f'2\tСуп\t{self.author_name}\n', content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.download('csv'))))
+        self.assertEqual(rows[:4], [
+            ['№', 'Название', 'Количество', 'Единица измерения'],
+            ['1', 'Ингредиент 0', '1', 'г'],
+            ['2', 'Ингредиент 1', '2', 'г'],
+            ['3', 'Ингредиент 2', '1', 'г'],
+        ])
+        self.assertEqual(rows[4:], [
+            [],
+            ['№', 'Название', 'Автор'],
+            ['1', 'Салат', self.author_name],
+            ['2', 'Суп', self.author_name],
+        ])
+
+    def test_json(self):
+        data = json.loads(self.download('json'))
+        self.assertEqual(
+            [(item['name'], item['amount']) for item in data['ingredients']],
+            [('ингредиент 0', 1), ('ингредиент 1', 2), ('ингредиент 2', 1)],
+        )
+        self.assertEqual(data['recipes'], [
+            {'name': 'Салат', 'author': self.author_name},
+            {'name': 'Суп', 'author': self.author_name},
+        ])
+
+    async def test_asgi_streams_asynchronously(self):
+        for export_format in ('txt', 'csv', 'json'):
+            with self.subTest(format=export_format):
+                response = await self.async_client.get(
+                    URL, {'format': export_format},
+                    headers={'Authorization': f'Token {self.token.key}'},
+                )
+                self.assertTrue(response.is_async)
+                content = b''.join([
+                    chunk async for chunk in response.streaming_content
+                ]).decode()
+                self.assertIn('Салат', content)
+                self.assertIn('нгредиент 2', content)
@@ -0,0 +1,70 @@
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.serializers.users import attach_limited_recipes
+from recipes.models import Subscription, User
+from recipes.tests.base import RecipesTestCase
+
+URL = '/api/users/subscriptions/'
+
+
+class LimitedRecipesTests(RecipesTestCase):
+    """Последние рецепты авторов подписок - одним запросом на страницу."""
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        self.user = self.create_user('reader')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.recipes = {}
+        for index, count in enumerate((4, 1, 0)):
+            self.subscribe(f'author{index}', count)
+
+    def subscribe(self, name, count):
+        author = self.create_user(name)
+        self.recipes[author.pk] = [
+            self.create_recipe(author, name=f'{name} {index}').pk
+            for index in range(count)
+        ][::-1]
+        Subscription.objects.create(author=author, follower=self.user)
+        return author
+
+    def attached(self, limit):
+        authors = list(User.objects.filter(pk__in=self.recipes)
+                       .order_by('pk'))
+        with self.assertNumQueries(1):
+            authors = attach_limited_recipes(authors, limit)
+        return {author.pk: [recipe.pk for recipe in author.recipes_limited]
+                for author in authors}
+
+    def test_limit_per_author(self):
+        self.assertEqual(self.attached(2), {
+            pk: recipes[:2] for pk, recipes in self.recipes.items()
+        })
+
+    def test_without_limit(self):
+        self.assertEqual(self.attached(None), self.recipes)
+
+    def subscriptions(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(URL, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_subscriptions_query_count_constant(self):
+        results, queries = self.subscriptions()
+        self.assertEqual(
+            {author['id']: [recipe['id'] for recipe in author['recipes']]
+             for author in results},
+            {pk: recipes[:2] for pk, recipes in self.recipes.items()},
+        )
+        self.subscribe('author3', 3)
+        self.subscribe('author4', 2)
+        results, more_queries = self.subscriptions()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(more_queries, queries)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
@@ -16,4 +17,15 @@ router.register('users', UsersViewSet, basename='user')
 urlpatterns = router.urls
 urlpatterns += [
     path('auth/', include('djoser.urls.authtoken')),
-]
\ No newline at end of file
+]
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    # Стоят раньше маршрутов роутера; прочие запросы к этим адресам
+    # асинхронные представления передают вьюсетам.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('ingredients/', async_views.ingredient_list),
+    ] + urlpatterns
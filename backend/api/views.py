@@ -1,49 +1,93 @@
-import os
-import datetime
-from django.http import FileResponse
-from django.db.models import BooleanField, Count, Q, Sum
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpResponse, HttpResponseForbidden, StreamingHttpResponse,
+)
+from django.db.models import BooleanField, Count, Prefetch, Q, Value
+from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models.functions import Lower
 from django.urls import reverse
+from django.utils.http import content_disposition_header
 from djoser.views import UserViewSet as djoser_UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import SearchFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from api.permissions import IsAuthor
+from recipes import versions
+from recipes.feed import decode_cursor, get_feed_page
+from recipes.recipe_match import match_recipes
+from recipes.trending import get_trending_recipe_ids
+from recipes.ingredient_index import autocomplete, get_ingredient_index
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
+    RecipeIngredients,
     ShoppingCart,
     User,
     Subscription
 )
-from .filters import RecipeFilterSet
+from .conditional import (
+    conditional_response,
+    ingredients_validators,
+    recipe_detail_validators,
+    recipe_list_validators,
+    similar_recipes_validators,
+)
+from .filters import RecipeFilterSet, RecipeOrderingFilter
+from .metrics import (
+    CART_EXPORT_DURATION, aobserve_duration, is_metrics_request_allowed,
+    observe_duration, render_metrics,
+)
+from .pagination import (
+    CustomCursorPagination,
+    CustomPageNumberPagination,
+    OptionalCursorPagination,
+)
+from .renderers import CSVRenderer, PlainTextRenderer
+from .response_cache import cached_anonymous_response
 from .serializers.recipes import (
     IngredientSerializer,
     RecipeViewSerializer,
     RecipeChangeSerializer,
+    ShoppingListItemSerializer,
 )
 from .serializers.users import (
     UserSerializer,
     RecipeShortSerializer,
     UserWithRecipesSerializer,
     AvatarUploadSerializer,
+    attach_limited_recipes,
+    get_recipes_limit,
+    get_subscribed_author_ids,
 )
+from .shopping_cart import EXPORT_FORMATS, astream_export, stream_export
 
 
 class RecipesViewSet(ModelViewSet):
     """Рецепты"""
-    queryset = Recipe.objects.all().prefetch_related(
-        'recipeingredients',
-        'recipeingredients__ingredient'
-    )
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('recipeingredients', queryset=RecipeIngredients.objects
+                 .select_related('ingredient'))
+    ).defer('search_vector')
     serializer_class = RecipeViewSerializer
+    # Порядок важен: RecipeOrderingFilter сортирует по rank из ?search=.
+    filter_backends = [DjangoFilterBackend, RecipeOrderingFilter]
     filterset_class = RecipeFilterSet
     permission_classes = [AllowAny]
+    pagination_class = OptionalCursorPagination
+    # Порядок ключа курсорной пагинации (индекс created_at + id).
+    ordering = ['-created_at', '-id']
 
     def get_permissions(self):
         if self.action == 'create':
@@ -53,22 +97,44 @@ class RecipesViewSet(ModelViewSet):
 
         return super().get_permissions()
 
-    def get_queryset(self):
-        user = self.request.user
-        recipes_qs = super().get_queryset()
-        if user.is_authenticated:
-            recipes_qs = recipes_qs.annotate(
-                is_favorited=Count(
-                    'favorites__id',
-                    filter=Q(favorites__user=user),
-                    output_field=BooleanField()
-                ),
-                is_in_shopping_cart=Count(
-                    'shopping_carts__id',
-                    filter=Q(shopping_carts__user=user),
-                    output_field=BooleanField()
-                ))
-        return recipes_qs
+    def list(self, request, *args, **kwargs):
+        get_response = partial(super().list, request, *args, **kwargs)
+        return conditional_response(
+            request, recipe_list_validators(request),
+            lambda: cached_anonymous_response(request, get_response)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_field, '')
+        updated_at = Recipe.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first() if str(pk).isdigit() else None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        return conditional_response(
+            request, recipe_detail_validators(request, updated_at),
+            lambda: cached_anonymous_response(request, get_response)
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        # Подписки на авторов рецептов загружаются одним запросом на страницу,
+        # а не отдельным запросом для каждого рецепта.
+        if args and args[0] is not None:
+            recipes = args[0] if kwargs.get('many') else [args[0]]
+            context = kwargs.setdefault('context',
+                                        self.get_serializer_context())
+            context['subscribed_author_ids'] = get_subscribed_author_ids(
+                self.request.user, {recipe.author_id for recipe in recipes}
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['keep_ingredients'] = self.request.query_params.get(
+            'keep_ingredients', ''
+        ).lower() in ('1', 'true')
+        return context
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
@@ -78,39 +144,142 @@ class RecipesViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    @action(methods=['GET'], detail=False, permission_classes=[IsAuthenticated],
-            url_path='download_shopping_cart', url_name='download-shopping-cart')
-    def download_shopping_cart(self, request, *args, **kwargs):
-        """Скачать список покупок в csv-формате"""
-        user = request.user
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated],
+            url_path='feed', url_name='feed')
+    def feed(self, request, *args, **kwargs):
+        """Лента рецептов авторов из подписок, новые сначала (по курсору)"""
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as error:
+            raise NotFound(str(error))
+        page_size = CustomCursorPagination().get_page_size(request)
+        recipe_ids, next_cursor = get_feed_page(request.user, page_size,
+                                                cursor)
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor',
+                                        next_cursor) if next_cursor else None,
+            'results': self._serialize_recipes(recipe_ids),
+        })
+
+    @action(methods=['GET'], detail=False, permission_classes=[AllowAny],
+            url_path='trending', url_name='trending')
+    def trending(self, request, *args, **kwargs):
+        """Популярные сейчас рецепты (?limit=, не больше 100)"""
+        limit = CustomCursorPagination().get_page_size(request)
+        return cached_anonymous_response(request, lambda: Response(
+            self._serialize_recipes(get_trending_recipe_ids()[:limit])
+        ))
+
+    @action(methods=['GET'], detail=False, permission_classes=[AllowAny],
+            url_path='match', url_name='match')
+    def match(self, request, *args, **kwargs):
+        """Рецепты из имеющихся ингредиентов (?ingredients=1,2,3)
+
+        Сначала рецепты с наибольшей долей имеющихся ингредиентов.
+        """
+        try:
+            ingredient_ids = {
+                int(value) for value in
+                request.query_params.get('ingredients', '').split(',') if value
+            }
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Ожидаются id ингредиентов через запятую'}
+            )
+        if not ingredient_ids:
+            raise ValidationError({'ingredients': 'Укажите ингредиенты'})
+        if len(ingredient_ids) > settings.RECIPE_MATCH_MAX_INGREDIENTS:
+            raise ValidationError({'ingredients': (
+                'Не больше '
+                f'{settings.RECIPE_MATCH_MAX_INGREDIENTS} ингредиентов'
+            )})
+        paginator = CustomPageNumberPagination()
+        page = paginator.paginate_queryset(
+            match_recipes(ingredient_ids, settings.RECIPE_MATCH_MAX_RESULTS),
+            request, view=self
+        )
+        matches = {recipe_id: (matched, total)
+                   for recipe_id, matched, total in page}
+        results = self._serialize_recipes(list(matches))
+        for recipe in results:
+            matched, total = matches[recipe['id']]
+            recipe['coverage'] = round(matched / total, 3)
+            recipe['missing_ingredients_count'] = total - matched
+        return paginator.get_paginated_response(results)
+
+    @action(methods=['GET'], detail=True, permission_classes=[AllowAny],
+            url_path='similar', url_name='similar')
+    def similar(self, request, pk=None, *args, **kwargs):
+        """Похожие по ингредиентам рецепты (?limit=), самые похожие сначала"""
+        if not str(pk).isdigit():
+            raise NotFound()
+        limit = CustomCursorPagination().get_page_size(request)
+
+        def get_response():
+            recipes = list(
+                self.get_queryset().filter(similar_for__recipe_id=pk)
+                .order_by('-similar_for__score', '-pk')[:limit]
+            )
+            if not recipes:
+                get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+            return Response(self.get_serializer(recipes, many=True).data)
+
+        return conditional_response(
+            request, similar_recipes_validators(request),
+            lambda: cached_anonymous_response(
+                request, get_response,
+                extra_versions=[versions.SIMILAR_RECIPES],
+            )
+        )
 
-        ingredients = Ingredient.objects.filter(
-            recipeingredients__recipe__shopping_carts__user=user
-        ).distinct().order_by(Lower('name')).annotate(
-            amount=Sum('recipeingredients__amount')
+    def _serialize_recipes(self, recipe_ids):
+        """Рецепты с заданными id в том же порядке (удалённые пропускаются)."""
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        ).data
+
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer],
+            url_path='download_shopping_cart',
+            url_name='download-shopping-cart')
+    def download_shopping_cart(self, request, *args, **kwargs):
+        """Скачать список покупок в формате txt (по умолчанию), csv или json"""
+        # Формат выбирается при согласовании содержимого
+        # (?format= или Accept).
+        export = EXPORT_FORMATS[request.accepted_renderer.format]()
+        if isinstance(request._request, ASGIRequest):
+            content = aobserve_duration(
+                CART_EXPORT_DURATION, astream_export(export, request.user),
+                format=export.extension,
+            )
+        else:
+            content = observe_duration(
+                CART_EXPORT_DURATION, stream_export(export, request.user),
+                format=export.extension,
+            )
+        response = StreamingHttpResponse(content,
+                                         content_type=export.content_type)
+        response['Content-Disposition'] = content_disposition_header(
+            as_attachment=True, filename=f'Покупки.{export.extension}'
         )
-        recipes = Recipe.objects.filter(shopping_carts__user=user) \
-            .select_related('author') \
-            .order_by('name')
-        current_date = datetime.datetime.now().strftime('%d.%m.%Y')
-
-        output_text = '\n'.join([
-            f'Список продуктов. Сформирован {current_date}',
-            '№,\tНазвание,\tКоличество,\tЕдиница измерения'
-            '\n'.join([
-                f'{n},\t{ing.name.capitalize()},\t{ing.amount},\t{ing.measurement_unit}'
-                for n, ing in enumerate(ingredients, start=1)
-            ]),
-            '\nСписок рецептов, для которых эти продукты:',
-            '№,\tНазвание,\tАвтор'
-            '\n'.join([
-                f'{n},\t{recipe.name.capitalize()},\t{recipe.author}'
-                for n, recipe in enumerate(recipes, start=1)
-            ]),
-        ])
-        response = FileResponse(output_text, filename='Покупки.txt', as_attachment=True)
         return response
 
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_list', url_name='shopping-list')
+    def shopping_list(self, request, *args, **kwargs):
+        """Список покупок (суммы ингредиентов из корзины) в JSON"""
+        shopping_list_qs = request.user.shopping_list_items \
+            .select_related('ingredient') \
+            .order_by(Lower('ingredient__name'))
+        return Response(ShoppingListItemSerializer(
+            shopping_list_qs, many=True, context=self.get_serializer_context()
+        ).data)
+
     @action(methods=['GET'], detail=True,
             permission_classes=[AllowAny],
             url_path='get-link', url_name='get-short-link')
@@ -148,14 +317,16 @@ class RecipesViewSet(ModelViewSet):
 
     def _add_to_model(self, model_class, user, recipe_pk):
         recipe = get_object_or_404(Recipe, pk=recipe_pk)
-        _, is_created = model_class.objects.get_or_create(user=user, recipe=recipe)
+        _, is_created = model_class.objects.get_or_create(user=user,
+                                                          recipe=recipe)
         if not is_created:
             return Response({
-                'detail': f'Рецепт "{recipe}" уже добавлен в {model_class._meta.verbose_name}'
+                'detail': f'Рецепт "{recipe}" уже добавлен в '
+                          f'{model_class._meta.verbose_name}'
             }, status=status.HTTP_400_BAD_REQUEST)
         return Response(RecipeShortSerializer(
-                instance=recipe, context=self.get_serializer_context()
-            ).data, status=status.HTTP_201_CREATED)
+            instance=recipe, context=self.get_serializer_context()
+        ).data, status=status.HTTP_201_CREATED)
 
     def _delete_from_model(self, model_class, user, recipe_pk):
         get_object_or_404(model_class, user=user, recipe_id=recipe_pk).delete()
@@ -167,9 +338,33 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
-    search_fields = ['^name']
-    filterset_fields = ['name']
     pagination_class = None
+    # Прежний поиск ?search= по началу названия, без ограничения числа.
+    filter_backends = [SearchFilter]
+    search_fields = ['^name']
+
+    def list(self, request, *args, **kwargs):
+        # ?name= - автодополнение по индексу в памяти: по началу названия,
+        # не больше INGREDIENTS_AUTOCOMPLETE_LIMIT (на PostgreSQL дополняется
+        # нечёткими совпадениями).
+        name = request.query_params.get('name', None)
+        if 'search' in request.query_params:
+            get_response = partial(super().list, request, *args, **kwargs)
+        elif name is None:
+            def get_response():
+                return Response(get_ingredient_index().items)
+        else:
+            def get_response():
+                return Response(autocomplete(name))
+        return conditional_response(
+            request, ingredients_validators(request), get_response
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request, ingredients_validators(request),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
 
 
 class UsersViewSet(djoser_UserViewSet):
@@ -178,6 +373,9 @@ class UsersViewSet(djoser_UserViewSet):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
     filterset_fields = []
+    pagination_class = OptionalCursorPagination
+    # Порядок ключа курсорной пагинации (уникальный индекс email).
+    ordering = ['email']
 
     def get_queryset(self):
         users_qs = super().get_queryset()
@@ -220,9 +418,9 @@ class UsersViewSet(djoser_UserViewSet):
     def _delete_my_avatar(self, request):
         user = request.user
         if user.avatar:
-            os.remove(user.avatar.path)
+            # Файл удаляется сигналом, если на него больше нет ссылок.
             user.avatar = None
-            user.save()
+            user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['GET'],
@@ -232,8 +430,10 @@ class UsersViewSet(djoser_UserViewSet):
         """Мои подписки"""
         user = request.user
         users_qs = User.objects.filter(subscriptions_author__follower=user) \
-            .annotate(recipes_count=Count('recipes'))
-        page = self.paginate_queryset(users_qs)
+            .annotate(is_subscribed=Value(True, output_field=BooleanField())) \
+            .order_by(*self.ordering)
+        page = attach_limited_recipes(self.paginate_queryset(users_qs),
+                                      get_recipes_limit(request))
         serializer = UserWithRecipesSerializer(
             page, many=True, context=self.get_serializer_context()
         )
@@ -250,8 +450,7 @@ class UsersViewSet(djoser_UserViewSet):
         if request.method == 'DELETE':
             return self._unsubscribe(user, author)
 
-        recipes_limit = request.query_params.get('recipes_limit', None)
-        return self._subscribe(user, author, recipes_limit)
+        return self._subscribe(user, author, get_recipes_limit(request))
 
     def _subscribe(self, user, author, recipes_limit=None):
         if user == author:
@@ -267,8 +466,8 @@ class UsersViewSet(djoser_UserViewSet):
                 {'detail': f'Вы уже подписаны на пользователя: {author}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if recipes_limit:
-            author.recipes_limited = author.recipes.all()[:int(recipes_limit)]
+        author.is_subscribed = True
+        attach_limited_recipes([author], recipes_limit)
         serializer = UserWithRecipesSerializer(
             instance=author,
             context=self.get_serializer_context()
@@ -279,3 +478,16 @@ class UsersViewSet(djoser_UserViewSet):
         """Отписаться от пользователя"""
         get_object_or_404(Subscription, author=author, follower=user).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    if not is_metrics_request_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+metrics_view.skip_metrics = True
@@ -82,6 +82,19 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='sqlite:///db.sqlite3'),
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Триграммный поиск (pg_trgm) для автодополнения ингредиентов.
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# При нескольких процессах gunicorn нужен общий кеш (например, filecache:// или redis://).
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # Кеш ответов API для анонимных пользователей (api/response_cache.py).
+    'responses': env.cache('RESPONSE_CACHE_URL', default='locmemcache://responses'),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -150,3 +163,96 @@ DJOSER = {
 }
 
 RECIPE_SHORT_LINK_BASE_PATH = 's'
+
+# Время жизни кеша id рецептов в избранном/корзине пользователя (сек.)
+RECIPE_IDS_CACHE_TIMEOUT = env.int('RECIPE_IDS_CACHE_TIMEOUT', default=60 * 60)
+
+# Автодополнение ингредиентов: максимум результатов и минимальная длина
+# запроса для нечёткого (триграммного) поиска на PostgreSQL.
+INGREDIENTS_AUTOCOMPLETE_LIMIT = env.int('INGREDIENTS_AUTOCOMPLETE_LIMIT', default=30)
+INGREDIENTS_FUZZY_MIN_LENGTH = 3
+
+# Время жизни ответов в кеше для анонимных пользователей (сек.), 0 - отключить.
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=5 * 60)
+
+# Загрузка картинок (base64) и их уменьшенные копии (WebP).
+IMAGE_ALLOWED_FORMATS = ['JPEG', 'PNG', 'GIF', 'WEBP']
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_THUMBNAIL_SIZES = {'small': 320, 'medium': 800}
+IMAGE_THUMBNAIL_QUALITY = 80
+# Потоков для фонового создания копий; 0 - создавать сразу при сохранении.
+IMAGE_THUMBNAIL_WORKERS = env.int('IMAGE_THUMBNAIL_WORKERS', default=2)
+# Файл картинки без ссылок не удаляется, пока с его загрузки или повторного
+# использования не прошло столько секунд: ссылка на него может быть ещё в
+# незавершённой транзакции. Такие файлы удаляет collect_media_garbage.
+IMAGE_RELEASE_MIN_AGE = 10 * 60
+
+# Лента подписок (recipes/feed.py): рецепты авторов, у которых больше
+# FEED_FAN_OUT_MAX_FOLLOWERS подписчиков, не копируются в ленты, а
+# подмешиваются при чтении. При подписке в ленту добавляются
+# FEED_BACKFILL_SIZE последних рецептов автора.
+FEED_FAN_OUT_MAX_FOLLOWERS = env.int('FEED_FAN_OUT_MAX_FOLLOWERS', default=1000)
+FEED_BACKFILL_SIZE = 50
+
+# Популярность рецептов (recipes/trending.py): веса добавления в избранное и
+# в корзину, период полураспада веса события; список /api/recipes/trending/
+# и порядок ?ordering=popular обновляются раз в TRENDING_CACHE_TIMEOUT секунд.
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+TRENDING_HALF_LIFE_HOURS = env.float('TRENDING_HALF_LIFE_HOURS', default=72)
+TRENDING_CACHE_TIMEOUT = env.int('TRENDING_CACHE_TIMEOUT', default=5 * 60)
+TRENDING_SIZE = 100
+
+# Подбор рецептов по ингредиентам (/api/recipes/match/): не больше
+# RECIPE_MATCH_MAX_INGREDIENTS ингредиентов в запросе и
+# RECIPE_MATCH_MAX_RESULTS рецептов в выдаче.
+RECIPE_MATCH_MAX_INGREDIENTS = 100
+RECIPE_MATCH_MAX_RESULTS = env.int('RECIPE_MATCH_MAX_RESULTS', default=1000)
+
+# Похожие рецепты (recipes/similar.py): сколько соседей хранится для рецепта
+# и сколько рецептов обрабатывается одним умножением матриц (память растёт
+# пропорционально числу рецептов в пачке).
+SIMILAR_RECIPES_SIZE = env.int('SIMILAR_RECIPES_SIZE', default=10)
+SIMILAR_RECIPES_BATCH_SIZE = env.int('SIMILAR_RECIPES_BATCH_SIZE', default=200)
+
+# Асинхронные представления чтения рецептов и ингредиентов (api/async_views.py)
+# для запуска под ASGI: gunicorn -c gunicorn_asgi.conf.py
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# Профилирование запросов (api/profiling.py): число и время SQL-запросов,
+# повторяющиеся запросы, время сериализации - в заголовке Server-Timing и
+# в логе api.profiling. cProfile медленных запросов сохраняется в каталог
+# PROFILING_CPROFILE_DIR (пустое значение - не профилировать).
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=False)
+PROFILING_SERVER_TIMING = env.bool('PROFILING_SERVER_TIMING', default=True)
+PROFILING_DUPLICATE_THRESHOLD = 3
+PROFILING_SLOW_REQUEST_MS = env.int('PROFILING_SLOW_REQUEST_MS', default=500)
+PROFILING_CPROFILE_DIR = env('PROFILING_CPROFILE_DIR', default='')
+PROFILING_CPROFILE_SAMPLE_RATE = env.float('PROFILING_CPROFILE_SAMPLE_RATE',
+                                           default=0.1)
+if PROFILING_ENABLED:
+    MIDDLEWARE.insert(0, 'api.profiling.ProfilingMiddleware')
+
+# Метрики в формате Prometheus на /metrics (api/metrics.py). При нескольких
+# процессах (gunicorn --workers) задайте общий каталог METRICS_DIR. Доступ -
+# с адресов (или сетей) METRICS_ALLOWED_IPS либо с токеном METRICS_TOKEN.
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=False)
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS',
+                               default=['127.0.0.1', '::1'])
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_DIR = env('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=5)
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'api.metrics.MetricsMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {'handlers': ['console'], 'level': 'INFO',
+                          'propagate': False},
+    },
+}
@@ -0,0 +1,40 @@
+"""Запуск в режиме ASGI: gunicorn -c gunicorn_asgi.conf.py
+
+Воркеры uvicorn обслуживают асинхронные представления чтения
+(api/async_views.py) без выделенного потока на каждого клиента.
+
+Отметки версий (recipes/versions.py), на которых держатся ETag, кеш ответов
+и индексы в памяти, хранятся в кеше CACHE_URL. Кеш в памяти процесса
+(locmemcache://) у каждого воркера свой: запись в одном воркере не видна
+остальным, и они отдают устаревшие ответы. Поэтому без общего кеша (redis,
+memcached, filecache) запускается один воркер, а GUNICORN_WORKERS больше 1
+считается ошибкой.
+"""
+import multiprocessing
+import os
+from pathlib import Path
+
+import environ
+
+# Тот же .env, что читают настройки Django.
+environ.Env.read_env(Path(__file__).resolve().parent / '.env')
+
+LOCAL_CACHE_SCHEMES = ('locmemcache:', 'dummycache:')
+shared_cache = not os.environ.get('CACHE_URL', 'locmemcache://') \
+    .startswith(LOCAL_CACHE_SCHEMES)
+
+wsgi_app = 'foodgram.asgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() if shared_cache else 1
+))
+if workers > 1 and not shared_cache:
+    raise RuntimeError(
+        f'GUNICORN_WORKERS={workers} требует общего кеша: задайте CACHE_URL '
+        '(например, redis://redis:6379/1)'
+    )
+raw_env = ['ASYNC_VIEWS=True']
+# Несколько процессов: метрики собираются через общий каталог.
+if 'METRICS_DIR' not in os.environ:
+    raw_env.append('METRICS_DIR=/tmp/foodgram-metrics')
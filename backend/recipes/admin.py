@@ -7,6 +7,9 @@ from .models import (
     Recipe, RecipeIngredients, Ingredient, ShoppingCart,
     User, Subscription, FavoriteRecipe
 )
+from .search import update_search_index
+from .shopping_list import get_recipe_amounts
+from .similar import mark_similar_outdated
 
 
 class SubscriptionInlineAdmin(admin.TabularInline):
@@ -15,12 +18,14 @@ class SubscriptionInlineAdmin(admin.TabularInline):
     fields = ['author']
     extra = 1
 
+
 class FavoriteRecipeInlineAdmin(admin.TabularInline):
     model = FavoriteRecipe
     fk_name = 'user'
     fields = ['recipe']
     extra = 1
 
+
 class ShoppingCartInlineAdmin(admin.TabularInline):
     model = ShoppingCart
     fk_name = 'user'
@@ -32,6 +37,9 @@ class BaseHasSomethingFilter(admin.SimpleListFilter):
     item_to_filter = ''
     lookup_choices = [('yes', 'Да'), ('no', 'Нет')]
 
+    def lookups(self, request, model_admin):
+        return self.lookup_choices
+
     def queryset(self, request, user_qs):
         if self.value() == 'yes':
             return user_qs.filter(**{f'{self.item_to_filter}__gte': 1})
@@ -41,17 +49,19 @@ class BaseHasSomethingFilter(admin.SimpleListFilter):
 
 
 class HasRecipesFilter(BaseHasSomethingFilter):
-    item_to_filter = '_recipes_count'
+    item_to_filter = 'recipes_count'
     title = 'Есть рецепты'
     parameter_name = 'has-recipes'
 
+
 class HasAuthorsFilter(BaseHasSomethingFilter):
-    item_to_filter = '_authors_count'
+    item_to_filter = 'authors_count'
     title = 'Есть подписки'
     parameter_name = 'has-authors'
 
+
 class HasFollowersFilter(BaseHasSomethingFilter):
-    item_to_filter = '_followers_count'
+    item_to_filter = 'followers_count'
     title = 'Есть подписчики'
     parameter_name = 'has-followers'
 
@@ -61,16 +71,21 @@ class UserAdmin(auth_UserAdmin):
     list_display = ['pk', 'username', 'full_name', 'email', 'avatar_preview',
                     'recipes_count', 'authors_count', 'followers_count']
     list_display_links = ['pk', 'username']
-    inlines = [SubscriptionInlineAdmin, FavoriteRecipeInlineAdmin, ShoppingCartInlineAdmin]
+    inlines = [SubscriptionInlineAdmin, FavoriteRecipeInlineAdmin,
+               ShoppingCartInlineAdmin]
     readonly_fields = ['pk', 'avatar_preview', 'full_name',
                        'followers_count', 'recipes_count', 'authors_count',
                        'groups', 'last_login', 'user_permissions']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Аватар', {'fields': ('avatar',)}),
-        ('Персональная информация', {'fields': ('first_name', 'last_name', 'username')}),
+        ('Персональная информация', {
+            'fields': ('first_name', 'last_name', 'username')
+        }),
         ('Доступ', {'fields': ('is_active', 'is_staff', 'is_superuser')}),
-        ('Разное', {'fields': ('recipes_count', 'followers_count', 'authors_count')}),
+        ('Разное', {
+            'fields': ('recipes_count', 'followers_count', 'authors_count')
+        }),
         ('Даты', {'fields': ('last_login', 'date_joined')}),
     )
     list_filter = [HasRecipesFilter, HasFollowersFilter, HasAuthorsFilter]
@@ -79,34 +94,16 @@ class UserAdmin(auth_UserAdmin):
     sortable_by = ['pk', 'username', 'full_name', 'email',
                    'recipes_count', 'authors_count', 'followers_count']
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            _followers_count=Count('subscriptions_author', distinct=True),
-            _authors_count=Count('subscriptions_follower', distinct=True),
-            _recipes_count=Count('recipes', distinct=True),
-        )
-
     @admin.display(ordering='first_name', description='ФИО')
     def full_name(self, obj):
         return f'{obj.first_name} {obj.last_name}'
 
-    @admin.display(ordering='_recipes_count', description='Рецептов')
-    def recipes_count(self, obj):
-        return obj._recipes_count
-
-    @admin.display(ordering='_followers_count', description='Подписчиков')
-    def followers_count(self, obj):
-        return obj._followers_count
-
-    @admin.display(ordering='_authors_count', description='Подписок')
-    def authors_count(self, obj):
-        return obj._authors_count
-
     @admin.display(description='Аватар')
     @mark_safe
     def avatar_preview(self, obj):
         if obj.avatar:
-            return f'<img src="{obj.avatar.url}" style="max-height: 100px; max-width: 130px;" />'
+            return (f'<img src="{obj.avatar.url}" '
+                    'style="max-height: 100px; max-width: 130px;" />')
         return 'Нету'
 
 
@@ -116,7 +113,6 @@ class IsInRecipesFilter(BaseHasSomethingFilter):
     item_to_filter = '_recipes_count'
 
 
-
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ['pk', 'name', 'measurement_unit', 'recipes_count']
@@ -147,7 +143,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'favorites_count', 'ingredients_list', 'image_preview'
     ]
     list_display_links = ['pk', 'name']
-    readonly_fields = ['pk', 'image_preview']
+    readonly_fields = ['pk', 'image_preview', 'favorites_count']
     inlines = [RecipeIngredientInlineAdmin]
     list_select_related = ['author']
     list_filter = ['author', 'cooking_time']
@@ -155,16 +151,24 @@ class RecipeAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
     sortable_by = ['pk', 'name', 'cooking_time', 'author', 'favorites_count']
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            _favorites_count=Count('favorites', distinct=True)
-        )
+    def save_related(self, request, form, formsets, change):
+        # Изменения ингредиентов через инлайн учитываются в поисковом
+        # документе рецепта (списки покупок обновляют сигналы строк).
+        recipe = form.instance
+        old_amounts = get_recipe_amounts(recipe.pk) if change else {}
+        super().save_related(request, form, formsets, change)
+        new_amounts = get_recipe_amounts(recipe.pk)
+        update_search_index([recipe.pk])
+        # Похожие рецепты зависят только от состава, не от количества.
+        if old_amounts.keys() != new_amounts.keys():
+            mark_similar_outdated([recipe.pk])
 
     @admin.display(description='Ингредиенты')
     @mark_safe
     def ingredients_list(self, obj):
         return '<br/>'.join(
-            f'{ri.ingredient.name} - {ri.amount} {ri.ingredient.measurement_unit}'
+            f'{ri.ingredient.name} - {ri.amount} '
+            f'{ri.ingredient.measurement_unit}'
             for ri in obj.recipeingredients.all().select_related('ingredient')
         )
 
@@ -172,13 +176,10 @@ class RecipeAdmin(admin.ModelAdmin):
     @mark_safe
     def image_preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-height: 100px; max-width: 130px;" />'
+            return (f'<img src="{obj.image.url}" '
+                    'style="max-height: 100px; max-width: 130px;" />')
         return 'Нету'
 
-    @admin.display(ordering='_favorites_count', description='В избранном')
-    def favorites_count(self, obj):
-        return obj._favorites_count
-
 
 class UserRecipeAdminMixin:
     list_display = ['pk', 'user', 'recipe']
@@ -0,0 +1,109 @@
+"""Кеш id рецептов из избранного и корзины пользователя.
+
+Id хранятся в кеше Django как отсортированный array('q') (8 байт на рецепт),
+проверка принадлежности - бинарный поиск. В ключ входит отметка версии
+списка (recipes.versions), которую сигналы обновляют после коммита
+добавления/удаления записей FavoriteRecipe и ShoppingCart. Отметка читается
+до запроса к БД: если запрос успел увидеть данные до коммита, они попадут
+в кеш под старой версией и читаться больше не будут.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+from .models import FavoriteRecipe, ShoppingCart
+
+
+def _version_name(model_class, user_id):
+    return f'recipe-ids:{model_class._meta.model_name}:{user_id}'
+
+
+def _cache_key(model_class, user_id, version):
+    return f'{_version_name(model_class, user_id)}:{version}'
+
+
+def get_user_recipe_ids(model_class, user_id):
+    """Отсортированные id рецептов пользователя из model_class."""
+    key = _cache_key(model_class, user_id, versions.get_changed_at(
+        _version_name(model_class, user_id)
+    ))
+    recipe_ids = array('q')
+    raw = cache.get(key)
+    if raw is not None:
+        recipe_ids.frombytes(raw)
+        return recipe_ids
+
+    recipe_ids.extend(
+        model_class.objects.filter(user_id=user_id)
+        .order_by('recipe_id').values_list('recipe_id', flat=True)
+    )
+    cache.add(key, recipe_ids.tobytes(), settings.RECIPE_IDS_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+async def aget_user_recipe_ids(model_class, user_id):
+    """То же для асинхронных представлений."""
+    key = _cache_key(model_class, user_id, await versions.aget_changed_at(
+        _version_name(model_class, user_id)
+    ))
+    recipe_ids = array('q')
+    raw = await cache.aget(key)
+    if raw is not None:
+        recipe_ids.frombytes(raw)
+        return recipe_ids
+
+    recipe_ids.extend([
+        recipe_id async for recipe_id in model_class.objects
+        .filter(user_id=user_id).order_by('recipe_id')
+        .values_list('recipe_id', flat=True)
+    ])
+    await cache.aadd(key, recipe_ids.tobytes(),
+                     settings.RECIPE_IDS_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def invalidate_user_recipe_ids(model_class, user_id):
+    versions.touch(_version_name(model_class, user_id))
+
+
+def contains_id(sorted_ids, value):
+    index = bisect_left(sorted_ids, value)
+    return index < len(sorted_ids) and sorted_ids[index] == value
+
+
+class UserRecipeFlags:
+    """Флаги is_favorited / is_in_shopping_cart для рецептов пользователя.
+
+    Списки id загружаются из кеша лениво, один раз на объект.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._recipe_ids = {}
+
+    def _get_ids(self, model_class):
+        if not self.user.is_authenticated:
+            return ()
+        if model_class not in self._recipe_ids:
+            self._recipe_ids[model_class] = get_user_recipe_ids(
+                model_class, self.user.pk
+            )
+        return self._recipe_ids[model_class]
+
+    async def aload(self):
+        """Загрузить оба списка заранее (для асинхронных представлений)."""
+        if self.user.is_authenticated:
+            for model_class in (FavoriteRecipe, ShoppingCart):
+                self._recipe_ids[model_class] = await aget_user_recipe_ids(
+                    model_class, self.user.pk
+                )
+        return self
+
+    def is_favorited(self, recipe_id):
+        return contains_id(self._get_ids(FavoriteRecipe), recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return contains_id(self._get_ids(ShoppingCart), recipe_id)
@@ -0,0 +1,51 @@
+"""Счётчики рецептов, подписчиков и подписок пользователя и избранного рецепта.
+
+Поля User.recipes_count, followers_count, authors_count и
+Recipe.favorites_count меняются атомарно через F() сигналами
+(recipes/signals.py) при добавлении и удалении связей, поэтому админке и API
+не нужно считать COUNT по соединениям. Массовые операции (bulk_create,
+QuerySet.update/delete без сигналов) счётчики не меняют - расхождения
+исправляет reconcile_counters (команда reconcile_counters).
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import FavoriteRecipe, Recipe, Subscription, User
+
+# (модель, поле счётчика): (модель связи, поле внешнего ключа на модель)
+COUNTERS = {
+    (User, 'recipes_count'): (Recipe, 'author'),
+    (User, 'followers_count'): (Subscription, 'author'),
+    (User, 'authors_count'): (Subscription, 'follower'),
+    (Recipe, 'favorites_count'): (FavoriteRecipe, 'recipe'),
+}
+
+
+def update_counters(instance, delta):
+    """Изменить на delta счётчики, в которые входит связь instance."""
+    for (model, field), (source, fk_name) in COUNTERS.items():
+        if isinstance(instance, source):
+            model.objects.filter(pk=getattr(instance, f'{fk_name}_id')) \
+                .update(**{field: F(field) + delta})
+
+
+def actual_count(source, fk_name):
+    return Coalesce(Subquery(
+        source.objects.filter(**{fk_name: OuterRef('pk')}).order_by()
+        .values(fk_name).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def reconcile_counters(check=False):
+    """Пересчитать разошедшиеся счётчики (с check - только найти).
+
+    Возвращает {модель.поле: число строк с расхождением}.
+    """
+    fixed = {}
+    for (model, field), (source, fk_name) in COUNTERS.items():
+        count = actual_count(source, fk_name)
+        drifted = model.objects.exclude(**{field: count})
+        fixed[f'{model.__name__}.{field}'] = (
+            drifted.count() if check else drifted.update(**{field: count})
+        )
+    return fixed
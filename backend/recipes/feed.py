@@ -0,0 +1,152 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Fan-out-on-write: при создании рецепта строки FeedEntry добавляются в ленты
+всех подписчиков автора, и чтение ленты - выборка по индексу
+(follower, created_at) без соединения подписок с рецептами.
+
+Копировать рецепт автора, у которого больше FEED_FAN_OUT_MAX_FOLLOWERS
+подписчиков, в каждую ленту дорого: для таких рецептов пишется одна строка
+с пустым follower, и при чтении они подмешиваются к ленте (fan-out-on-read).
+
+Страницы ленты выбираются по курсору (created_at, id рецепта), без OFFSET.
+"""
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import FeedEntry, Recipe, Subscription
+
+BATCH_SIZE = 1000
+
+
+def fan_out_recipe(recipe_id):
+    """Добавить новый рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id) \
+        .values('author_id', 'created_at').first()
+    if recipe is None:
+        return
+    follower_ids = Subscription.objects.filter(
+        author_id=recipe['author_id']
+    ).values_list('follower_id', flat=True)
+    if follower_ids.count() > settings.FEED_FAN_OUT_MAX_FOLLOWERS:
+        follower_ids = [None]
+    FeedEntry.objects.bulk_create([
+        FeedEntry(follower_id=follower_id, recipe_id=recipe_id, **recipe)
+        for follower_id in follower_ids
+    ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill_feed(follower_id, author_id):
+    """Добавить в ленту нового подписчика последние рецепты автора.
+
+    Рецепты, которые подмешиваются при чтении, не копируются.
+    """
+    recipes = Recipe.objects.filter(author_id=author_id).exclude(
+        pk__in=FeedEntry.objects.filter(author_id=author_id,
+                                        follower__isnull=True)
+        .values('recipe_id')
+    ).order_by('-created_at', '-id').values_list('pk', 'created_at')
+    FeedEntry.objects.bulk_create([
+        FeedEntry(follower_id=follower_id, author_id=author_id,
+                  recipe_id=recipe_id, created_at=created_at)
+        for recipe_id, created_at in recipes[:settings.FEED_BACKFILL_SIZE]
+    ], ignore_conflicts=True)
+
+
+def remove_from_feed(follower_id, author_id):
+    FeedEntry.objects.filter(follower_id=follower_id,
+                             author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild_feeds():
+    """Заново заполнить все ленты по подпискам; возвращает число строк."""
+    FeedEntry.objects.all().delete()
+    followers_count = dict(
+        Subscription.objects.values('author_id')
+        .annotate(count=Count('pk')).values_list('author_id', 'count')
+    )
+    followers = {}
+    for author_id, follower_id in Subscription.objects.values_list(
+        'author_id', 'follower_id'
+    ).iterator():
+        followers.setdefault(author_id, []).append(follower_id)
+
+    def iter_entries():
+        for recipe_id, author_id, created_at in Recipe.objects.filter(
+            author_id__in=list(followers_count)
+        ).values_list('pk', 'author_id', 'created_at').iterator():
+            fan_out_max = settings.FEED_FAN_OUT_MAX_FOLLOWERS
+            if followers_count[author_id] > fan_out_max:
+                follower_ids = [None]
+            else:
+                follower_ids = followers[author_id]
+            for follower_id in follower_ids:
+                yield FeedEntry(follower_id=follower_id, author_id=author_id,
+                                recipe_id=recipe_id, created_at=created_at)
+
+    created = 0
+    batch = []
+    for entry in iter_entries():
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            created += len(FeedEntry.objects.bulk_create(batch))
+            batch = []
+    return created + len(FeedEntry.objects.bulk_create(batch))
+
+
+def encode_cursor(created_at, recipe_id):
+    return urlsafe_b64encode(
+        f'{created_at.isoformat()}|{recipe_id}'.encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id рецепта); ValueError, если курсор повреждён."""
+    try:
+        created_at, recipe_id = urlsafe_b64decode(cursor.encode()) \
+            .decode().split('|')
+        return datetime.fromisoformat(created_at), int(recipe_id)
+    except (TypeError, UnicodeError, ValueError) as error:
+        raise ValueError('Неверный курсор') from error
+
+
+def get_feed_page(user, limit, cursor=None):
+    """(id рецептов страницы по убыванию даты, курсор следующей или None).
+
+    Своя лента и рецепты авторов с fan-out-on-read выбираются двумя
+    запросами по limit + 1 строк и сливаются по (created_at, id).
+    """
+    sources = [
+        FeedEntry.objects.filter(follower=user),
+        FeedEntry.objects.filter(
+            follower__isnull=True,
+            author_id__in=Subscription.objects.filter(follower=user)
+            .values('author_id'),
+        ),
+    ]
+    if cursor is not None:
+        created_at, recipe_id = cursor
+        after = Q(created_at__lt=created_at) | Q(created_at=created_at,
+                                                 recipe_id__lt=recipe_id)
+        sources = [queryset.filter(after) for queryset in sources]
+    rows = heapq.merge(*(
+        list(queryset.order_by('-created_at', '-recipe_id')
+             .values_list('created_at', 'recipe_id')[:limit + 1])
+        for queryset in sources
+    ), reverse=True)
+    page = []
+    for row in rows:
+        # Дубль возможен, если подписка и публикация рецепта
+        # выполнялись одновременно.
+        if not page or page[-1] != row:
+            page.append(row)
+        if len(page) > limit:
+            break
+    next_cursor = (encode_cursor(*page[limit - 1]) if len(page) > limit
+                   else None)
+    return [recipe_id for _, recipe_id in page[:limit]], next_cursor
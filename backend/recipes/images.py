@@ -0,0 +1,153 @@
+"""Уменьшенные копии (WebP) картинок рецептов и аватаров.
+
+Копии создаются в фоновом пуле потоков после сохранения объекта и лежат
+в том же хранилище рядом с оригиналом: images/abc.png ->
+images/abc__small.webp, images/abc__medium.webp. Ссылки на них строятся
+без обращения к хранилищу (см. thumbnail_urls).
+
+Файлы картинок могут использоваться несколькими объектами (см.
+recipes.storage.ContentAddressedStorage), поэтому удаляются только когда
+ссылок на них не осталось (delete_unused_image).
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Recipe, User
+from .storage import get_image_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def thumbnail_name(name, size):
+    return f'{os.path.splitext(name)[0]}__{size}.webp'
+
+
+def thumbnail_urls(image_field_file):
+    """{размер: url} уменьшенных копий или None, если картинки нет."""
+    if not image_field_file:
+        return None
+    return {
+        size: image_field_file.storage.url(
+            thumbnail_name(image_field_file.name, size)
+        )
+        for size in settings.IMAGE_THUMBNAIL_SIZES
+    }
+
+
+def generate_thumbnails(name, storage=default_storage, overwrite=False):
+    with storage.open(name, 'rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for size, max_side in settings.IMAGE_THUMBNAIL_SIZES.items():
+            target = thumbnail_name(name, size)
+            if storage.exists(target):
+                if not overwrite:
+                    continue
+                storage.delete(target)
+            thumbnail = image.copy()
+            thumbnail.thumbnail((max_side, max_side))
+            buffer = BytesIO()
+            thumbnail.save(buffer, 'WEBP',
+                           quality=settings.IMAGE_THUMBNAIL_QUALITY)
+            storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def delete_thumbnails(name, storage=default_storage):
+    for size in settings.IMAGE_THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(name, size))
+
+
+def has_thumbnails(name, storage=default_storage):
+    return all(storage.exists(thumbnail_name(name, size))
+               for size in settings.IMAGE_THUMBNAIL_SIZES)
+
+
+def _generate_thumbnails_safe(name, storage):
+    try:
+        generate_thumbnails(name, storage)
+    except Exception:
+        logger.exception('Не удалось создать уменьшенные копии %s', name)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule_thumbnails(image_field_file):
+    """Создать уменьшенные копии в фоне (или сразу, если пул отключён)."""
+    # Копии пишутся через default_storage: хранилище полей картинок
+    # (ContentAddressedStorage) сохранило бы их под именем-хешем.
+    if not image_field_file or has_thumbnails(image_field_file.name):
+        return
+    args = (image_field_file.name, default_storage)
+    if settings.IMAGE_THUMBNAIL_WORKERS:
+        _get_executor().submit(_generate_thumbnails_safe, *args)
+    else:
+        _generate_thumbnails_safe(*args)
+
+
+def count_references(name):
+    """Сколько рецептов и пользователей используют файл картинки."""
+    return (Recipe.objects.filter(image=name).count()
+            + User.objects.filter(avatar=name).count())
+
+
+def _is_fresh(path, min_age):
+    return time.time() - os.path.getmtime(path) < min_age
+
+
+def delete_unused_image(name, min_age):
+    """Удалить файл картинки и его копии, если на него нет ссылок.
+
+    Ссылку из незавершённой транзакции не видно, поэтому файлы, загруженные
+    или использованные заново (storage.save обновляет mtime) меньше min_age
+    секунд назад, не удаляются. Перед удалением файл переименовывается и
+    проверяется ещё раз: запрос, успевший использовать его до переименования,
+    оставит свежий mtime, а опоздавший не найдёт файл и запишет его заново.
+    """
+    path = get_image_storage().path(name)
+    try:
+        if _is_fresh(path, min_age) or count_references(name):
+            return False
+        removed = f'{path}.removed'
+        os.rename(path, removed)
+    except FileNotFoundError:
+        return False
+    if _is_fresh(removed, min_age) or count_references(name):
+        os.replace(removed, path)
+        return False
+    os.remove(removed)
+    delete_thumbnails(name)
+    return True
+
+
+def release_image(name):
+    """Удалить картинку, от которой отказался объект, если она не нужна."""
+    if not name:
+        return False
+    return delete_unused_image(name, settings.IMAGE_RELEASE_MIN_AGE)
+
+
+def get_referenced_images():
+    names = set(Recipe.objects.values_list('image', flat=True).distinct())
+    names |= set(User.objects.exclude(avatar__isnull=True)
+                 .values_list('avatar', flat=True).distinct())
+    names.discard('')
+    return names
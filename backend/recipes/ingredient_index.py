@@ -0,0 +1,99 @@
+"""Автодополнение ингредиентов по началу названия.
+
+Индекс - отсортированный список названий в нижнем регистре в памяти
+процесса, поиск по префиксу - бинарный (bisect), без запроса к БД.
+Версия индекса - отметка времени изменения ингредиентов в общем кеше
+(recipes/versions.py): при её смене каждый процесс при следующем обращении
+перестраивает свой индекс. На PostgreSQL, если совпадений по префиксу
+мало, результат дополняется нечётким поиском по триграммам (GIN-индекс
+pg_trgm).
+"""
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from . import versions
+from .models import Ingredient
+
+
+class IngredientIndex:
+    def __init__(self, ingredients):
+        rows = sorted(
+            (name.casefold(), name, measurement_unit, pk)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, measurement_unit, pk in rows
+        ]
+
+    def __len__(self):
+        return len(self.items)
+
+    def search(self, prefix, limit=None):
+        """Первые limit ингредиентов (по алфавиту), начинающихся с prefix."""
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        stop = len(self.keys)
+        if limit is not None:
+            stop = min(start + limit, stop)
+        end = start
+        while end < stop and self.keys[end].startswith(prefix):
+            end += 1
+        return self.items[start:end]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index_version():
+    return versions.get_changed_at(versions.INGREDIENTS)
+
+
+def invalidate_ingredient_index():
+    versions.touch(versions.INGREDIENTS)
+
+
+def get_ingredient_index():
+    global _index, _index_version
+    version = get_index_version()
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = IngredientIndex(Ingredient.objects.values_list(
+                    'pk', 'name', 'measurement_unit'
+                ).iterator())
+                _index_version = version
+    return _index
+
+
+def fuzzy_search(query, limit, exclude_ids=()):
+    """Похожие по триграммам ингредиенты (только PostgreSQL)."""
+    if connection.vendor != 'postgresql' or limit <= 0:
+        return []
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return list(
+        Ingredient.objects.filter(name__trigram_similar=query)
+        .exclude(pk__in=exclude_ids)
+        .annotate(similarity=TrigramSimilarity('name', query))
+        .order_by('-similarity', 'name')
+        .values('id', 'name', 'measurement_unit')[:limit]
+    )
+
+
+def autocomplete(query, limit=None):
+    """Ингредиенты по началу названия, дополненные нечёткими совпадениями."""
+    limit = limit or settings.INGREDIENTS_AUTOCOMPLETE_LIMIT
+    results = get_ingredient_index().search(query, limit)
+    if (len(results) < limit
+            and len(query) >= settings.INGREDIENTS_FUZZY_MIN_LENGTH):
+        results = results + fuzzy_search(
+            query, limit - len(results), [item['id'] for item in results]
+        )
+    return results
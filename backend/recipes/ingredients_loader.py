@@ -0,0 +1,218 @@
+"""Загрузка справочника ингредиентов из JSON или CSV.
+
+Файл читается потоково и обрабатывается пачками, поэтому память не зависит
+от размера справочника. Ингредиент определяется по названию: новые
+названия добавляются (на PostgreSQL - через COPY), у существующих
+обновляется единица измерения, если она изменилась.
+
+Если название повторяется в файле, действует последняя строка: в пачке
+повторы отбрасываются заранее, а строка из следующей пачки обновляет
+единицу измерения, как при повторной загрузке. Исключение - названия,
+которые уже есть в базе с несколькими единицами: каждая новая единица
+добавляется отдельным ингредиентом. Одинаковые строки, вставленные
+параллельной загрузкой, пропускаются по ограничению уникальности
+(ON CONFLICT DO NOTHING).
+
+Форматы:
+- JSON - массив объектов {"name": ..., "measurement_unit": ...};
+- CSV - строки "название,единица" без заголовка (как data/ingredients.csv).
+"""
+import csv
+import io
+import json
+import os
+
+from django.db import connection, transaction
+
+from .models import Ingredient
+
+READ_CHUNK_SIZE = 64 * 1024
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def iter_json_array(file):
+    """Элементы JSON-массива по одному, без чтения всего файла в память."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Пропускаем пробелы, '[' в начале и запятые между элементами.
+        while position < len(buffer) and (
+            buffer[position].isspace() or buffer[position] == ','
+            or (not started and buffer[position] == '[')
+        ):
+            started = started or buffer[position] == '['
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        elif eof:
+            return
+        chunk = file.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if not row:
+            continue
+        yield {'name': row[0],
+               'measurement_unit': row[1] if len(row) > 1 else ''}
+
+
+READERS = {'json': iter_json_array, 'csv': iter_csv}
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension not in READERS:
+        raise ValueError(f'Неизвестный формат файла: {path} '
+                         f'(поддерживаются {", ".join(READERS)})')
+    return extension
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def clean_item(item):
+    """(название, единица) или None, если строка некорректна."""
+    if not isinstance(item, dict):
+        return None
+    name = str(item.get('name') or '').strip()
+    measurement_unit = str(item.get('measurement_unit') or '').strip()
+    if (not name or not measurement_unit or len(name) > NAME_MAX_LENGTH
+            or len(measurement_unit) > UNIT_MAX_LENGTH):
+        return None
+    return name, measurement_unit
+
+
+def copy_ingredients(rows):
+    """Вставить строки (название, единица) через COPY (PostgreSQL).
+
+    COPY не умеет пропускать конфликты, поэтому строки копируются во
+    временную таблицу и переносятся INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает число вставленных строк. Вызывать внутри транзакции.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    table = Ingredient._meta.db_table
+    sql = ('COPY ingredients_load (name, measurement_unit) '
+           'FROM STDIN WITH (FORMAT csv)')
+    with connection.cursor() as cursor:
+        # Таблица уже есть, если load_batch вызван во внешней транзакции.
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS ingredients_load '
+            f'(name varchar({NAME_MAX_LENGTH}), '
+            f'measurement_unit varchar({UNIT_MAX_LENGTH})) ON COMMIT DROP'
+        )
+        cursor.execute('TRUNCATE ingredients_load')
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):  # psycopg2
+            raw_cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredients_load '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+class IngredientsLoader:
+    """Загрузка пачками со счётчиками добавленных/обновлённых/пропущенных."""
+
+    def __init__(self, batch_size=5000, use_copy=None):
+        self.batch_size = batch_size
+        self.use_copy = (connection.vendor == 'postgresql'
+                         if use_copy is None else use_copy)
+        self.inserted = self.updated = self.skipped = self.invalid = 0
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.skipped + self.invalid
+
+    def load(self, items):
+        for batch in iter_batches(items, self.batch_size):
+            self.load_batch(batch)
+
+    @transaction.atomic
+    def load_batch(self, batch):
+        units = {}
+        for item in batch:
+            cleaned = clean_item(item)
+            if cleaned is None:
+                self.invalid += 1
+            else:
+                if cleaned[0] in units:
+                    # Повтор названия в пачке: действует последняя строка.
+                    self.skipped += 1
+                units[cleaned[0]] = cleaned[1]
+
+        existing = {}
+        for ingredient in Ingredient.objects.filter(name__in=list(units)) \
+                .only('id', 'name', 'measurement_unit'):
+            existing.setdefault(ingredient.name, []).append(ingredient)
+
+        new_rows = []
+        changed = []
+        for name, measurement_unit in units.items():
+            ingredients = existing.get(name)
+            if not ingredients:
+                new_rows.append((name, measurement_unit))
+            elif any(ingredient.measurement_unit == measurement_unit
+                     for ingredient in ingredients):
+                self.skipped += 1
+            elif len(ingredients) == 1:
+                ingredients[0].measurement_unit = measurement_unit
+                changed.append(ingredients[0])
+            else:
+                # Название уже есть с несколькими единицами - какую из них
+                # заменить, неизвестно, добавляем как отдельный ингредиент.
+                new_rows.append((name, measurement_unit))
+
+        if changed:
+            Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+            self.updated += len(changed)
+        if new_rows:
+            if self.use_copy:
+                inserted = copy_ingredients(new_rows)
+            else:
+                Ingredient.objects.bulk_create([
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new_rows
+                ], ignore_conflicts=True)
+                inserted = len(new_rows)
+            self.inserted += inserted
+            self.skipped += len(new_rows) - inserted
+
+
+def load_ingredients_file(path, file_format=None, **loader_options):
+    loader = IngredientsLoader(**loader_options)
+    reader = READERS[file_format or detect_format(path)]
+    with open(path, encoding='utf-8', newline='') as file:
+        loader.load(reader(file))
+    return loader
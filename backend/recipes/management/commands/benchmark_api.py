@@ -0,0 +1,200 @@
+import json
+import math
+import platform
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, ShoppingCart, Subscription, User
+
+
+def percentile(sorted_values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Scenarios:
+    """Запросы к основным эндпоинтам; каждый метод возвращает (url, user)."""
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+        self.recipe_ids = list(Recipe.objects.values_list('pk', flat=True)
+                               .order_by('?')[:1000])
+        self.author_ids = list(Recipe.objects
+                               .values_list('author_id', flat=True)
+                               .distinct()[:1000])
+        self.users = list(User.objects.order_by('?')[:200])
+        self.followers = list(User.objects.filter(
+            pk__in=Subscription.objects.values('follower_id')[:200]
+        ))
+        self.cart_owners = list(User.objects.filter(
+            pk__in=ShoppingCart.objects.values('user_id')[:200]
+        ))
+        names = Ingredient.objects.values_list('name', flat=True)[:1000]
+        self.prefixes = [name[:self.rnd.randint(1, 3)] for name in names]
+        if not (self.recipe_ids and self.users and self.prefixes):
+            raise CommandError('Мало данных: выполните load_ingredients '
+                               'и seed_benchmark_data')
+
+    def user(self, users=None):
+        return self.rnd.choice(users or self.users)
+
+    def recipe_list_anonymous(self):
+        return f'/api/recipes/?page={self.rnd.randint(1, 5)}', None
+
+    def recipe_list(self):
+        return f'/api/recipes/?page={self.rnd.randint(1, 5)}', self.user()
+
+    def recipe_list_by_author(self):
+        author_id = self.rnd.choice(self.author_ids)
+        return f'/api/recipes/?author={author_id}&limit=6', self.user()
+
+    def recipe_list_favorited(self):
+        return '/api/recipes/?is_favorited=1', self.user()
+
+    def recipe_search(self):
+        return f'/api/recipes/?search=Рецепт {self.rnd.randint(1, 99)}', None
+
+    def recipe_detail(self):
+        return f'/api/recipes/{self.rnd.choice(self.recipe_ids)}/', self.user()
+
+    def subscriptions(self):
+        return ('/api/users/subscriptions/?recipes_limit=3',
+                self.user(self.followers))
+
+    def download_shopping_cart(self):
+        return ('/api/recipes/download_shopping_cart/',
+                self.user(self.cart_owners))
+
+    def ingredient_search(self):
+        return f'/api/ingredients/?name={self.rnd.choice(self.prefixes)}', None
+
+    NAMES = ['recipe_list_anonymous', 'recipe_list', 'recipe_list_by_author',
+             'recipe_list_favorited', 'recipe_search', 'recipe_detail',
+             'subscriptions', 'download_shopping_cart', 'ingredient_search']
+
+
+class Command(BaseCommand):
+    help = ('Измеряет задержку (p50/p95/p99), число запросов к БД и '
+            'пропускную способность основных эндпоинтов API')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Запросов на сценарий до начала замеров')
+        parser.add_argument('--scenario', action='append',
+                            choices=Scenarios.NAMES,
+                            help='Сценарий (можно несколько; '
+                                 'по умолчанию все)')
+        parser.add_argument('--cold', action='store_true',
+                            help='Отключить кеш ответов для анонимных')
+        parser.add_argument('--output',
+                            help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--compare',
+                            help='JSON-файл прошлого запуска для сравнения')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        scenarios = Scenarios(random.Random(options['seed']))
+        overrides = {'RESPONSE_CACHE_TIMEOUT': 0} if options['cold'] else {}
+        host = (settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS
+                else 'localhost')
+        clients = {}
+
+        def get_client(user):
+            if user not in clients:
+                clients[user] = APIClient(HTTP_HOST=host)
+                if user is not None:
+                    token, _ = Token.objects.get_or_create(user=user)
+                    clients[user].credentials(
+                        HTTP_AUTHORIZATION=f'Token {token.key}'
+                    )
+            return clients[user]
+
+        results = {}
+        with override_settings(**overrides):
+            for name in options['scenario'] or Scenarios.NAMES:
+                results[name] = self.run_scenario(
+                    getattr(scenarios, name), get_client,
+                    options['requests'], options['warmup']
+                )
+                self.print_result(name, results[name])
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'requests': options['requests'],
+                'cold': options['cold'],
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            print(f'Результаты сохранены в {options["output"]}')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self.print_comparison(json.load(file)['scenarios'], results)
+
+    @staticmethod
+    def run_scenario(make_request, get_client, requests, warmup):
+        timings = []
+        queries = errors = 0
+        for number in range(warmup + requests):
+            url, user = make_request()
+            client = get_client(user)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if number < warmup:
+                continue
+            timings.append(elapsed)
+            queries += len(captured.captured_queries)
+            errors += response.status_code >= 400
+        timings.sort()
+        return {
+            'requests': requests,
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'queries_per_request': round(queries / requests, 2),
+            'throughput_rps': round(requests / sum(timings), 1),
+        }
+
+    @staticmethod
+    def print_result(name, result):
+        print(f'{name}: p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+              f'p99 {result["p99_ms"]} мс, запросов к БД '
+              f'{result["queries_per_request"]}, {result["throughput_rps"]} '
+              f'запр/с, ошибок {result["errors"]}')
+
+    @staticmethod
+    def print_comparison(baseline, results):
+        print('Сравнение с прошлым запуском (p95, запросов к БД):')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            old = baseline[name]
+            change = (result['p95_ms'] / old['p95_ms'] - 1) * 100 \
+                if old['p95_ms'] else 0
+            print(f'{name}: p95 {old["p95_ms"]} -> {result["p95_ms"]} мс '
+                  f'({change:+.0f}%), запросов {old["queries_per_request"]} '
+                  f'-> {result["queries_per_request"]}')
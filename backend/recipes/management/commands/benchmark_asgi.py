@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory
+from django.utils.encoding import iri_to_uri
+from rest_framework.authtoken.models import Token
+
+from .benchmark_api import Scenarios, percentile
+
+SCENARIOS = ['recipe_list', 'recipe_list_by_author', 'recipe_detail',
+             'ingredient_search']
+STACKS = {'wsgi': 'False', 'asgi': 'True'}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает синхронный (WSGI) и асинхронный (ASGI) режимы под '
+            'нагрузкой медленных клиентов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50,
+                            help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=10,
+                            help='Запросов на клиента')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков синхронного сервера (воркеры '
+                                 'gunicorn x threads); асинхронный - один '
+                                 'цикл событий')
+        parser.add_argument('--delay', type=float, default=0.05,
+                            help='Секунд, за которые клиент передаёт запрос '
+                                 'и столько же - принимает ответ')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Сценарий (можно несколько; '
+                                 'по умолчанию все)')
+        parser.add_argument('--output',
+                            help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--seed', type=int, default=0)
+        # Замер одного режима в этом процессе; используется командой для
+        # дочерних процессов, т.к. маршруты зависят от ASYNC_VIEWS.
+        parser.add_argument('--stack', choices=STACKS, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['stack']:
+            self.stdout.write(json.dumps(self.measure(options)))
+            return
+        results = {stack: self.run_stack(stack, options) for stack in STACKS}
+        for stack, result in results.items():
+            print(f'{stack}: {result["throughput_rps"]} запр/с, p50 '
+                  f'{result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+                  f'p99 {result["p99_ms"]} мс, ошибок {result["errors"]}')
+        speedup = (results['asgi']['throughput_rps']
+                   / results['wsgi']['throughput_rps'])
+        print(f'Пропускная способность ASGI / WSGI: {speedup:.2f} при '
+              f'{options["clients"]} клиентах и {options["workers"]} потоках')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'options': {
+                    name: options[name] for name in
+                    ('clients', 'requests', 'workers', 'delay', 'scenario')
+                }, 'results': results}, file, ensure_ascii=False, indent=2)
+            print(f'Результаты сохранены в {options["output"]}')
+
+    @staticmethod
+    def run_stack(stack, options):
+        arguments = [sys.executable, '-m', 'django', 'benchmark_asgi',
+                     '--stack', stack]
+        for name in ('clients', 'requests', 'workers', 'delay', 'seed'):
+            arguments += [f'--{name}', str(options[name])]
+        for name in options['scenario'] or ():
+            arguments += ['--scenario', name]
+        process = subprocess.run(
+            arguments, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={
+                **os.environ,
+                'ASYNC_VIEWS': STACKS[stack],
+                'DJANGO_SETTINGS_MODULE': os.environ.get(
+                    'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+                ),
+            },
+        )
+        if process.returncode:
+            raise CommandError(f'Замер {stack} завершился с ошибкой:\n'
+                               f'{process.stderr}')
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def measure(self, options):
+        plan = self.make_plan(options)
+        started = time.perf_counter()
+        if options['stack'] == 'asgi':
+            results = asyncio.run(self.run_asgi(plan, options['delay']))
+        else:
+            results = self.run_wsgi(plan, options['workers'], options['delay'])
+        elapsed = time.perf_counter() - started
+        timings = sorted(timing for client in results for timing, _ in client)
+        return {
+            'requests': len(timings),
+            'errors': sum(status >= 400 for client in results
+                          for _, status in client),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 1),
+            'p95_ms': round(percentile(timings, 95) * 1000, 1),
+            'p99_ms': round(percentile(timings, 99) * 1000, 1),
+        }
+
+    @staticmethod
+    def make_plan(options):
+        """Для каждого клиента список (url, заголовки).
+
+        План одинаков в обоих режимах.
+        """
+        rnd = random.Random(options['seed'])
+        scenarios = Scenarios(rnd)
+        names = options['scenario'] or SCENARIOS
+        host = (settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS
+                else 'localhost')
+        tokens = {}
+        plan = []
+        for _ in range(options['clients']):
+            requests = []
+            for _ in range(options['requests']):
+                url, user = getattr(scenarios, rnd.choice(names))()
+                headers = {'host': host}
+                if user is not None:
+                    if user not in tokens:
+                        tokens[user], _ = Token.objects.get_or_create(
+                            user=user
+                        )
+                    headers['authorization'] = f'Token {tokens[user].key}'
+                requests.append((iri_to_uri(url), headers))
+            plan.append(requests)
+        return plan
+
+    @staticmethod
+    def run_wsgi(plan, workers, delay):
+        """Клиенты в потоках; поток сервера занят, пока клиент медленно
+        передаёт запрос и принимает ответ (как воркер gunicorn sync)."""
+        application = get_wsgi_application()
+        factory = RequestFactory()
+        server = threading.Semaphore(workers)
+
+        def request(url, headers):
+            environ = factory.get(url, **{
+                f'HTTP_{name.upper()}': value
+                for name, value in headers.items()
+            }).environ
+            statuses = []
+            started = time.perf_counter()
+            with server:
+                time.sleep(delay)
+                body = application(
+                    environ,
+                    lambda status, headers, exc_info=None:
+                        statuses.append(int(status.split()[0]))
+                )
+                try:
+                    for _ in body:
+                        time.sleep(delay)
+                finally:
+                    body.close()
+            return time.perf_counter() - started, statuses[0]
+
+        with ThreadPoolExecutor(len(plan)) as pool:
+            return list(pool.map(
+                lambda requests: [request(*item) for item in requests], plan
+            ))
+
+    @staticmethod
+    async def run_asgi(plan, delay):
+        """Все клиенты в одном цикле событий (как воркер uvicorn)."""
+        application = get_asgi_application()
+
+        async def request(url, headers):
+            path, _, query = url.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'},
+                'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(name.encode(), value.encode())
+                            for name, value in headers.items()],
+                'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 8000),
+            }
+            received = False
+            statuses = []
+
+            async def receive():
+                nonlocal received
+                if received:
+                    # Клиент не отключается; ожидание отменит Django.
+                    await asyncio.Future()
+                received = True
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif message['type'] == 'http.response.body':
+                    await asyncio.sleep(delay)
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+        async def client(requests):
+            return [await request(*item) for item in requests]
+
+        return await asyncio.gather(*(client(requests) for requests in plan))
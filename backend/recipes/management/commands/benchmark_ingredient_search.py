@@ -0,0 +1,60 @@
+import random
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers.recipes import IngredientSerializer
+from api.views import IngredientViewSet
+from recipes.ingredient_index import autocomplete, get_ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает автодополнение ингредиентов по индексу в памяти '
+            'с поиском через SearchFilter (ILIKE по БД)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500,
+                            help='Количество поисковых запросов')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            print('В базе нет ингредиентов, '
+                  'загрузите их командой load_ingredients')
+            return
+        rnd = random.Random(options['seed'])
+        # Префиксы длиной 1-4 символа, как при наборе в поле поиска.
+        prefixes = [
+            name[:rnd.randint(1, min(4, len(name)))]
+            for name in rnd.choices(names, k=options['queries'])
+        ]
+        get_ingredient_index()  # построение индекса не входит в замер
+
+        factory = APIRequestFactory()
+        view = IngredientViewSet()
+        view.search_fields = ['^name']
+
+        def search_filter(prefix):
+            request = Request(factory.get('/', {'search': prefix}))
+            queryset = SearchFilter().filter_queryset(
+                request, Ingredient.objects.all(), view
+            )
+            return IngredientSerializer(queryset, many=True).data
+
+        for title, search in (('SearchFilter (БД)', search_filter),
+                              ('Индекс в памяти', autocomplete)):
+            timings = []
+            for prefix in prefixes:
+                started = time.perf_counter()
+                search(prefix)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f'{title}: медиана {median(timings) * 1e6:.0f} мкс, '
+                  f'p95 {timings[int(len(timings) * 0.95)] * 1e6:.0f} мкс, '
+                  f'всего {sum(timings):.3f} с')
@@ -0,0 +1,131 @@
+import random
+import time
+from functools import partial
+from statistics import median
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from recipes.models import Ingredient, Recipe
+from recipes.recipe_match import RecipeMatchIndex, build_recipe_match_index, np
+
+from .seed_benchmark_data import ZipfChooser
+
+RESULTS_LIMIT = 100
+
+
+class Command(BaseCommand):
+    help = ('Замеряет подбор рецептов по ингредиентам (/api/recipes/match/) '
+            'на синтетическом каталоге: подсчёт на Python и на NumPy')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=1_000_000,
+                            help='Пар рецепт-ингредиент в каталоге')
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Ингредиентов в каталоге')
+        parser.add_argument('--recipe-size', type=int, default=10,
+                            help='Среднее число ингредиентов рецепта')
+        parser.add_argument('--pantry-size', type=int, default=10,
+                            help='Среднее число ингредиентов в запросе')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Параметр распределения Ципфа популярности '
+                                 'ингредиентов')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--db', action='store_true',
+                            help='Вместо синтетического каталога взять '
+                                 'рецепты из БД и сравнить индекс '
+                                 'с GROUP BY в БД')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        if options['db']:
+            ingredient_ids = list(Ingredient.objects.values_list('pk',
+                                                                 flat=True))
+            if not Recipe.objects.exists():
+                raise CommandError('В базе нет рецептов, заполните её '
+                                   'командой seed_benchmark_data')
+            started = time.perf_counter()
+            index = build_recipe_match_index()
+        else:
+            ingredient_ids = list(range(1, options['ingredients'] + 1))
+            links = self.make_links(rnd, ingredient_ids, options)
+            started = time.perf_counter()
+            index = RecipeMatchIndex(links)
+        print(f'Индекс: {len(index)} пар, {len(index.postings)} ингредиентов, '
+              f'построен за {time.perf_counter() - started:.2f} с')
+
+        # Запросы с ингредиентами, которые чаще бывают дома.
+        pantry = ZipfChooser(rnd, ingredient_ids, options['skew'])
+        queries = [
+            pantry.sample(max(1, round(rnd.gauss(options['pantry_size'], 3))))
+            for _ in range(options['queries'])
+        ]
+        methods = {'Python': partial(self.match_in_index, index, False)}
+        if np is not None:
+            methods['NumPy'] = partial(self.match_in_index, index, True)
+        else:
+            print('NumPy не установлен, замеряется только подсчёт на Python')
+        if options['db']:
+            methods['БД (GROUP BY)'] = self.match_in_db
+
+        expected = None
+        for title, method in methods.items():
+            timings = []
+            results = []
+            for query in queries:
+                started = time.perf_counter()
+                results.append(method(query, RESULTS_LIMIT))
+                timings.append(time.perf_counter() - started)
+            if expected is None:
+                expected = results
+            elif results != expected:
+                raise CommandError(f'{title}: результаты отличаются от Python')
+            timings.sort()
+            print(f'{title}: медиана {median(timings) * 1000:.2f} мс, '
+                  f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} мс, '
+                  f'всего {sum(timings):.3f} с')
+
+        recipe_ids = [rnd.randrange(1, len(index.sizes))
+                      for _ in range(min(options['queries'], 100))]
+        started = time.perf_counter()
+        for recipe_id in recipe_ids:
+            index.update_recipe(recipe_id,
+                                pantry.sample(options['recipe_size']))
+        elapsed = time.perf_counter() - started
+        print('Обновление рецепта: '
+              f'{elapsed / len(recipe_ids) * 1000:.2f} мс')
+
+    @staticmethod
+    def make_links(rnd, ingredient_ids, options):
+        """Пары (ингредиент, рецепт): популярность ингредиентов по Ципфу."""
+        chooser = ZipfChooser(rnd, ingredient_ids, options['skew'])
+        recipe_size = options['recipe_size']
+        links = []
+        recipe_id = 0
+        while len(links) < options['links']:
+            recipe_id += 1
+            size = rnd.randint(max(1, recipe_size // 2), recipe_size * 3 // 2)
+            links.extend((ingredient_id, recipe_id)
+                         for ingredient_id in chooser.sample(size))
+        links.sort()
+        return links
+
+    @staticmethod
+    def match_in_index(index, use_numpy, ingredient_ids, limit):
+        index.use_numpy = use_numpy
+        return index.match(ingredient_ids, limit)
+
+    @staticmethod
+    def match_in_db(ingredient_ids, limit):
+        recipes = Recipe.objects.annotate(
+            matched=Count('recipeingredients', filter=Q(
+                recipeingredients__ingredient_id__in=ingredient_ids
+            )),
+            total=Count('recipeingredients'),
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast('matched', FloatField()) / F('total')
+        ).order_by('-coverage', '-matched', '-pk')
+        return [tuple(row) for row in
+                recipes.values_list('pk', 'matched', 'total')[:limit]]
@@ -0,0 +1,100 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers.recipes import RecipeChangeSerializer
+from recipes.models import Ingredient, Recipe, RecipeIngredients, User
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def replace_all_ingredients(recipe, recipeingredients):
+    """Прежний способ: удалить все строки и создать заново."""
+    recipe.recipeingredients.all().delete()
+    RecipeIngredients.objects.bulk_create(RecipeIngredients(
+        recipe=recipe,
+        ingredient=recipe_ingredient['ingredient']['id'],
+        amount=recipe_ingredient['amount']
+    ) for recipe_ingredient in recipeingredients)
+
+
+def diff_ingredients(recipe, recipeingredients):
+    RecipeChangeSerializer().set_recipe_ingredients(recipe, recipeingredients)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает число запросов на запись при изменении ингредиентов '
+            'рецепта: пересоздание всех строк и применение разницы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=10,
+                            help='Ингредиентов в рецепте')
+        parser.add_argument('--edits', type=int, default=100,
+                            help='Количество правок для каждого способа')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def make_edit(self, rnd, amounts, catalog):
+        """Типичная правка: количество, новый или убранный ингредиент."""
+        amounts = dict(amounts)
+        kind = rnd.choice(('amount', 'amount', 'add', 'remove', 'none'))
+        if kind == 'amount':
+            ingredient = rnd.choice(list(amounts))
+            amounts[ingredient] += rnd.randint(1, 100)
+        elif kind == 'add':
+            amounts[rnd.choice([ingredient for ingredient in catalog
+                                if ingredient not in amounts])] = 1
+        elif kind == 'remove' and len(amounts) > 1:
+            del amounts[rnd.choice(list(amounts))]
+        return amounts
+
+    def handle(self, *args, **options):
+        catalog = list(Ingredient.objects.all()[:options['ingredients'] * 5])
+        if len(catalog) <= options['ingredients']:
+            print('В базе мало ингредиентов, '
+                  'загрузите их командой load_ingredients')
+            return
+
+        for title, apply in (('Пересоздание строк', replace_all_ingredients),
+                             ('Применение разницы', diff_ingredients)):
+            rnd = random.Random(options['seed'])
+            try:
+                with transaction.atomic():
+                    writes, rows = self.run_edits(rnd, catalog, apply, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            print(f'{title}: запросов на запись {writes} '
+                  f'({writes / options["edits"]:.1f} на правку), '
+                  f'id строк использовано {rows}')
+
+    def run_edits(self, rnd, catalog, apply, options):
+        author = User.objects.create(username='benchmark-recipe-update',
+                                     email='benchmark@example.com')
+        recipe = Recipe.objects.create(author=author, name='benchmark',
+                                       text='benchmark', cooking_time=1,
+                                       image='')
+        amounts = {ingredient: 1
+                   for ingredient in catalog[:options['ingredients']]}
+        apply(recipe, self.as_validated(amounts))
+        first_id = RecipeIngredients.objects.latest('pk').pk
+
+        writes = 0
+        for _ in range(options['edits']):
+            amounts = self.make_edit(rnd, amounts, catalog)
+            with CaptureQueriesContext(connection) as queries:
+                apply(recipe, self.as_validated(amounts))
+            writes += sum(bool(WRITE_RE.match(query['sql']))
+                          for query in queries.captured_queries)
+        return writes, RecipeIngredients.objects.latest('pk').pk - first_id
+
+    @staticmethod
+    def as_validated(amounts):
+        return [{'ingredient': {'id': ingredient}, 'amount': amount}
+                for ingredient, amount in amounts.items()]
@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import delete_unused_image, get_referenced_images
+from recipes.storage import BLOBS_DIR, get_image_storage
+
+# Каталоги картинок: blobs - content-addressed хранилище, images и
+# avatars - файлы, загруженные до его появления.
+IMAGE_DIRS = (BLOBS_DIR, 'images', 'avatars')
+
+
+def iter_files(storage, path):
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for directory in directories:
+        yield from iter_files(storage, f'{path}/{directory}')
+    for file in files:
+        yield f'{path}/{file}'
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы картинок, на которые нет ссылок в базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать файлы, ничего не удалять')
+        parser.add_argument('--min-age', type=int, default=60,
+                            help='Не трогать файлы моложе N минут '
+                                 '(загружены, но ещё не сохранены в базе)')
+
+    def handle(self, *args, **options):
+        storage = get_image_storage()
+        referenced = get_referenced_images()
+        min_age = options['min_age'] * 60
+        deadline = time.time() - min_age
+        removed = size = 0
+        for directory in IMAGE_DIRS:
+            for name in iter_files(storage, directory):
+                # Уменьшенные копии удаляются вместе с оригиналом.
+                if (name in referenced or '__' in os.path.basename(name)
+                        or os.path.getmtime(storage.path(name)) > deadline):
+                    continue
+                file_size = storage.size(name)
+                # Ссылки перепроверяются: файл мог понадобиться после
+                # get_referenced_images.
+                if (not options['dry_run']
+                        and not delete_unused_image(name, min_age)):
+                    continue
+                size += file_size
+                removed += 1
+                print(name)
+        print(f'Файлов без ссылок: {removed}, '
+              f'{size / 1024 / 1024:.1f} МБ'
+              + (' (не удалены, --dry-run)' if options['dry_run'] else ''))
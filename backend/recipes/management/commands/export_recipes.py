@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, рецепты, подписки, избранное и корзины '
+            'в каталог (data.ndjson и картинки в media/)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', type=str,
+                            help='Каталог для выгрузки')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Сколько строк читать из базы за один запрос')
+        parser.add_argument('--no-images', action='store_true',
+                            help='Не копировать файлы картинок')
+        parser.add_argument('--with-passwords', action='store_true',
+                            help='Выгрузить хеши паролей (без флага '
+                                 'пользователи загружаются без пароля)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = export_recipes(options['output_dir'], options['chunk_size'],
+                                with_images=not options['no_images'],
+                                with_passwords=options['with_passwords'])
+        print(', '.join(f'{model}: {count}' for model, count in counts.items())
+              or 'Нет данных для выгрузки')
+        print(f'Выгрузка заняла {time.perf_counter() - started:.2f} с')
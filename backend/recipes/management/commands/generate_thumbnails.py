@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_thumbnails
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Пересоздать уже существующие копии')
+
+    def handle(self, *args, **options):
+        names = list(Recipe.objects.exclude(image='')
+                     .values_list('image', flat=True))
+        names += User.objects.exclude(avatar__isnull=True).exclude(avatar='') \
+            .values_list('avatar', flat=True)
+        failed = 0
+        for name in names:
+            try:
+                generate_thumbnails(name, overwrite=options['overwrite'])
+            except Exception as err:
+                failed += 1
+                print(f'Не удалось обработать {name}: {err}')
+        print(f'Обработано картинок: {len(names) - failed}, '
+              f'с ошибками: {failed}')
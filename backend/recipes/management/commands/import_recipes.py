@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import import_recipes
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку команды export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input_dir', type=str,
+                            help='Каталог с выгрузкой')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Записей в одной транзакции')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Параллельно загружаемых пачек '
+                                 '(для PostgreSQL; на SQLite - 1)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = import_recipes(options['input_dir'], options['chunk_size'],
+                                options['workers'])
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        print('Добавлено: ' + (', '.join(
+            f'{model}: {count}' for model, count in counts.items()
+        ) or 'ничего'))
+        print(f'Загрузка заняла {elapsed:.2f} с '
+              f'({total / elapsed:.0f} записей/с)')
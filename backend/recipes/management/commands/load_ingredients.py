@@ -1,24 +1,44 @@
-import json
+import time
+
 from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from recipes.ingredient_index import invalidate_ingredient_index
+from recipes.ingredients_loader import READERS, load_ingredients_file
 
 
 class Command(BaseCommand):
-    help = 'Загружает в базу ингредиенты из JSON-файла'
+    help = 'Загружает в базу ингредиенты из JSON- или CSV-файла'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path', type=str,
-            help='Путь к файлу с ингредиентами (в формате JSON)'
+            help='Путь к файлу с ингредиентами (JSON или CSV без заголовка)'
         )
+        parser.add_argument('--format', choices=list(READERS),
+                            help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество строк в одной пачке')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
 
     def handle(self, *args, **options):
+        started = time.perf_counter()
         try:
-            with open(options['file_path'], 'r', encoding='utf-8') as file:
-                created_ingredients = Ingredient.objects.bulk_create(
-                    [Ingredient(**item) for item in json.load(file)],
-                    ignore_conflicts=True,
-                )
-            print(f'В базу добавлено {len(created_ingredients)} шт. новых ингредиентов')
+            loader = load_ingredients_file(
+                options['file_path'], options['format'],
+                batch_size=options['batch_size'],
+                use_copy=False if options['no_copy'] else None,
+            )
         except Exception as err:
-            print(f'При обработке файла {options["file_path"]} возникла ошибка: {err}')
+            print(f'При обработке файла {options["file_path"]} '
+                  f'возникла ошибка: {err}')
+            return
+        finally:
+            # bulk_create/COPY не отправляют сигналы - сбрасываем индекс
+            # вручную.
+            invalidate_ingredient_index()
+        elapsed = time.perf_counter() - started
+        print(f'Добавлено: {loader.inserted}, обновлено: {loader.updated}, '
+              f'без изменений: {loader.skipped}, '
+              f'некорректных строк: {loader.invalid}')
+        print(f'Обработано {loader.processed} строк за {elapsed:.2f} с '
+              f'({loader.processed / elapsed:.0f} строк/с)')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import rebase_popularity
+
+
+class Command(BaseCommand):
+    help = ('Переносит точку отсчёта популярности рецептов на текущий момент '
+            '(запускать периодически, например раз в сутки)')
+
+    def handle(self, *args, **options):
+        factor = rebase_popularity()
+        print(f'Популярность рецептов умножена на {factor:.6g}')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет ленты подписок'
+
+    def handle(self, *args, **options):
+        print(f'Записей в лентах: {rebuild_feeds()}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые документы всех рецептов'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            with transaction.atomic():
+                update_search_index(recipe_ids[start:start + BATCH_SIZE])
+        print(f'Поисковый индекс пересчитан для {len(recipe_ids)} рецептов')
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import calculate_shopping_lists
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает таблицу списков покупок по корзинам пользователей '
+            'или (с --check) только проверяет её на расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (total['user_id'], total['ingredient_id']): total['amount']
+            for total in calculate_shopping_lists().iterator()
+        }
+        if options['check']:
+            self.check_drift(expected)
+        else:
+            self.rebuild(expected)
+
+    @staticmethod
+    def check_drift(expected):
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in ShoppingListItem.objects
+            .values_list('user_id', 'ingredient_id', 'amount').iterator()
+        }
+        drift = [
+            (key, actual.get(key), expected.get(key))
+            for key in actual.keys() | expected.keys()
+            if actual.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), got, want in sorted(drift):
+            print(f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                  f'в таблице {got}, должно быть {want}')
+        print(f'Найдено расхождений: {len(drift)}')
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(expected):
+        ShoppingListItem.objects.all().delete()
+        ShoppingListItem.objects.bulk_create((
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             amount=amount)
+            for (user_id, ingredient_id), amount in expected.items()
+        ), batch_size=1000)
+        print(f'Список покупок пересчитан: {len(expected)} строк')
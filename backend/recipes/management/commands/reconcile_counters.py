@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает разошедшиеся счётчики рецептов, подписчиков, '
+            'подписок и избранного или (с --check) только ищет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile_counters(check=options['check'])
+        for field, count in drift.items():
+            print(f'{field}: расхождений {count}')
+        if not options['check'] and any(drift.values()):
+            print('Счётчики исправлены')
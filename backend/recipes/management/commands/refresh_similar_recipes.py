@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similar import refresh_similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты для рецептов с изменившимися '
+            'ингредиентами (запускать периодически, например раз в минуту)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать все рецепты '
+                                 '(например, раз в сутки)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Рецептов в одном умножении матриц '
+                                 '(по умолчанию SIMILAR_RECIPES_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_similar_recipes(options['all'], options['batch_size'])
+        print(f'Пересчитаны похожие для {count} рецептов за '
+              f'{time.perf_counter() - started:.1f} с')
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.response_cache import get_stats
+
+
+class Command(BaseCommand):
+    help = ('Показывает счётчики попаданий/промахов кеша ответов API '
+            '(метрика foodgram_response_cache_requests_total)')
+
+    def handle(self, *args, **options):
+        if not settings.METRICS_DIR:
+            print('Счётчики хранятся в памяти воркеров: задайте METRICS_DIR, '
+                  'чтобы видеть их сумму')
+            return
+        stats = get_stats()
+        total = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / total * 100 if total else 0
+        print(f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+              f'доля попаданий: {hit_rate:.1f}%')
@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import Ingredient, User
+from recipes.storage import get_image_storage
+from recipes.transfer import RecipesImporter
+
+EMAIL_TEMPLATE = 'bench{}@example.com'
+PASSWORD = 'benchmark'
+
+
+class ZipfChooser:
+    """Выбор с распределением Ципфа: немногие элементы популярнее прочих."""
+
+    def __init__(self, rnd, items, skew):
+        self.rnd = rnd
+        self.items = items
+        self.weights = []
+        total = 0
+        for rank in range(1, len(items) + 1):
+            total += 1 / rank ** skew
+            self.weights.append(total)
+
+    def choice(self):
+        return self.rnd.choices(self.items, cum_weights=self.weights)[0]
+
+    def sample(self, count):
+        result = set()
+        count = min(count, len(self.items))
+        for _ in range(count * 20):
+            if len(result) >= count:
+                return result
+            result.add(self.choice())
+        # Хвост распределения выпадает редко - добираем равномерно.
+        while len(result) < count:
+            result.add(self.rnd.choice(self.items))
+        return result
+
+
+def placeholder_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 60)).save(buffer, 'PNG')
+    return get_image_storage().save('benchmark.png',
+                                    ContentFile(buffer.getvalue()))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками для нагрузочных тестов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8,
+                            help='Среднее число ингредиентов в рецепте')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число рецептов в избранном')
+        parser.add_argument('--carts', type=int, default=3,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Показатель распределения Ципфа для '
+                                 'популярности авторов, рецептов '
+                                 'и ингредиентов')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = list(Ingredient.objects.values_list('name',
+                                                      'measurement_unit'))
+        if not catalog:
+            print('В базе нет ингредиентов, '
+                  'загрузите их командой load_ingredients')
+            return
+        started = time.perf_counter()
+        importer = RecipesImporter(input_dir='', workers=options['workers'])
+        counts = importer.run(self.iter_records(options, catalog),
+                              options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        print('Добавлено: ' + ', '.join(
+            f'{model}: {count}' for model, count in counts.items()
+        ))
+        print(f'Заполнение заняло {elapsed:.2f} с; пароль пользователей '
+              f'{EMAIL_TEMPLATE.format("N")} - {PASSWORD}')
+
+    def iter_records(self, options, catalog):
+        rnd = random.Random(options['seed'])
+        skew = options['skew']
+        # Номера продолжают уже созданных пользователей бенчмарка.
+        first = User.objects.filter(email__startswith='bench',
+                                    email__endswith='@example.com').count()
+        emails = [EMAIL_TEMPLATE.format(number)
+                  for number in range(first, first + options['users'])]
+        # Хеш пароля один на всех: make_password намеренно медленный.
+        password = make_password(PASSWORD)
+        for email in emails:
+            username = email.split('@')[0]
+            yield {'model': 'user', 'avatar': None, 'email': email,
+                   'username': username, 'password': password,
+                   'first_name': username, 'last_name': 'Бенчмарк'}
+
+        image = placeholder_image()
+        authors = ZipfChooser(rnd, emails, skew)
+        rnd.shuffle(catalog)
+        ingredients = ZipfChooser(rnd, catalog, skew)
+        per_recipe = options['ingredients_per_recipe']
+        now = timezone.now()
+        step = 365 * 24 * 3600 / max(options['recipes'], 1)
+        for number in range(options['recipes']):
+            yield {
+                'model': 'recipe', 'id': number, 'author': authors.choice(),
+                'name': f'Рецепт {number}',
+                'text': f'Описание рецепта {number}',
+                'cooking_time': rnd.randint(5, 180), 'image': image,
+                # Рецепты равномерно распределены по последнему году.
+                'created_at': (now - timedelta(
+                    seconds=(options['recipes'] - number) * step
+                )).isoformat(),
+                'ingredients': [
+                    [name, unit, rnd.randint(1, 500)]
+                    for name, unit in ingredients.sample(
+                        max(1, int(rnd.expovariate(1 / per_recipe)))
+                    )
+                ],
+            }
+
+        recipe_ids = list(range(options['recipes']))
+        rnd.shuffle(recipe_ids)
+        popular_recipes = ZipfChooser(rnd, recipe_ids, skew)
+        for follower in emails:
+            for author in authors.sample(
+                int(rnd.expovariate(1 / options['subscriptions']))
+                if options['subscriptions'] else 0
+            ):
+                if author != follower:
+                    yield {'model': 'subscription', 'author': author,
+                           'follower': follower}
+        for model_name, option in (('favorite', 'favorites'),
+                                   ('cart', 'carts')):
+            for user in emails:
+                count = (int(rnd.expovariate(1 / options[option]))
+                         if options[option] else 0)
+                for recipe_id in popular_recipes.sample(count):
+                    yield {'model': model_name, 'user': user,
+                           'recipe': recipe_id}
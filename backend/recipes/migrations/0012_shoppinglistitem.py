@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_shopping_list_items(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    totals = ShoppingCart.objects.values(
+        'user_id', ingredient_id=F('recipe__recipeingredients__ingredient_id')
+    ).annotate(
+        amount=Sum('recipe__recipeingredients__amount')
+    ).filter(ingredient_id__isnull=False).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(**total) for total in totals.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_alter_favoriterecipe_recipe_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Продукт в списке покупок',
+                'verbose_name_plural': 'Список покупок',
+                'ordering': ['user', 'ingredient'],
+                'default_related_name': 'shopping_list_items',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user__ingredient__in_shopping_list')],
+            },
+        ),
+        migrations.RunPython(fill_shopping_list_items, migrations.RunPython.noop),
+    ]
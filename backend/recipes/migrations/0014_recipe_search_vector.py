@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:36
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        # Замена tsvector для локальной разработки на SQLite.
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5('
+            'name, ingredients, text, '
+            'tokenize="unicode61 remove_diacritics 2")'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipes_recipe_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
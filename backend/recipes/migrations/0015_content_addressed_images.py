@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:40
+
+import recipes.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=recipes.storage.get_image_storage, upload_to='images', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(db_index=True, default=None, null=True, storage=recipes.storage.get_image_storage, upload_to='avatars', verbose_name='Аватар'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('follower', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'indexes': [models.Index(fields=['follower', '-created_at', '-recipe'], name='feed_follower_created_idx'), models.Index(fields=['author', '-created_at', '-recipe'], name='feed_author_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'recipe'), name='unique_follower__recipe__in_feed'), models.UniqueConstraint(condition=models.Q(('follower__isnull', True)), fields=('recipe',), name='unique_recipe__in_feed_on_read')],
+            },
+        ),
+    ]
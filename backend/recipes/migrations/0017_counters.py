@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('recipes', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+
+    def count(source, fk_name):
+        return Coalesce(Subquery(
+            source.objects.filter(**{fk_name: OuterRef('pk')}).order_by()
+            .values(fk_name).annotate(count=Count('pk')).values('count')
+        ), 0)
+
+    User.objects.update(
+        recipes_count=count(Recipe, 'author'),
+        followers_count=count(Subscription, 'author'),
+        authors_count=count(Subscription, 'follower'),
+    )
+    Recipe.objects.update(favorites_count=count(FavoriteRecipe, 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='authors_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:01
+
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_popularity(apps, schema_editor):
+    # Уже существующие избранное и корзины считаются событиями,
+    # случившимися в момент миграции.
+    PopularityLandmark = apps.get_model('recipes', 'PopularityLandmark')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    PopularityLandmark.objects.create(pk=1, timestamp=time.time())
+    carts_count = Coalesce(Subquery(
+        ShoppingCart.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(count=Count('pk')).values('count')
+    ), 0)
+    Recipe.objects.update(popularity=models.ExpressionWrapper(
+        models.F('favorites_count') * settings.TRENDING_FAVORITE_WEIGHT
+        + carts_count * settings.TRENDING_CART_WEIGHT,
+        output_field=models.FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityLandmark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.FloatField(verbose_name='Время (Unix)')),
+            ],
+            options={
+                'verbose_name': 'Точка отсчёта популярности',
+                'verbose_name_plural': 'Точка отсчёта популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['popularity'], name='recipes_rec_popular_dde933_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='similar_outdated',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Похожие устарели'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('similar_outdated', True)), fields=['similar_outdated'], name='recipe_similar_outdated_idx'),
+        ),
+        migrations.AddField(
+            model_name='similarrecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_recipes', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='similarrecipe',
+            name='similar',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_for', to='recipes.recipe', verbose_name='Похожий рецепт'),
+        ),
+        migrations.AddIndex(
+            model_name='similarrecipe',
+            index=models.Index(fields=['recipe', '-score'], name='similar_recipe_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='similarrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'similar'), name='unique_recipe__similar'),
+        ),
+    ]
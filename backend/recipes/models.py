@@ -1,9 +1,35 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator, RegexValidator
 from django.contrib.auth.models import AbstractUser
 
+from .storage import get_image_storage
 
-class User(AbstractUser):
+
+class UpdatedInPlaceFieldsMixin:
+    """Поля, которые меняются только запросами UPDATE (счётчики через F(),
+    популярность, служебные флаги).
+
+    Сохранение уже существующего объекта их не записывает: иначе значения,
+    прочитанные до изменений в других запросах, затёрли бы эти изменения.
+    """
+    updated_in_place_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            skipped = set(self.updated_in_place_fields) \
+                | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(UpdatedInPlaceFieldsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -16,7 +42,16 @@ class User(AbstractUser):
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     avatar = models.ImageField('Аватар', default=None, null=True,
-                               upload_to='avatars')
+                               upload_to='avatars', storage=get_image_storage,
+                               db_index=True)
+    # Счётчики поддерживаются сигналами (см. recipes/counters.py).
+    recipes_count = models.IntegerField('Рецептов', default=0, editable=False)
+    followers_count = models.IntegerField('Подписчиков', default=0,
+                                          editable=False)
+    authors_count = models.IntegerField('Подписок', default=0, editable=False)
+
+    updated_in_place_fields = ('recipes_count', 'followers_count',
+                               'authors_count')
 
     class Meta:
         ordering = ['email']
@@ -34,6 +69,7 @@ class Subscription(models.Model):
     follower = models.ForeignKey(User, verbose_name='Подписчик',
                                  on_delete=models.CASCADE,
                                  related_name='subscriptions_follower')
+
     class Meta:
         constraints = [models.UniqueConstraint(
             fields=['author', 'follower'],
@@ -47,7 +83,6 @@ class Subscription(models.Model):
         return f'{self.follower.username} подписан на {self.author.username}'
 
 
-
 class Ingredient(models.Model):
     name = models.CharField('Название', max_length=128)
     measurement_unit = models.CharField('единица измерения', max_length=64)
@@ -65,7 +100,7 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class Recipe(UpdatedInPlaceFieldsMixin, models.Model):
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                verbose_name='Автор')
@@ -73,17 +108,37 @@ class Recipe(models.Model):
                                          verbose_name='Ингридиенты',
                                          through='RecipeIngredients')
     name = models.CharField('Название', max_length=256)
-    image = models.ImageField('Картинка', upload_to='images')
+    image = models.ImageField('Картинка', upload_to='images',
+                              storage=get_image_storage, db_index=True)
     text = models.TextField('Описание')
-    cooking_time = models.PositiveIntegerField('Время приготовления',
-                                               validators=[MinValueValidator(1)])
+    cooking_time = models.PositiveIntegerField(
+        'Время приготовления', validators=[MinValueValidator(1)]
+    )
     created_at = models.DateTimeField('Создан', auto_now_add=True)
     updated_at = models.DateTimeField('Изменён', auto_now=True)
+    # Поисковый документ (PostgreSQL), поддерживается recipes/search.py.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Поддерживается сигналами (см. recipes/counters.py).
+    favorites_count = models.IntegerField('В избранном', default=0,
+                                          editable=False)
+    # Затухающая популярность относительно PopularityLandmark
+    # (см. recipes/trending.py).
+    popularity = models.FloatField('Популярность', default=0, editable=False)
+    # Похожие рецепты нужно пересчитать (см. recipes/similar.py).
+    similar_outdated = models.BooleanField('Похожие устарели', default=True,
+                                           editable=False)
+
+    updated_in_place_fields = ('search_vector', 'favorites_count',
+                               'popularity', 'similar_outdated')
 
     class Meta:
         default_related_name = 'recipes'
         indexes = [
             models.Index(fields=['created_at']),
+            models.Index(fields=['popularity']),
+            models.Index(fields=['similar_outdated'],
+                         condition=models.Q(similar_outdated=True),
+                         name='recipe_similar_outdated_idx'),
         ]
         ordering = ['-created_at']
         verbose_name = 'Рецепт'
@@ -124,7 +179,8 @@ class UserRecipeBase(models.Model):
         abstract = True
 
     def __str__(self):
-        return f'{self.user.first_name} {self.user.last_name} - {self.recipe.name}'
+        return (f'{self.user.first_name} {self.user.last_name} - '
+                f'{self.recipe.name}')
 
 
 class ShoppingCart(UserRecipeBase):
@@ -149,3 +205,101 @@ class FavoriteRecipe(UserRecipeBase):
         default_related_name = 'favorites'
         verbose_name = 'Рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранном'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в корзине пользователя.
+
+    Поддерживается инкрементально (см. recipes/shopping_list.py),
+    чтобы не агрегировать корзину при каждой выгрузке.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='unique_user__ingredient__in_shopping_list'
+        )]
+        default_related_name = 'shopping_list_items'
+        ordering = ['user', 'ingredient']
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Список покупок'
+
+    def __str__(self):
+        return f'{self.user.first_name} {self.user.last_name} - ' \
+               f'{self.ingredient.name} ' \
+               f'({self.amount} {self.ingredient.measurement_unit})'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика (см. recipes/feed.py).
+
+    Строка с пустым follower - рецепт автора с большим числом подписчиков:
+    он не копируется в ленты, а подмешивается при чтении.
+    """
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, null=True,
+                                 verbose_name='Подписчик',
+                                 related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               verbose_name='Автор', related_name='+')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='feed_entries')
+    # Копия Recipe.created_at: лента читается по одному индексу.
+    created_at = models.DateTimeField('Создан')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'recipe'],
+                                    name='unique_follower__recipe__in_feed'),
+            models.UniqueConstraint(fields=['recipe'],
+                                    condition=models.Q(follower__isnull=True),
+                                    name='unique_recipe__in_feed_on_read'),
+        ]
+        indexes = [
+            models.Index(fields=['follower', '-created_at', '-recipe'],
+                         name='feed_follower_created_idx'),
+            models.Index(fields=['author', '-created_at', '-recipe'],
+                         name='feed_author_created_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class PopularityLandmark(models.Model):
+    """Точка отсчёта для Recipe.popularity (одна строка).
+
+    См. recipes/trending.py.
+    """
+    timestamp = models.FloatField('Время (Unix)')
+
+    class Meta:
+        verbose_name = 'Точка отсчёта популярности'
+        verbose_name_plural = 'Точка отсчёта популярности'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт с мерой сходства (см. recipes/similar.py)."""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='similar_recipes')
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                verbose_name='Похожий рецепт',
+                                related_name='similar_for')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['recipe', 'similar'],
+            name='unique_recipe__similar'
+        )]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
@@ -0,0 +1,225 @@
+"""Подбор рецептов по имеющимся ингредиентам ("что приготовить").
+
+Инвертированный индекс в памяти процесса: id ингредиента -> отсортированный
+массив id рецептов (array('q')), плюс число ингредиентов каждого рецепта
+(массив по id рецепта). Для запроса массивы выбранных ингредиентов
+объединяются и для каждого рецепта считается, сколько ингредиентов совпало;
+рецепты ранжируются по покрытию - доле своих ингредиентов, которые есть у
+пользователя. Если установлен NumPy, подсчёт и сортировка векторизованы.
+
+Изменения рецептов (recipes/signals.py) записываются в журнал в общем кеше:
+номер изменения (счётчик) и id рецепта. Каждый процесс при обращении
+перечитывает из БД ингредиенты только изменившихся рецептов; если журнал
+отстал больше чем на MAX_PENDING_CHANGES записей или его часть вытеснена
+из кеша, индекс строится заново. Массовые изменения (импорт) сбрасывают
+индекс целиком (invalidate_recipe_match_index).
+
+Опубликованный индекс не меняется: match() читает его без блокировки,
+а изменения применяются к копии, которая затем подменяет _index.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.cache import cache
+
+from . import versions
+from .models import RecipeIngredients
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy пересечение считается на Python
+    np = None
+
+RECIPE_MATCH = 'recipe-match'
+CHANGES_SEQ_KEY = 'recipe-match:seq'
+CHANGE_TIMEOUT = 24 * 60 * 60
+MAX_PENDING_CHANGES = 1000
+
+
+def _change_key(seq):
+    return f'recipe-match:change:{seq}'
+
+
+class RecipeMatchIndex:
+    """Индекс по парам (id ингредиента, id рецепта).
+
+    Размер массивов не меняется на месте (их буферы может читать NumPy
+    в другом потоке): вставка и удаление создают новый массив. Индекс,
+    который читают другие потоки, изменять нельзя - только его copy().
+    """
+
+    def __init__(self, links, use_numpy=True):
+        """links - пары (ингредиент, рецепт), упорядоченные по обоим полям."""
+        self.use_numpy = use_numpy and np is not None
+        self.postings = {
+            ingredient_id: array('q', map(itemgetter(1), pairs))
+            for ingredient_id, pairs in groupby(links, key=itemgetter(0))
+        }
+        max_recipe_id = max(
+            (posting[-1] for posting in self.postings.values()), default=0
+        )
+        self.sizes = array('i', bytes(4 * (max_recipe_id + 1)))
+        for posting in self.postings.values():
+            for recipe_id in posting:
+                self.sizes[recipe_id] += 1
+
+    def copy(self):
+        """Копия, которую можно изменять: массивы общие, пока не заменены."""
+        index = object.__new__(RecipeMatchIndex)
+        index.use_numpy = self.use_numpy
+        index.postings = dict(self.postings)
+        index.sizes = array('i', self.sizes)
+        return index
+
+    def __len__(self):
+        return sum(map(len, self.postings.values()))
+
+    def recipe_ingredient_ids(self, recipe_id):
+        if recipe_id >= len(self.sizes) or not self.sizes[recipe_id]:
+            return set()
+        found = set()
+        for ingredient_id, posting in self.postings.items():
+            position = bisect_left(posting, recipe_id)
+            if position < len(posting) and posting[position] == recipe_id:
+                found.add(ingredient_id)
+                if len(found) == self.sizes[recipe_id]:
+                    break
+        return found
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Заменить ингредиенты рецепта (пустое множество - рецепт удалён)."""
+        old_ids = self.recipe_ingredient_ids(recipe_id)
+        if recipe_id >= len(self.sizes):
+            self.sizes = self.sizes + array(
+                'i', bytes(4 * (recipe_id + 1 - len(self.sizes)))
+            )
+        for ingredient_id in old_ids - ingredient_ids:
+            posting = array('q', self.postings[ingredient_id])
+            del posting[bisect_left(posting, recipe_id)]
+            if posting:
+                self.postings[ingredient_id] = posting
+            else:
+                del self.postings[ingredient_id]
+        for ingredient_id in ingredient_ids - old_ids:
+            posting = array('q', self.postings.get(ingredient_id, ()))
+            insort(posting, recipe_id)
+            self.postings[ingredient_id] = posting
+        self.sizes[recipe_id] = len(ingredient_ids)
+
+    def match(self, ingredient_ids, limit):
+        """До limit троек (рецепт, совпало, всего ингредиентов) по убыванию
+        покрытия, затем числа совпавших, затем id рецепта."""
+        postings = [self.postings[ingredient_id]
+                    for ingredient_id in set(ingredient_ids)
+                    if ingredient_id in self.postings]
+        if not postings:
+            return []
+        if self.use_numpy:
+            return self._match_numpy(postings, limit)
+        counts = Counter()
+        for posting in postings:
+            counts.update(posting)
+        sizes = self.sizes
+        return heapq.nlargest(
+            limit,
+            ((recipe_id, matched, sizes[recipe_id])
+             for recipe_id, matched in counts.items()),
+            key=lambda item: (item[1] / item[2], item[1], item[0]),
+        )
+
+    def _match_numpy(self, postings, limit):
+        recipe_ids, matched = np.unique(
+            np.concatenate([np.frombuffer(posting, dtype=np.int64)
+                            for posting in postings]),
+            return_counts=True,
+        )
+        sizes = np.frombuffer(self.sizes, dtype=np.int32)[recipe_ids]
+        coverage = matched / sizes
+        # lexsort: главный ключ - последний.
+        order = np.lexsort((-recipe_ids, -matched, -coverage))[:limit]
+        return list(zip(recipe_ids[order].tolist(), matched[order].tolist(),
+                        sizes[order].tolist()))
+
+
+_index = None
+_index_version = None
+_index_seq = 0
+_index_lock = threading.Lock()
+
+
+def _get_seq():
+    return cache.get(CHANGES_SEQ_KEY, 0)
+
+
+def mark_recipes_changed(recipe_ids):
+    """Записать изменение ингредиентов рецептов в журнал."""
+    for recipe_id in recipe_ids:
+        cache.add(CHANGES_SEQ_KEY, 0, None)
+        try:
+            seq = cache.incr(CHANGES_SEQ_KEY)
+        except ValueError:
+            # Счётчик вытеснен: процессы увидят откат номера и перестроят
+            # индекс.
+            cache.set(CHANGES_SEQ_KEY, 0, None)
+            continue
+        cache.set(_change_key(seq), recipe_id, CHANGE_TIMEOUT)
+
+
+def invalidate_recipe_match_index():
+    versions.touch(RECIPE_MATCH)
+
+
+def build_recipe_match_index():
+    return RecipeMatchIndex(
+        RecipeIngredients.objects.order_by('ingredient_id', 'recipe_id')
+        .values_list('ingredient_id', 'recipe_id').iterator(chunk_size=10000)
+    )
+
+
+def _apply_changes(index, first_seq, last_seq):
+    """Новый индекс с изменениями из журнала; None, если его часть потеряна."""
+    keys = [_change_key(seq) for seq in range(first_seq, last_seq + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    if not changes:
+        return index
+    recipe_ids = set(changes.values())
+    ingredient_ids = {recipe_id: set() for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredients.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        ingredient_ids[recipe_id].add(ingredient_id)
+    index = index.copy()
+    for recipe_id, ingredients in ingredient_ids.items():
+        index.update_recipe(recipe_id, ingredients)
+    return index
+
+
+def get_recipe_match_index():
+    global _index, _index_version, _index_seq
+    version = versions.get_changed_at(RECIPE_MATCH)
+    seq = _get_seq()
+    if _index is not None and _index_version == version and _index_seq == seq:
+        return _index
+    with _index_lock:
+        version = versions.get_changed_at(RECIPE_MATCH)
+        seq = _get_seq()
+        index = None
+        if (_index is not None and _index_version == version
+                and _index_seq <= seq <= _index_seq + MAX_PENDING_CHANGES):
+            index = _apply_changes(_index, _index_seq + 1, seq)
+        _index = build_recipe_match_index() if index is None else index
+        _index_version = version
+        _index_seq = seq
+    return _index
+
+
+def match_recipes(ingredient_ids, limit):
+    """(id рецепта, совпало, всего) для рецептов с ingredient_ids."""
+    return get_recipe_match_index().match(ingredient_ids, limit)
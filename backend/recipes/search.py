@@ -0,0 +1,137 @@
+"""Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+На PostgreSQL документ хранится в колонке Recipe.search_vector (tsvector
+с GIN-индексом), на SQLite - в виртуальной таблице FTS5 (для локальной
+разработки). Документ рецепта пересчитывается при его сохранении и при
+изменении его ингредиентов.
+"""
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    F, FloatField, OuterRef, Q, Subquery, TextField, Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, RecipeIngredients
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса полей для bm25 на SQLite: name, ingredients, text
+# (соответствуют весам A, B, C на PostgreSQL).
+FTS_WEIGHTS = '10.0, 5.0, 1.0'
+BATCH_SIZE = 1000
+
+
+def _ingredient_names(recipe_ids):
+    names = defaultdict(list)
+    for recipe_id, name in RecipeIngredients.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient__name'):
+        names[recipe_id].append(name)
+    return {recipe_id: ' '.join(items) for recipe_id, items in names.items()}
+
+
+def _ingredient_names_subquery():
+    """Названия ингредиентов рецепта через пробел (PostgreSQL)."""
+    # Модуль импортирует psycopg2 - на SQLite он может быть не установлен.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    return Coalesce(Subquery(
+        RecipeIngredients.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', delimiter=' '))
+        .values('names')
+    ), Value(''), output_field=TextField())
+
+
+def update_search_index(recipe_ids):
+    """Пересчитать поисковые документы рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    if connection.vendor == 'postgresql':
+        # Один UPDATE на пачку: названия ингредиентов собираются подзапросом.
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + BATCH_SIZE]
+            ).update(search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(_ingredient_names_subquery(), weight='B',
+                               config=SEARCH_CONFIG)
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            ))
+    elif connection.vendor == 'sqlite':
+        ingredients = _ingredient_names(recipe_ids)
+        recipes = Recipe.objects.filter(pk__in=recipe_ids) \
+            .values_list('pk', 'name', 'text')
+        with connection.cursor() as cursor:
+            delete_from_search_index(recipe_ids, cursor)
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                'VALUES (%s, %s, %s, %s)',
+                [(pk, name, ingredients.get(pk, ''), text)
+                 for pk, name, text in recipes]
+            )
+
+
+def delete_from_search_index(recipe_ids, cursor=None):
+    # На PostgreSQL документ удаляется вместе со строкой рецепта.
+    if connection.vendor != 'sqlite':
+        return
+    recipe_ids = list(recipe_ids)
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return delete_from_search_index(recipe_ids, cursor)
+    cursor.execute(
+        f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+        f'({", ".join(["%s"] * len(recipe_ids))})', recipe_ids
+    )
+
+
+def _fts_match_query(query):
+    # Каждое слово в кавычках и с * - поиск по префиксам слов, а спецсимволы
+    # синтаксиса FTS5 из пользовательского ввода не интерпретируются.
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(recipe_queryset, query):
+    """Рецепты, найденные по запросу, с аннотацией rank (больше - лучше).
+
+    Порядок не задаётся: сортирует по rank api.filters.RecipeOrderingFilter.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return recipe_queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        )
+
+    if connection.vendor == 'sqlite':
+        match_query = _fts_match_query(query)
+        if not match_query:
+            return recipe_queryset.annotate(
+                rank=Value(0.0, output_field=FloatField())
+            ).none()
+        table = Recipe._meta.db_table
+        return recipe_queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match_query,)
+        )).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match_query,), output_field=FloatField(),
+        ))
+
+    # Другие СУБД: простой поиск по вхождению без ранжирования.
+    return recipe_queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+        | Q(ingredients__name__icontains=query)
+    ).distinct().annotate(rank=Value(0.0, output_field=FloatField()))
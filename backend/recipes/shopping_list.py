@@ -0,0 +1,108 @@
+"""Обновление таблицы ShoppingListItem.
+
+При добавлении рецепта в корзину и удалении из неё итоги по ингредиентам
+меняются на разницу (дельту). При изменении ингредиентов рецепта итоги
+затронутых ингредиентов у пользователей с этим рецептом в корзине
+считаются заново по корзинам: так они верны, даже если строки
+RecipeIngredients меняли в обход API (админка, shell). Сохранение и удаление
+отдельных строк учитывают сигналы; bulk_create и bulk_update сигналов не
+отправляют, поэтому после них вызывается update_recipe_in_shopping_lists
+(импорт пересобирает списки целиком).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredients, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """{id ингредиента: количество} для рецепта."""
+    return dict(RecipeIngredients.objects.filter(recipe_id=recipe_id)
+                .values_list('ingredient_id', 'amount'))
+
+
+def calculate_amounts_delta(old_amounts, new_amounts):
+    delta = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        diff = (new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0))
+        if diff:
+            delta[ingredient_id] = diff
+    return delta
+
+
+@transaction.atomic
+def apply_shopping_list_delta(user_ids, delta):
+    """Прибавить delta ({id ингредиента: изменение}) к спискам user_ids."""
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+
+    # Сначала создаём недостающие строки с нулём, затем увеличиваем все
+    # атомарно через F() - так параллельные изменения не теряются.
+    ShoppingListItem.objects.bulk_create([
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+        for user_id in user_ids
+        for ingredient_id, diff in delta.items() if diff > 0
+    ], ignore_conflicts=True)
+
+    # Одно UPDATE на каждое уникальное значение дельты.
+    ingredients_by_diff = defaultdict(list)
+    for ingredient_id, diff in delta.items():
+        ingredients_by_diff[diff].append(ingredient_id)
+    for diff, ingredient_ids in ingredients_by_diff.items():
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).update(amount=F('amount') + diff)
+
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=list(delta), amount__lte=0
+    ).delete()
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    apply_shopping_list_delta([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    apply_shopping_list_delta([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+@transaction.atomic
+def refresh_recipe_in_shopping_lists(recipe_id, ingredient_ids):
+    """Пересчитать итоги ingredient_ids у тех, у кого рецепт в корзине."""
+    carts = ShoppingCart.objects.filter(recipe_id=recipe_id)
+    if not ingredient_ids or not carts.exists():
+        return
+    user_ids = carts.values('user_id')
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=ingredient_ids
+    ).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(**total) for total in calculate_shopping_lists()
+        .filter(user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+    )
+
+
+def update_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """Учесть изменение ингредиентов рецепта в корзинах пользователей."""
+    refresh_recipe_in_shopping_lists(
+        recipe_id, list(calculate_amounts_delta(old_amounts, new_amounts))
+    )
+
+
+def calculate_shopping_lists():
+    """Итоги списков покупок, посчитанные заново по корзинам.
+
+    Возвращает словари с ключами user_id, ingredient_id, amount.
+    """
+    return ShoppingCart.objects.values(
+        'user_id', ingredient_id=F('recipe__recipeingredients__ingredient_id')
+    ).annotate(
+        amount=Sum('recipe__recipeingredients__amount')
+    ).filter(ingredient_id__isnull=False).order_by()
@@ -0,0 +1,230 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import versions
+from .cache import invalidate_user_recipe_ids
+from .counters import update_counters
+from .feed import backfill_feed, fan_out_recipe, remove_from_feed
+from .images import release_image, schedule_thumbnails
+from .ingredient_index import invalidate_ingredient_index
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    SimilarRecipe,
+    Subscription,
+    User,
+)
+from .recipe_match import mark_recipes_changed
+from .search import delete_from_search_index, update_search_index
+from .shopping_list import (
+    add_recipe_to_shopping_list,
+    refresh_recipe_in_shopping_lists,
+    remove_recipe_from_shopping_list,
+)
+from .similar import mark_similar_outdated
+from .trending import add_popularity, get_event_weights
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_recipe_ids_cache(sender, instance, **kwargs):
+    # Новая версия после коммита: прочитанные до него данные остаются
+    # под старой версией (см. recipes/cache.py).
+    transaction.on_commit(
+        partial(invalidate_user_recipe_ids, sender, instance.user_id)
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # При каскадном удалении рецепта его ингредиенты могут быть уже удалены -
+    # тогда итоги пересчитал refresh_shopping_lists_for_ingredient.
+    remove_recipe_from_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def refresh_shopping_lists_for_ingredient(sender, instance, **kwargs):
+    refresh_recipe_in_shopping_lists(instance.recipe_id,
+                                     [instance.ingredient_id])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index_on_change(sender, **kwargs):
+    transaction.on_commit(invalidate_ingredient_index)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_index(sender, instance, **kwargs):
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_index(sender, instance, **kwargs):
+    delete_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_index(sender, instance, created,
+                                           **kwargs):
+    # Название ингредиента входит в поисковые документы рецептов.
+    if not created:
+        update_search_index(instance.recipeingredients.values_list(
+            'recipe_id', flat=True
+        ))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def touch_recipes(sender, **kwargs):
+    transaction.on_commit(partial(versions.touch, versions.RECIPES))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def touch_users(sender, update_fields=None, **kwargs):
+    # Данные пользователя (имя, аватар) выводятся в рецептах как автор.
+    # Обновление last_login при входе на ответы API не влияет.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(partial(versions.touch, versions.USERS))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def touch_user_flags(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        versions.touch, versions.user_flags(instance.user_id)
+    ))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def touch_follower_flags(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        versions.touch, versions.user_flags(instance.follower_id)
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_thumbnails(sender, instance, **kwargs):
+    transaction.on_commit(partial(schedule_thumbnails, instance.image))
+
+
+@receiver(post_save, sender=User)
+def create_avatar_thumbnails(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'avatar' in update_fields:
+        transaction.on_commit(partial(schedule_thumbnails, instance.avatar))
+
+
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_old_image(sender, instance, update_fields=None, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    if instance.pk is None or (
+        update_fields is not None and field_name not in update_fields
+    ):
+        return
+    instance._old_image_name = sender.objects.filter(pk=instance.pk) \
+        .values_list(field_name, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def release_replaced_image(sender, instance, **kwargs):
+    old_name = getattr(instance, '_old_image_name', None)
+    if old_name and old_name != getattr(instance, IMAGE_FIELDS[sender]).name:
+        transaction.on_commit(partial(release_image, old_name))
+    instance._old_image_name = None
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_image(sender, instance, **kwargs):
+    image = getattr(instance, IMAGE_FIELDS[sender])
+    if image:
+        transaction.on_commit(partial(release_image, image.name))
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(fan_out_recipe, instance.pk))
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(
+            backfill_feed, instance.follower_id, instance.author_id
+        ))
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    remove_from_feed(instance.follower_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=FavoriteRecipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        update_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(instance, -1)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def increase_popularity(sender, instance, created, **kwargs):
+    if created:
+        add_popularity({instance.recipe_id: get_event_weights()[sender]})
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_match_index(sender, instance, **kwargs):
+    # Ингредиенты сохраняются в той же транзакции, что и рецепт
+    # (в API и в админке), поэтому достаточно сигналов Recipe.
+    transaction.on_commit(partial(mark_recipes_changed, [instance.pk]))
+
+
+@receiver(pre_delete, sender=Recipe)
+def mark_similar_for_deleted_recipe(sender, instance, **kwargs):
+    # Строки SimilarRecipe удалятся каскадно - у этих рецептов
+    # станет меньше соседей.
+    mark_similar_outdated(SimilarRecipe.objects.filter(similar=instance)
+                          .values('recipe_id'))
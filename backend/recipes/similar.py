@@ -0,0 +1,139 @@
+"""Похожие рецепты по ингредиентам.
+
+Рецепт - разреженный вектор по ингредиентам с весами TF-IDF: редкий
+ингредиент (шафран) говорит о сходстве больше, чем частый (соль). Сходство -
+косинус между векторами. Для каждого рецепта SIMILAR_RECIPES_SIZE ближайших
+соседей заранее считаются произведением разреженных матриц (SciPy) пачками по
+SIMILAR_RECIPES_BATCH_SIZE рецептов и хранятся в SimilarRecipe, поэтому
+/api/recipes/{id}/similar/ - одна выборка по индексу.
+
+Изменение состава ингредиентов отмечает рецепт (Recipe.similar_outdated),
+команда refresh_similar_recipes пересчитывает соседей отмеченных рецептов и
+тех, у кого они были среди соседей. Рецепт может стать соседом и для других
+рецептов, а веса IDF со временем сдвигаются: это учитывает полный пересчёт
+(refresh_similar_recipes --all), его достаточно запускать редко.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from scipy import sparse
+
+from . import versions
+from .models import Recipe, RecipeIngredients, SimilarRecipe
+
+BATCH_SIZE = 1000
+
+
+def mark_similar_outdated(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids, similar_outdated=False) \
+        .update(similar_outdated=True)
+
+
+def build_tfidf_matrix():
+    """(id рецептов по строкам, матрица CSR с нормированными строками)."""
+    links = np.array(list(
+        RecipeIngredients.objects.order_by('recipe_id', 'ingredient_id')
+        .values_list('recipe_id', 'ingredient_id').iterator(chunk_size=10000)
+    ), dtype=np.int64).reshape(-1, 2)
+    recipe_ids, rows = np.unique(links[:, 0], return_inverse=True)
+    _, columns = np.unique(links[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(links)), (rows, columns)),
+        shape=(len(recipe_ids), columns.max(initial=-1) + 1),
+    )
+    # Сглаженный IDF: ингредиент всех рецептов получает вес 1, а не 0.
+    frequency = np.bincount(columns, minlength=matrix.shape[1])
+    idf = np.log((1 + len(recipe_ids)) / (1 + frequency)) + 1
+    matrix = sparse.csr_matrix(matrix.multiply(idf))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.csr_matrix(matrix.multiply(1 / norms[:, None]))
+
+
+def top_neighbours(matrix, rows, size):
+    """Для каждой строки из rows - [(строка соседа, сходство)] по убыванию."""
+    scores = (matrix[rows] @ matrix.T).tocsr()
+    neighbours = []
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        keep = columns != row
+        columns, values = columns[keep], values[keep]
+        if len(values) > size:
+            best = np.argpartition(-values, size)[:size]
+            columns, values = columns[best], values[best]
+        # При равном сходстве выше рецепт с большим id (он новее).
+        order = np.lexsort((-columns, -values))
+        neighbours.append(list(zip(columns[order].tolist(),
+                                   values[order].tolist())))
+    return neighbours
+
+
+def refresh_similar_recipes(all_recipes=False, batch_size=None):
+    """Пересчитать соседей устаревших (или всех) рецептов.
+
+    Возвращает число пересчитанных рецептов.
+    """
+    batch_size = batch_size or settings.SIMILAR_RECIPES_BATCH_SIZE
+    size = settings.SIMILAR_RECIPES_SIZE
+    if all_recipes:
+        outdated = Recipe.objects.all()
+    else:
+        # Соседи устаревших рецептов тоже могли измениться.
+        outdated = Recipe.objects.filter(
+            Q(similar_outdated=True)
+            | Q(similar_recipes__similar__similar_outdated=True)
+        ).distinct()
+    outdated_ids = list(outdated.values_list('pk', flat=True))
+    # Флаг снимается до чтения ингредиентов: изменение во время пересчёта
+    # снова отметит рецепт.
+    for start in range(0, len(outdated_ids), BATCH_SIZE):
+        Recipe.objects.filter(pk__in=outdated_ids[start:start + BATCH_SIZE]) \
+            .update(similar_outdated=False)
+    try:
+        recipe_ids, matrix = build_tfidf_matrix()
+        row_by_id = {recipe_id: row
+                     for row, recipe_id in enumerate(recipe_ids.tolist())}
+        for start in range(0, len(outdated_ids), batch_size):
+            batch_ids = outdated_ids[start:start + batch_size]
+            # У рецепта без ингредиентов соседей нет.
+            with_rows = [recipe_id for recipe_id in batch_ids
+                         if recipe_id in row_by_id]
+            neighbours = top_neighbours(
+                matrix, [row_by_id[recipe_id] for recipe_id in with_rows], size
+            )
+            save_neighbours(batch_ids, [
+                (recipe_id, [(int(recipe_ids[row]), score)
+                             for row, score in items])
+                for recipe_id, items in zip(with_rows, neighbours)
+            ])
+    except BaseException:
+        for start in range(0, len(outdated_ids), BATCH_SIZE):
+            mark_similar_outdated(outdated_ids[start:start + BATCH_SIZE])
+        raise
+    if outdated_ids:
+        # ETag и кеш ответов /similar/; остальные ответы о рецептах не
+        # зависят от соседей и не сбрасываются.
+        versions.touch(versions.SIMILAR_RECIPES)
+    return len(outdated_ids)
+
+
+@transaction.atomic
+def save_neighbours(recipe_ids, neighbours):
+    """Заменить соседей рецептов recipe_ids.
+
+    neighbours - [(id, [(id соседа, сходство)])].
+    """
+    SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+    # Рецепт мог быть удалён во время пересчёта.
+    existing = set(Recipe.objects.filter(pk__in={
+        similar_id for _, items in neighbours for similar_id, _ in items
+    } | set(recipe_ids)).values_list('pk', flat=True))
+    SimilarRecipe.objects.bulk_create([
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                      score=round(score, 6))
+        for recipe_id, items in neighbours if recipe_id in existing
+        for similar_id, score in items if similar_id in existing
+    ], batch_size=BATCH_SIZE)
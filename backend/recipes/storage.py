@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOBS_DIR = 'blobs'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хеш (sha256) его содержимого.
+
+    Одинаковые картинки (например, повторная загрузка при редактировании
+    рецепта) хранятся один раз: если файл с таким хешем уже есть, запись
+    пропускается. Один файл могут использовать несколько рецептов и
+    пользователей, поэтому удалять его можно только после проверки ссылок
+    (см. recipes.images.delete_unused_image). Повторное использование файла
+    обновляет его mtime: недавно тронутые файлы не удаляются.
+    """
+
+    def blob_name(self, digest, ext):
+        return f'{BLOBS_DIR}/{digest[:2]}/{digest}{ext.lower()}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        name = self.blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            # Файла нет или его как раз удаляют - записать заново.
+            return super().save(name, content, max_length)
+        return name
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return content_addressed_storage
@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from recipes.models import Ingredient, Recipe, RecipeIngredients, User
+
+
+class RecipesTestCase(TestCase):
+    """Пользователи, ингредиенты и рецепты без картинок (без копий файлов)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(10)
+        ])
+
+    @staticmethod
+    def create_user(name):
+        return User.objects.create_user(
+            email=f'{name}@example.com', username=name, first_name=name,
+            last_name=name,
+        )
+
+    @classmethod
+    def create_recipe(cls, author, ingredients=None, name='Рецепт'):
+        recipe = Recipe.objects.create(author=author, name=name, image='',
+                                       text='Описание', cooking_time=10)
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in (cls.ingredients[:3] if ingredients is None
+                               else ingredients)
+        ])
+        return recipe
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from recipes.cache import aget_user_recipe_ids, get_user_recipe_ids
+from recipes.models import FavoriteRecipe
+
+from .base import RecipesTestCase
+
+
+class UserRecipeIdsTests(RecipesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user('reader')
+        self.recipe = self.create_recipe(self.create_user('author'))
+
+    def add_favorite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe(user=self.user, recipe=self.recipe).save()
+
+    def test_invalidated_after_commit(self):
+        self.assertEqual(list(get_user_recipe_ids(FavoriteRecipe,
+                                                  self.user.pk)), [])
+        self.add_favorite()
+        self.assertEqual(list(get_user_recipe_ids(FavoriteRecipe,
+                                                  self.user.pk)),
+                         [self.recipe.pk])
+
+    def test_async_invalidated_after_commit(self):
+        get_ids = async_to_sync(aget_user_recipe_ids)
+        self.assertEqual(list(get_ids(FavoriteRecipe, self.user.pk)), [])
+        self.add_favorite()
+        self.assertEqual(list(get_ids(FavoriteRecipe, self.user.pk)),
+                         [self.recipe.pk])
+
+    def test_commit_during_read(self):
+        """Запрос прочитал список до коммита, а в кеш положил после."""
+        stale = mock.MagicMock()
+        stale.order_by.return_value.values_list.return_value = []
+
+        def read_then_commit(**kwargs):
+            self.add_favorite()
+            return stale
+
+        with mock.patch.object(FavoriteRecipe.objects, 'filter',
+                               side_effect=read_then_commit):
+            self.assertEqual(
+                list(get_user_recipe_ids(FavoriteRecipe, self.user.pk)), []
+            )
+        self.assertEqual(
+            list(get_user_recipe_ids(FavoriteRecipe, self.user.pk)),
+            [self.recipe.pk],
+        )
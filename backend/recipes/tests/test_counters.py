@@ -0,0 +1,82 @@
+from rest_framework.test import APIClient
+
+from recipes.counters import reconcile_counters
+from recipes.models import FavoriteRecipe, Recipe, Subscription, User
+
+from .base import RecipesTestCase
+
+
+class CountersTests(RecipesTestCase):
+    def setUp(self):
+        self.author = self.create_user('author')
+        self.follower = self.create_user('follower')
+        self.recipe = self.create_recipe(self.author)
+
+    def refreshed(self, instance):
+        return type(instance).objects.get(pk=instance.pk)
+
+    def test_recipe_counter(self):
+        self.assertEqual(self.refreshed(self.author).recipes_count, 1)
+        self.recipe.delete()
+        self.assertEqual(self.refreshed(self.author).recipes_count, 0)
+
+    def test_subscription_counters(self):
+        subscription = Subscription.objects.create(author=self.author,
+                                                   follower=self.follower)
+        self.assertEqual(self.refreshed(self.author).followers_count, 1)
+        self.assertEqual(self.refreshed(self.follower).authors_count, 1)
+        subscription.delete()
+        self.assertEqual(self.refreshed(self.author).followers_count, 0)
+        self.assertEqual(self.refreshed(self.follower).authors_count, 0)
+
+    def test_favorites_counter(self):
+        FavoriteRecipe.objects.create(user=self.follower, recipe=self.recipe)
+        self.assertEqual(self.refreshed(self.recipe).favorites_count, 1)
+        FavoriteRecipe.objects.filter(user=self.follower).delete()
+        self.assertEqual(self.refreshed(self.recipe).favorites_count, 0)
+
+    def test_save_keeps_counters_changed_elsewhere(self):
+        stale_recipe = self.refreshed(self.recipe)
+        stale_author = self.refreshed(self.author)
+        FavoriteRecipe.objects.create(user=self.follower, recipe=self.recipe)
+        Subscription.objects.create(author=self.author, follower=self.follower)
+        stale_recipe.name = 'Новое название'
+        stale_recipe.save()
+        stale_author.first_name = 'Новое имя'
+        stale_author.save()
+        recipe = self.refreshed(self.recipe)
+        self.assertEqual((recipe.name, recipe.favorites_count),
+                         ('Новое название', 1))
+        author = self.refreshed(self.author)
+        self.assertEqual((author.first_name, author.followers_count),
+                         ('Новое имя', 1))
+
+    def test_api_writes_keep_counters(self):
+        client = APIClient()
+        stale_author = self.refreshed(self.author)
+        client.force_authenticate(stale_author)
+        FavoriteRecipe.objects.create(user=self.follower, recipe=self.recipe)
+        Subscription.objects.create(author=self.author, follower=self.follower)
+        response = client.patch(f'/api/recipes/{self.recipe.pk}/', {
+            'name': 'Новое название',
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Новое название')
+        self.assertEqual(self.refreshed(self.recipe).favorites_count, 1)
+        # request.user загружен до подписки.
+        response = client.patch('/api/users/me/', {'first_name': 'Имя'},
+                                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refreshed(self.author).followers_count, 1)
+
+    def test_reconcile(self):
+        FavoriteRecipe.objects.create(user=self.follower, recipe=self.recipe)
+        Recipe.objects.update(favorites_count=5)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+        mismatches = reconcile_counters(check=True)
+        self.assertEqual(mismatches['Recipe.favorites_count'], 1)
+        reconcile_counters()
+        self.assertEqual(self.refreshed(self.recipe).favorites_count, 1)
+        self.assertEqual(self.refreshed(self.author).recipes_count, 1)
+        self.assertFalse(any(reconcile_counters(check=True).values()))
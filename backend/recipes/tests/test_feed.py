@@ -0,0 +1,111 @@
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from recipes.feed import decode_cursor, get_feed_page, rebuild_feeds
+from recipes.models import FeedEntry, Subscription
+
+from .base import RecipesTestCase
+
+
+class FeedTests(RecipesTestCase):
+
+    def setUp(self):
+        self.reader = self.create_user('reader')
+        self.author = self.create_user('author')
+        self.other = self.create_user('other')
+
+    def subscribe(self, follower, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Subscription.objects.create(follower=follower,
+                                               author=author)
+
+    def publish(self, author, name='Рецепт'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_recipe(author, name=name)
+
+    def feed(self, user, limit=10):
+        return get_feed_page(user, limit)[0]
+
+    def test_new_recipe_goes_to_followers(self):
+        self.subscribe(self.reader, self.author)
+        recipe = self.publish(self.author)
+        self.publish(self.other)
+        self.assertEqual(self.feed(self.reader), [recipe.pk])
+        self.assertEqual(self.feed(self.other), [])
+
+    @override_settings(FEED_BACKFILL_SIZE=2)
+    def test_subscription_backfills_latest_recipes(self):
+        recipes = [self.publish(self.author, f'Рецепт {index}')
+                   for index in range(3)]
+        self.subscribe(self.reader, self.author)
+        self.assertEqual(self.feed(self.reader),
+                         [recipes[2].pk, recipes[1].pk])
+
+    def test_unsubscribe_removes_recipes(self):
+        subscription = self.subscribe(self.reader, self.author)
+        self.publish(self.author)
+        other_recipe = self.publish(self.other)
+        self.subscribe(self.reader, self.other)
+        subscription.delete()
+        self.assertEqual(self.feed(self.reader), [other_recipe.pk])
+
+    @override_settings(FEED_FAN_OUT_MAX_FOLLOWERS=1)
+    def test_popular_author_is_merged_on_read(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.other, self.author)
+        self.subscribe(self.reader, self.other)
+        first = self.publish(self.other)
+        popular = self.publish(self.author)
+        last = self.publish(self.other)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(recipe=popular)
+                 .values_list('follower_id', flat=True)),
+            [None],
+        )
+        self.assertEqual(self.feed(self.reader),
+                         [last.pk, popular.pk, first.pk])
+        self.assertEqual(self.feed(self.other), [popular.pk])
+
+    @override_settings(FEED_FAN_OUT_MAX_FOLLOWERS=1)
+    def test_pages_follow_cursor(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.other, self.author)
+        self.subscribe(self.reader, self.other)
+        expected = [self.publish(author).pk
+                    for author in (self.author, self.other) * 3][::-1]
+        seen = []
+        cursor = None
+        while True:
+            page, next_cursor = get_feed_page(self.reader, 4, cursor)
+            seen.extend(page)
+            if next_cursor is None:
+                break
+            cursor = decode_cursor(next_cursor)
+        self.assertEqual(seen, expected)
+
+    def test_rebuild_matches_incremental_feed(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.reader, self.other)
+        for author in (self.author, self.other, self.author):
+            self.publish(author)
+        expected = self.feed(self.reader)
+        rebuild_feeds()
+        self.assertEqual(self.feed(self.reader), expected)
+
+    def test_api(self):
+        self.subscribe(self.reader, self.author)
+        recipes = [self.publish(self.author, f'Рецепт {index}')
+                   for index in range(3)]
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/recipes/feed/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([recipe['id'] for recipe in data['results']],
+                         [recipes[2].pk, recipes[1].pk])
+        data = client.get(data['next']).json()
+        self.assertEqual([recipe['id'] for recipe in data['results']],
+                         [recipes[0].pk])
+        self.assertIsNone(data['next'])
+        self.assertEqual(client.get('/api/recipes/feed/?cursor=bad')
+                         .status_code, 404)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+
+from recipes import images
+from recipes.storage import get_image_storage
+
+from .base import RecipesTestCase
+
+HOUR_AGO = time.time() - 60 * 60
+
+
+class ReleaseImageTests(RecipesTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root,
+                                              IMAGE_RELEASE_MIN_AGE=600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = get_image_storage()
+
+    def save_image(self, content=b'image', age=HOUR_AGO):
+        name = self.storage.save('image.png', ContentFile(content))
+        os.utime(self.storage.path(name), (age, age))
+        return name
+
+    def test_unused_image_is_deleted(self):
+        name = self.save_image()
+        self.assertTrue(images.release_image(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_referenced_image_is_kept(self):
+        name = self.save_image()
+        recipe = self.create_recipe(self.create_user('author'))
+        recipe.image = name
+        recipe.save(update_fields=['image'])
+        self.assertFalse(images.release_image(name))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_reused_image_is_kept(self):
+        name = self.save_image()
+        # Та же картинка загружена заново, ссылка ещё не сохранена.
+        self.assertEqual(self.storage.save('copy.png', ContentFile(b'image')),
+                         name)
+        self.assertFalse(images.release_image(name))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_image_reused_during_check_is_kept(self):
+        name = self.save_image()
+        rename = os.rename
+
+        def reuse_and_rename(source, target):
+            # Запрос использовал файл заново между проверкой и удалением.
+            self.storage.save('copy.png', ContentFile(b'image'))
+            rename(source, target)
+
+        with mock.patch('recipes.images.os.rename', reuse_and_rename):
+            self.assertFalse(images.release_image(name))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_image_deleted_during_reuse_is_written_again(self):
+        name = self.save_image()
+        self.assertTrue(images.release_image(name))
+        self.assertEqual(self.storage.save('copy.png', ContentFile(b'image')),
+                         name)
+        self.assertTrue(self.storage.exists(name))
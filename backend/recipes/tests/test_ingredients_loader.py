@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes.ingredients_loader import IngredientsLoader
+from recipes.models import Ingredient
+
+
+class IngredientsLoaderTests(TestCase):
+
+    def load(self, rows, batch_size=2):
+        loader = IngredientsLoader(batch_size=batch_size, use_copy=False)
+        loader.load({'name': name, 'measurement_unit': unit}
+                    for name, unit in rows)
+        return loader
+
+    def units(self, name):
+        return list(Ingredient.objects.filter(name=name)
+                    .values_list('measurement_unit', flat=True))
+
+    def test_last_duplicate_wins_within_batch(self):
+        loader = self.load([('соль', 'г'), ('соль', 'кг')], batch_size=10)
+        self.assertEqual(self.units('соль'), ['кг'])
+        self.assertEqual((loader.inserted, loader.skipped), (1, 1))
+
+    def test_last_duplicate_wins_across_batches(self):
+        loader = self.load([('соль', 'г'), ('сахар', 'г'), ('соль', 'кг')])
+        self.assertEqual(self.units('соль'), ['кг'])
+        self.assertEqual((loader.inserted, loader.updated, loader.skipped),
+                         (2, 1, 0))
+
+    def test_existing_unit_is_updated(self):
+        Ingredient.objects.create(name='соль', measurement_unit='щепотка')
+        loader = self.load([('соль', 'г'), ('перец', 'г'), ('соль', 'г')])
+        self.assertEqual(self.units('соль'), ['г'])
+        self.assertEqual((loader.inserted, loader.updated, loader.skipped),
+                         (1, 1, 1))
+
+    def test_concurrently_inserted_row_is_skipped(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        # Строку вставила параллельная загрузка после чтения существующих.
+        with mock.patch.object(Ingredient.objects, 'filter',
+                               return_value=Ingredient.objects.none()):
+            self.load([('соль', 'г')])
+        self.assertEqual(self.units('соль'), ['г'])
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from recipes import recipe_match
+
+from .base import RecipesTestCase
+
+
+class RecipeMatchIndexTests(RecipesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        recipe_match._index = None
+        self.addCleanup(setattr, recipe_match, '_index', None)
+        self.author = self.create_user('author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.small = self.create_recipe(self.author, self.ingredients[:2])
+            self.large = self.create_recipe(self.author, self.ingredients[:4])
+        self.ingredient_ids = [ingredient.pk
+                               for ingredient in self.ingredients]
+
+    def test_ranking(self):
+        for use_numpy in (False, True):
+            with self.subTest(use_numpy=use_numpy):
+                index = recipe_match.get_recipe_match_index()
+                index.use_numpy = use_numpy
+                self.assertEqual(
+                    index.match(self.ingredient_ids[:2], 10),
+                    [(self.small.pk, 2, 2), (self.large.pk, 2, 4)],
+                )
+
+    def test_match_during_update(self):
+        """Чтение опубликованного индекса во время применения журнала."""
+        published = recipe_match.get_recipe_match_index()
+        before = published.match(self.ingredient_ids, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.create_recipe(self.author, self.ingredients[5:8])
+            self.small.delete()
+        insort = recipe_match.insort
+        seen = []
+
+        def insort_and_match(posting, recipe_id):
+            insort(posting, recipe_id)
+            for use_numpy in (False, True):
+                published.use_numpy = use_numpy
+                seen.append(published.match(self.ingredient_ids, 10))
+
+        with mock.patch.object(recipe_match, 'insort', insort_and_match):
+            updated = recipe_match.get_recipe_match_index()
+        self.assertTrue(seen)
+        self.assertEqual(seen, [before] * len(seen))
+        self.assertIsNot(updated, published)
+        self.assertEqual(updated.match(self.ingredient_ids, 10),
+                         [(self.large.pk, 4, 4), (added.pk, 3, 3)])
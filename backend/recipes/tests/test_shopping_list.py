@@ -0,0 +1,77 @@
+from recipes.models import (
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from recipes.shopping_list import (
+    get_recipe_amounts,
+    update_recipe_in_shopping_lists,
+)
+
+from .base import RecipesTestCase
+
+
+class ShoppingListTests(RecipesTestCase):
+    """Итоги списка покупок после изменений строк RecipeIngredients."""
+
+    def setUp(self):
+        self.user = self.create_user('buyer')
+        author = self.create_user('author')
+        # ингредиенты 0-2 и 1-3: ингредиенты 1 и 2 общие.
+        self.soup = self.create_recipe(author, self.ingredients[:3])
+        self.salad = self.create_recipe(author, self.ingredients[1:4])
+        for recipe in (self.soup, self.salad):
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def totals(self):
+        return dict(ShoppingListItem.objects.filter(user=self.user)
+                    .values_list('ingredient_id', 'amount'))
+
+    def expected(self, **changes):
+        ids = [ingredient.pk for ingredient in self.ingredients]
+        totals = {ids[0]: 1, ids[1]: 2, ids[2]: 2, ids[3]: 1}
+        totals.update((ids[int(key[1:])], value)
+                      for key, value in changes.items())
+        return {key: value for key, value in totals.items() if value}
+
+    def test_initial_totals(self):
+        self.assertEqual(self.totals(), self.expected())
+
+    def test_row_saved_directly(self):
+        """Как при сохранении инлайна в админке."""
+        item = RecipeIngredients.objects.get(recipe=self.soup,
+                                             ingredient=self.ingredients[1])
+        item.amount = 5
+        item.save()
+        RecipeIngredients.objects.create(recipe=self.soup,
+                                         ingredient=self.ingredients[5],
+                                         amount=3)
+        self.assertEqual(self.totals(), self.expected(i1=6, i5=3))
+
+    def test_row_deleted_directly(self):
+        RecipeIngredients.objects.get(recipe=self.soup,
+                                      ingredient=self.ingredients[0]).delete()
+        RecipeIngredients.objects.get(recipe=self.soup,
+                                      ingredient=self.ingredients[1]).delete()
+        self.assertEqual(self.totals(), self.expected(i0=0, i1=1))
+
+    def test_ingredient_deleted(self):
+        self.ingredients[2].delete()
+        self.assertEqual(self.totals(), self.expected(i2=0))
+
+    def test_recipe_deleted(self):
+        self.soup.delete()
+        self.assertEqual(self.totals(), self.expected(i0=0, i1=1, i2=1))
+
+    def test_stale_totals_recomputed(self):
+        """Итоги, разошедшиеся с корзиной, исправляются при изменении."""
+        ShoppingListItem.objects.filter(
+            user=self.user, ingredient=self.ingredients[1]
+        ).update(amount=100)
+        old_amounts = get_recipe_amounts(self.soup.pk)
+        RecipeIngredients.objects.filter(
+            recipe=self.soup, ingredient=self.ingredients[1]
+        ).update(amount=4)
+        update_recipe_in_shopping_lists(self.soup.pk, old_amounts,
+                                        get_recipe_amounts(self.soup.pk))
+        self.assertEqual(self.totals(), self.expected(i1=5))
@@ -0,0 +1,108 @@
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, SimilarRecipe
+from recipes.similar import refresh_similar_recipes
+
+from .base import RecipesTestCase
+
+
+class SimilarRecipesTests(RecipesTestCase):
+    def setUp(self):
+        self.author = self.create_user('author')
+        ingredients = self.ingredients
+        # Рецепт i содержит ингредиенты i..i+2: соседние рецепты похожи.
+        self.recipes = [self.create_recipe(self.author, ingredients[i:i + 3])
+                        for i in range(6)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_outdated(self):
+        return set(Recipe.objects.filter(similar_outdated=True)
+                   .values_list('pk', flat=True))
+
+    def get_similar(self, recipe):
+        return list(SimilarRecipe.objects.filter(recipe=recipe)
+                    .order_by('-score', '-similar_id')
+                    .values_list('similar_id', flat=True))
+
+    def patch_ingredients(self, recipe, ingredients, amount=1):
+        return self.client.patch(f'/api/recipes/{recipe.pk}/', {
+            'ingredients': [{'id': ingredient.pk, 'amount': amount}
+                            for ingredient in ingredients],
+        }, format='json')
+
+    def test_refresh(self):
+        self.assertEqual(refresh_similar_recipes(), 6)
+        self.assertEqual(self.get_outdated(), set())
+        self.assertEqual(self.get_similar(self.recipes[2])[:2],
+                         [self.recipes[3].pk, self.recipes[1].pk])
+        self.assertEqual(refresh_similar_recipes(), 0)
+
+    def test_endpoint(self):
+        refresh_similar_recipes()
+        response = APIClient().get(
+            f'/api/recipes/{self.recipes[0].pk}/similar/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['id'] for recipe in response.json()],
+                         self.get_similar(self.recipes[0]))
+        response = APIClient().get('/api/recipes/0/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_changed_ingredients_mark_recipe_once(self):
+        refresh_similar_recipes()
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as context, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.patch_ingredients(recipe, self.ingredients[5:9])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_outdated(), {recipe.pk})
+        # Один UPDATE флага на запрос, а не на каждую строку ингредиентов.
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "recipes_recipe" SET '
+                                       '"similar_outdated"')
+        ]), 1)
+        # Пересчитываются и рецепты, у которых он был среди соседей.
+        self.assertEqual(refresh_similar_recipes(), 3)
+
+    def test_amount_change_keeps_neighbours(self):
+        refresh_similar_recipes()
+        response = self.patch_ingredients(self.recipes[0],
+                                          self.ingredients[:3], amount=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_outdated(), set())
+
+    def test_delete_marks_recipes_that_had_it_as_neighbour(self):
+        refresh_similar_recipes()
+        self.recipes[1].delete()
+        self.assertEqual(self.get_outdated(),
+                         {self.recipes[0].pk, self.recipes[2].pk,
+                          self.recipes[3].pk})
+
+    def test_refresh_invalidates_only_similar_responses(self):
+        cache.clear()
+        caches['responses'].clear()
+        refresh_similar_recipes()
+        anonymous = APIClient()
+        similar_url = f'/api/recipes/{self.recipes[0].pk}/similar/'
+        list_etag = anonymous.get('/api/recipes/')['ETag']
+        similar_etag = anonymous.get(similar_url)['ETag']
+        Recipe.objects.filter(pk=self.recipes[1].pk) \
+            .update(similar_outdated=True)
+        refresh_similar_recipes()
+        self.assertEqual(anonymous.get('/api/recipes/',
+                                       HTTP_IF_NONE_MATCH=list_etag)
+                         .status_code, 304)
+        self.assertEqual(anonymous.get('/api/recipes/')['X-Cache'], 'HIT')
+        response = anonymous.get(similar_url, HTTP_IF_NONE_MATCH=similar_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_new_recipe_is_outdated(self):
+        refresh_similar_recipes()
+        recipe = self.create_recipe(self.author, Ingredient.objects.all()[:2])
+        self.assertEqual(self.get_outdated(), {recipe.pk})
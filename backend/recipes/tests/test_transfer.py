@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+
+from recipes.feed import get_feed_page
+from recipes.models import (
+    FavoriteRecipe,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+    SimilarRecipe,
+    Subscription,
+    User,
+)
+from recipes.transfer import DATA_FILE, export_recipes, import_recipes
+
+from .base import RecipesTestCase
+
+
+class TransferTests(RecipesTestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+        self.author = self.create_user('author')
+        self.author.set_password('secret')
+        self.author.save()
+        self.reader = self.create_user('reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            soup = self.create_recipe(self.author, name='Суп')
+            salad = self.create_recipe(self.author, self.ingredients[1:4],
+                                       name='Салат')
+            Subscription.objects.create(follower=self.reader,
+                                        author=self.author)
+            FavoriteRecipe.objects.create(user=self.reader, recipe=soup)
+            ShoppingCart.objects.create(user=self.reader, recipe=salad)
+
+    def snapshot(self):
+        return {
+            'users': sorted(User.objects.values_list(
+                'email', 'username', 'first_name', 'last_name'
+            )),
+            'recipes': sorted(
+                (recipe.author.email, recipe.name, recipe.text,
+                 recipe.cooking_time, recipe.created_at, sorted(
+                     (item.ingredient_id, item.amount)
+                     for item in recipe.recipeingredients.all()
+                 ))
+                for recipe in Recipe.objects.select_related('author')
+                .prefetch_related('recipeingredients')
+            ),
+            'subscriptions': sorted(Subscription.objects.values_list(
+                'follower__email', 'author__email'
+            )),
+            'favorites': sorted(FavoriteRecipe.objects.values_list(
+                'user__email', 'recipe__name'
+            )),
+            'carts': sorted(ShoppingCart.objects.values_list(
+                'user__email', 'recipe__name'
+            )),
+        }
+
+    def export(self, **kwargs):
+        export_recipes(self.output_dir.name, with_images=False, **kwargs)
+
+    def reimport(self):
+        User.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_recipes(self.output_dir.name)
+
+    def test_round_trip(self):
+        before = self.snapshot()
+        self.export()
+        counts = self.reimport()
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(counts, {'user': 2, 'recipe': 2, 'subscription': 1,
+                                  'favorite': 1, 'cart': 1})
+        reader = User.objects.get(email=self.reader.email)
+        self.assertEqual(len(get_feed_page(reader, 10)[0]), 2)
+        self.assertTrue(SimilarRecipe.objects.exists())
+        self.assertFalse(Recipe.objects.filter(similar_outdated=True).exists())
+        self.assertEqual(ShoppingListItem.objects.filter(user=reader).count(),
+                         3)
+
+    def test_repeated_import_adds_nothing(self):
+        self.export()
+        self.reimport()
+        before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = import_recipes(self.output_dir.name)
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(counts, {'user': 0, 'recipe': 0, 'subscription': 0,
+                                  'favorite': 0, 'cart': 0})
+
+    def test_passwords_not_exported_by_default(self):
+        self.export()
+        with open(os.path.join(self.output_dir.name, DATA_FILE),
+                  encoding='utf-8') as file:
+            self.assertFalse(any('password' in json.loads(line)
+                                 for line in file))
+        self.reimport()
+        author = User.objects.get(email=self.author.email)
+        self.assertFalse(author.has_usable_password())
+
+    def test_passwords_exported_on_request(self):
+        self.export(with_passwords=True)
+        self.reimport()
+        author = User.objects.get(email=self.author.email)
+        self.assertTrue(author.check_password('secret'))
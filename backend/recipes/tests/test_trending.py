@@ -0,0 +1,61 @@
+import time
+
+from django.test import override_settings
+
+from recipes.models import (
+    FavoriteRecipe,
+    PopularityLandmark,
+    Recipe,
+    ShoppingCart,
+)
+from recipes.trending import add_popularity, half_life, rebase_popularity
+
+from .base import RecipesTestCase
+
+
+@override_settings(TRENDING_FAVORITE_WEIGHT=1.0, TRENDING_CART_WEIGHT=0.5)
+class PopularityTests(RecipesTestCase):
+    def setUp(self):
+        PopularityLandmark.objects.update_or_create(
+            pk=1, defaults={'timestamp': time.time()}
+        )
+        self.user = self.create_user('user')
+        self.recipe = self.create_recipe(self.user)
+
+    def get_popularity(self, recipe=None):
+        return Recipe.objects.get(pk=(recipe or self.recipe).pk).popularity
+
+    def test_favorite_and_cart_add_weights(self):
+        FavoriteRecipe.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assertAlmostEqual(self.get_popularity(), 1.5, places=3)
+
+    def test_removal_keeps_popularity(self):
+        FavoriteRecipe.objects.create(user=self.user, recipe=self.recipe)
+        FavoriteRecipe.objects.filter(user=self.user).delete()
+        self.assertAlmostEqual(self.get_popularity(), 1.0, places=3)
+
+    def test_older_event_weighs_less(self):
+        other = self.create_recipe(self.user)
+        now = time.time()
+        add_popularity({self.recipe.pk: 1.0}, now - half_life())
+        add_popularity({other.pk: 1.0}, now)
+        self.assertAlmostEqual(
+            self.get_popularity() / self.get_popularity(other), 0.5, places=3
+        )
+
+    def test_without_landmark(self):
+        PopularityLandmark.objects.all().delete()
+        FavoriteRecipe.objects.create(user=self.user, recipe=self.recipe)
+        self.assertAlmostEqual(self.get_popularity(), 1.0, places=3)
+
+    def test_rebase(self):
+        other = self.create_recipe(self.user)
+        now = time.time()
+        add_popularity({self.recipe.pk: 1.0}, now)
+        add_popularity({other.pk: 0.75}, now + half_life())
+        factor = rebase_popularity(now + 2 * half_life())
+        self.assertAlmostEqual(factor, 0.25, places=3)
+        # Значения - веса, затухшие к моменту переноса.
+        self.assertAlmostEqual(self.get_popularity(), 0.25, places=3)
+        self.assertAlmostEqual(self.get_popularity(other), 0.375, places=3)
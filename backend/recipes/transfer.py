@@ -0,0 +1,437 @@
+"""Перенос рецептов, пользователей и связей между окружениями.
+
+Формат выгрузки - каталог с файлом data.ndjson (по одному объекту JSON на
+строку) и каталогом media/ с картинками под их именами в хранилище.
+Записи идут группами по типу: пользователи, рецепты (вместе с
+ингредиентами), подписки, избранное, корзины. Пользователи связываются по
+email, ингредиенты - по названию и единице измерения, рецепты - по id из
+исходной базы. Хеши паролей выгружаются только по явному запросу
+(with_passwords), иначе пользователи загружаются без пароля и
+восстанавливают его через сброс.
+
+Повторная загрузка той же выгрузки не создаёт копий: уже существующий
+рецепт (тот же автор, название и время создания) не добавляется, связи
+ссылаются на него.
+
+Загрузка идёт пачками, каждая пачка - отдельная транзакция с bulk_create.
+Пачки одного типа можно обрабатывать параллельно (workers > 1, имеет смысл
+на PostgreSQL). bulk_create не отправляет сигналы, поэтому списки покупок,
+поисковый индекс, ленты подписок, похожие рецепты и кеши обновляются здесь
+же.
+"""
+import json
+import os
+import shutil
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from . import versions
+from .cache import invalidate_user_recipe_ids
+from .counters import reconcile_counters
+from .feed import rebuild_feeds
+from .images import schedule_thumbnails
+from .ingredient_index import invalidate_ingredient_index
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscription,
+    User,
+)
+from .recipe_match import invalidate_recipe_match_index
+from .search import update_search_index
+from .shopping_list import calculate_shopping_lists
+from .similar import refresh_similar_recipes
+from .storage import get_image_storage
+from .trending import add_popularity, get_event_weights
+
+DATA_FILE = 'data.ndjson'
+MEDIA_DIR = 'media'
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+USER_RECIPE_MODELS = {'favorite': FavoriteRecipe, 'cart': ShoppingCart}
+
+
+def _copy_image(field_file, media_dir):
+    if not field_file:
+        return None
+    target = os.path.join(media_dir, field_file.name)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with field_file.storage.open(field_file.name, 'rb') as source, \
+                    open(target, 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+        except FileNotFoundError:
+            return field_file.name
+    return field_file.name
+
+
+def iter_export_records(output_dir=None, chunk_size=1000,
+                        with_passwords=False):
+    """Записи выгрузки; картинки копируются в output_dir/media."""
+    media_dir = os.path.join(output_dir, MEDIA_DIR) if output_dir else None
+
+    def image_name(field_file):
+        if media_dir is None:
+            return field_file.name or None
+        return _copy_image(field_file, media_dir)
+
+    for user in User.objects.order_by('pk').iterator(chunk_size=chunk_size):
+        record = {'model': 'user', 'avatar': image_name(user.avatar)}
+        record.update((field, getattr(user, field)) for field in USER_FIELDS)
+        if with_passwords:
+            record['password'] = user.password
+        yield record
+
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('recipeingredients', queryset=RecipeIngredients.objects
+                 .select_related('ingredient'))
+    ).defer('search_vector').order_by('pk')
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        yield {
+            'model': 'recipe', 'id': recipe.pk, 'author': recipe.author.email,
+            'name': recipe.name, 'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': image_name(recipe.image),
+            'created_at': recipe.created_at.isoformat(),
+            'ingredients': [
+                [item.ingredient.name, item.ingredient.measurement_unit,
+                 item.amount]
+                for item in recipe.recipeingredients.all()
+            ],
+        }
+
+    for author, follower in Subscription.objects.order_by('pk').values_list(
+        'author__email', 'follower__email'
+    ).iterator(chunk_size=chunk_size):
+        yield {'model': 'subscription', 'author': author, 'follower': follower}
+
+    for model_name, model_class in USER_RECIPE_MODELS.items():
+        for user, recipe_id in model_class.objects.order_by('pk').values_list(
+            'user__email', 'recipe_id'
+        ).iterator(chunk_size=chunk_size):
+            yield {'model': model_name, 'user': user, 'recipe': recipe_id}
+
+
+def export_recipes(output_dir, chunk_size=1000, with_images=True,
+                   with_passwords=False):
+    """Выгрузить данные в output_dir; возвращает {тип: количество}."""
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    records = iter_export_records(output_dir if with_images else None,
+                                  chunk_size, with_passwords)
+    with open(os.path.join(output_dir, DATA_FILE), 'w',
+              encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+            counts[record['model']] = counts.get(record['model'], 0) + 1
+    return counts
+
+
+def iter_import_records(input_dir):
+    with open(os.path.join(input_dir, DATA_FILE), encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_chunks(records, chunk_size):
+    """Пачки записей одного типа: (тип, список записей)."""
+    for model_name, group in groupby(records, key=itemgetter('model')):
+        chunk = []
+        for record in group:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield model_name, chunk
+                chunk = []
+        if chunk:
+            yield model_name, chunk
+
+
+class RecipesImporter:
+    def __init__(self, input_dir, workers=1):
+        self.media_dir = os.path.join(input_dir, MEDIA_DIR)
+        # SQLite не допускает параллельной записи (database is locked).
+        self.workers = 1 if connection.vendor == 'sqlite' else workers
+        self.user_ids = {}
+        self.recipe_ids = {}
+        self.cart_user_ids = set()
+        self.flag_user_ids = set()
+        self.popularity = Counter()
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, model_name, created):
+        with self.lock:
+            self.counts[model_name] = self.counts.get(model_name, 0) + created
+
+    def run(self, records, chunk_size=1000):
+        loaders = {
+            'user': self.load_users,
+            'recipe': self.load_recipes,
+            'subscription': self.load_subscriptions,
+            'favorite': self.load_user_recipes,
+            'cart': self.load_user_recipes,
+        }
+        executor = (ThreadPoolExecutor(max_workers=self.workers)
+                    if self.workers > 1 else None)
+        try:
+            # Пачки одного типа независимы; следующий тип начинается,
+            # когда загружены все пачки предыдущего (нужны их id).
+            for model_name, chunks in groupby(
+                iter_chunks(records, chunk_size), key=lambda chunk: chunk[0]
+            ):
+                loader = loaders[model_name]
+                if executor is None:
+                    for _, chunk in chunks:
+                        loader(model_name, chunk)
+                    continue
+                # В памяти не больше 2 * workers пачек одновременно.
+                futures = deque()
+                for _, chunk in chunks:
+                    if len(futures) >= 2 * self.workers:
+                        futures.popleft().result()
+                    futures.append(executor.submit(
+                        self.run_in_thread, loader, model_name, chunk
+                    ))
+                for future in futures:
+                    future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.finish()
+        return self.counts
+
+    @staticmethod
+    def run_in_thread(loader, model_name, chunk):
+        try:
+            loader(model_name, chunk)
+        finally:
+            connection.close()
+
+    def save_image(self, name):
+        """Сохранить картинку из выгрузки; возвращает имя в хранилище."""
+        if not name:
+            return name
+        path = os.path.join(self.media_dir, name)
+        if not os.path.exists(path):
+            return name
+        with open(path, 'rb') as file:
+            return get_image_storage().save(name, File(file, name=name))
+
+    def resolve_users(self, emails):
+        missing = {email for email in emails if email not in self.user_ids}
+        if missing:
+            self.user_ids.update(User.objects.filter(email__in=missing)
+                                 .values_list('email', 'pk'))
+        return self.user_ids
+
+    def resolve_ingredients(self, keys):
+        """{(название, единица): id}; недостающие ингредиенты создаются."""
+        keys = set(keys)
+        names = {name for name, _ in keys}
+
+        def lookup():
+            return {
+                (name, unit): pk for pk, name, unit in Ingredient.objects
+                .filter(name__in=names)
+                .values_list('pk', 'name', 'measurement_unit')
+                if (name, unit) in keys
+            }
+
+        ingredient_ids = lookup()
+        if len(ingredient_ids) < len(keys):
+            Ingredient.objects.bulk_create([
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in keys - ingredient_ids.keys()
+            ], ignore_conflicts=True)
+            invalidate_ingredient_index()
+            ingredient_ids = lookup()
+        return ingredient_ids
+
+    @transaction.atomic
+    def load_users(self, model_name, records):
+        existing = set(User.objects.filter(
+            email__in=[record['email'] for record in records]
+        ).values_list('email', flat=True))
+        # Без хеша из выгрузки - пароль, с которым войти нельзя.
+        created = User.objects.bulk_create([
+            User(avatar=self.save_image(record['avatar']),
+                 password=record.get('password') or make_password(None),
+                 **{field: record[field] for field in USER_FIELDS})
+            for record in records if record['email'] not in existing
+        ], ignore_conflicts=True)
+        self.resolve_users(record['email'] for record in records)
+        self.count(model_name, len(created))
+
+    @transaction.atomic
+    def load_recipes(self, model_name, records):
+        user_ids = self.resolve_users(record['author'] for record in records)
+        records = [record for record in records
+                   if record['author'] in user_ids]
+        existing = self.find_recipes(records, user_ids)
+        with self.lock:
+            self.recipe_ids.update(
+                (record['id'], existing[key]) for key, record in
+                ((self.recipe_key(record, user_ids), record)
+                 for record in records) if key in existing
+            )
+        records = [record for record in records
+                   if self.recipe_key(record, user_ids) not in existing]
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author_id=user_ids[record['author']],
+                name=record['name'], text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=self.save_image(record['image']),
+                # Похожие рецепты пересчитает refresh_similar_recipes.
+                similar_outdated=True,
+            )
+            for record in records
+        ])
+        # auto_now_add заполняет created_at текущим временем - возвращаем
+        # исходное (bulk_update не вызывает pre_save полей).
+        for recipe, record in zip(recipes, records):
+            recipe.created_at = parse_datetime(record['created_at'])
+        Recipe.objects.bulk_update(recipes, ['created_at'])
+
+        ingredient_ids = self.resolve_ingredients(
+            (name, unit) for record in records
+            for name, unit, _ in record['ingredients']
+        )
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(recipe_id=recipe.pk,
+                              ingredient_id=ingredient_ids[name, unit],
+                              amount=amount)
+            for recipe, record in zip(recipes, records)
+            for name, unit, amount in record['ingredients']
+        ])
+        with self.lock:
+            self.recipe_ids.update(
+                (record['id'], recipe.pk)
+                for recipe, record in zip(recipes, records)
+            )
+        update_search_index([recipe.pk for recipe in recipes])
+        for recipe in recipes:
+            transaction.on_commit(partial(schedule_thumbnails, recipe.image))
+        self.count(model_name, len(recipes))
+
+    @staticmethod
+    def recipe_key(record, user_ids):
+        return (user_ids[record['author']], record['name'],
+                parse_datetime(record['created_at']))
+
+    def find_recipes(self, records, user_ids):
+        """{(автор, название, создан): id} уже загруженных рецептов."""
+        keys = {self.recipe_key(record, user_ids) for record in records}
+        if not keys:
+            return {}
+        return {
+            (author_id, name, created_at): pk
+            for pk, author_id, name, created_at in Recipe.objects.filter(
+                author_id__in={key[0] for key in keys},
+                created_at__in={key[2] for key in keys},
+            ).values_list('pk', 'author_id', 'name', 'created_at')
+            if (author_id, name, created_at) in keys
+        }
+
+    def create_links(self, model_class, fields, pairs):
+        """bulk_create связей (пар id), которых ещё нет в базе."""
+        pairs = set(pairs)
+        if not pairs:
+            return []
+        first, second = fields
+        existing = set(model_class.objects.filter(**{
+            f'{first}__in': {pair[0] for pair in pairs},
+            f'{second}__in': {pair[1] for pair in pairs},
+        }).values_list(first, second))
+        return model_class.objects.bulk_create([
+            model_class(**dict(zip(fields, pair)))
+            for pair in pairs - existing
+        ], ignore_conflicts=True)
+
+    @transaction.atomic
+    def load_subscriptions(self, model_name, records):
+        user_ids = self.resolve_users(
+            email for record in records
+            for email in (record['author'], record['follower'])
+        )
+        created = self.create_links(
+            Subscription, ('author_id', 'follower_id'),
+            ((user_ids[record['author']], user_ids[record['follower']])
+             for record in records
+             if record['author'] in user_ids
+             and record['follower'] in user_ids)
+        )
+        with self.lock:
+            self.flag_user_ids.update(item.follower_id for item in created)
+        self.count(model_name, len(created))
+
+    @transaction.atomic
+    def load_user_recipes(self, model_name, records):
+        user_ids = self.resolve_users(record['user'] for record in records)
+        created = self.create_links(
+            USER_RECIPE_MODELS[model_name], ('user_id', 'recipe_id'),
+            ((user_ids[record['user']], self.recipe_ids[record['recipe']])
+             for record in records
+             if record['user'] in user_ids
+             and record['recipe'] in self.recipe_ids)
+        )
+        with self.lock:
+            self.flag_user_ids.update(item.user_id for item in created)
+            weight = get_event_weights()[USER_RECIPE_MODELS[model_name]]
+            for item in created:
+                self.popularity[item.recipe_id] += weight
+            if model_name == 'cart':
+                self.cart_user_ids.update(item.user_id for item in created)
+        self.count(model_name, len(created))
+
+    def finish(self):
+        """То, что при обычном сохранении делают сигналы."""
+        cart_user_ids = list(self.cart_user_ids)
+        for start in range(0, len(cart_user_ids), 1000):
+            self.rebuild_shopping_lists(cart_user_ids[start:start + 1000])
+        for user_id in self.flag_user_ids:
+            for model_class in USER_RECIPE_MODELS.values():
+                invalidate_user_recipe_ids(model_class, user_id)
+            versions.touch(versions.user_flags(user_id))
+        reconcile_counters()
+        add_popularity(self.popularity)
+        if self.counts.get('recipe') or self.counts.get('subscription'):
+            rebuild_feeds()
+        if self.counts.get('recipe'):
+            # Новые рецепты созданы с similar_outdated=True.
+            refresh_similar_recipes()
+        invalidate_recipe_match_index()
+        versions.touch(versions.RECIPES)
+        versions.touch(versions.USERS)
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild_shopping_lists(user_ids):
+        ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(**total) for total in
+            calculate_shopping_lists().filter(user_id__in=user_ids)
+        )
+
+
+def import_recipes(input_dir, chunk_size=1000, workers=1):
+    """Загрузить выгрузку из input_dir; возвращает {тип: добавлено}."""
+    return RecipesImporter(input_dir, workers).run(
+        iter_import_records(input_dir), chunk_size
+    )
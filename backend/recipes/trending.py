@@ -0,0 +1,89 @@
+"""Популярность рецептов с экспоненциальным затуханием (forward decay).
+
+Добавление рецепта в избранное или корзину прибавляет к Recipe.popularity
+вес события, умноженный на 2 ** ((t - t0) / период полураспада), где t0 -
+общая точка отсчёта (PopularityLandmark). Порядок по такому полю совпадает
+с порядком по затухающей к текущему моменту сумме весов, поэтому старые
+события не пересчитываются, а сортировка идёт по индексу.
+
+Значения со временем растут: команда rebase_popularity периодически
+переносит t0 на текущий момент и умножает все значения на одно число
+(порядок не меняется). Событие, записанное одновременно с переносом, может
+получить вес по старой точке отсчёта - на порядок это почти не влияет.
+
+Удаление из избранного или корзины популярность не уменьшает: учитываются
+события интереса к рецепту.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Subquery, Value
+from django.db.models.functions import Coalesce, Power
+
+from .models import FavoriteRecipe, PopularityLandmark, Recipe, ShoppingCart
+
+TRENDING_CACHE_KEY = 'trending:recipe-ids'
+# Меньшие значения после переноса точки отсчёта обнуляются.
+MIN_POPULARITY = 1e-6
+POPULAR_ORDERING = ['-popularity', '-created_at', '-id']
+
+
+def get_event_weights():
+    return {FavoriteRecipe: settings.TRENDING_FAVORITE_WEIGHT,
+            ShoppingCart: settings.TRENDING_CART_WEIGHT}
+
+
+def half_life():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def add_popularity(weights, timestamp=None):
+    """Учесть события: weights - {id рецепта: суммарный вес}."""
+    timestamp = time.time() if timestamp is None else timestamp
+    # Точка отсчёта читается в том же UPDATE: процессам не нужно её хранить.
+    # Строки может не быть (база очищена flush): тогда отсчёт от текущего
+    # момента, а rebase_popularity её создаст.
+    landmark = Coalesce(Subquery(
+        PopularityLandmark.objects.filter(pk=1).values('timestamp')
+    ), Value(timestamp), output_field=FloatField())
+    decay = Power(Value(2.0), (Value(timestamp) - landmark) / half_life(),
+                  output_field=FloatField())
+    recipes_by_weight = defaultdict(list)
+    for recipe_id, weight in weights.items():
+        recipes_by_weight[weight].append(recipe_id)
+    for weight, recipe_ids in recipes_by_weight.items():
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            popularity=F('popularity') + weight * decay
+        )
+
+
+@transaction.atomic
+def rebase_popularity(timestamp=None):
+    """Перенести точку отсчёта на timestamp; возвращает множитель значений."""
+    timestamp = time.time() if timestamp is None else timestamp
+    landmark, _ = PopularityLandmark.objects.select_for_update() \
+        .get_or_create(pk=1, defaults={'timestamp': timestamp})
+    factor = 2 ** ((landmark.timestamp - timestamp) / half_life())
+    Recipe.objects.filter(popularity__gt=0) \
+        .update(popularity=F('popularity') * factor)
+    Recipe.objects.filter(popularity__gt=0, popularity__lt=MIN_POPULARITY) \
+        .update(popularity=0)
+    landmark.timestamp = timestamp
+    landmark.save()
+    return factor
+
+
+def get_trending_recipe_ids():
+    """id самых популярных рецептов (до TRENDING_SIZE), кешируются."""
+    recipe_ids = cache.get(TRENDING_CACHE_KEY)
+    if recipe_ids is None:
+        recipe_ids = list(
+            Recipe.objects.filter(popularity__gt=0).order_by(*POPULAR_ORDERING)
+            .values_list('pk', flat=True)[:settings.TRENDING_SIZE]
+        )
+        cache.set(TRENDING_CACHE_KEY, recipe_ids,
+                  settings.TRENDING_CACHE_TIMEOUT)
+    return recipe_ids
@@ -0,0 +1,50 @@
+"""Отметки времени последнего изменения данных (в общем кеше Django).
+
+Используются как дешёвые валидаторы: версия индекса ингредиентов,
+ETag / Last-Modified ответов API. Отметки обновляются сигналами
+(см. recipes/signals.py). Если отметки нет в кеше (например, её вытеснили),
+считается, что данные изменились только что.
+"""
+import time
+
+from django.core.cache import cache
+
+RECIPES = 'recipes'
+USERS = 'users'
+INGREDIENTS = 'ingredients'
+# Пересчёт похожих рецептов (recipes/similar.py), только для /similar/.
+SIMILAR_RECIPES = 'similar-recipes'
+
+
+def user_flags(user_id):
+    """Избранное, корзина и подписки пользователя."""
+    return f'user-flags:{user_id}'
+
+
+def _cache_key(name):
+    return f'changed-at:{name}'
+
+
+def get_changed_at(name):
+    key = _cache_key(name)
+    changed_at = cache.get(key)
+    if changed_at is None:
+        changed_at = time.time()
+        if not cache.add(key, changed_at, None):
+            changed_at = cache.get(key, changed_at)
+    return changed_at
+
+
+async def aget_changed_at(name):
+    """То же для асинхронных представлений."""
+    key = _cache_key(name)
+    changed_at = await cache.aget(key)
+    if changed_at is None:
+        changed_at = time.time()
+        if not await cache.aadd(key, changed_at, None):
+            changed_at = await cache.aget(key, changed_at)
+    return changed_at
+
+
+def touch(name):
+    cache.set(_cache_key(name), time.time(), None)